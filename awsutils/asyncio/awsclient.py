@@ -0,0 +1,241 @@
+# awsutils/asyncio/awsclient.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import asyncio, io, logging, email.parser, http.client
+from awsutils.asyncio.connectionpool import AsyncConnectionPool
+from awsutils.utils.xmlhandler import AWSXMLExpatDecoder
+from awsutils.exceptions.aws import AWSTimeout, AWSDataException, AWSStatusException
+import awsutils.utils.auth as auth
+
+
+class AWSClient:
+    """
+    asyncio counterpart of awsutils.awsclient.AWSClient, the requests run on the current event loop over a pool of
+    keep-alive connections, the responses have the same structure as the ones of the blocking client
+    """
+    HTTP_CONNECTION_RETRY_NUMBER = 3
+    HTTP_RECEPTION_TIMEOUT = 30
+    HTTP_CONNECTION_POOL_SIZE = 100
+    HTTP_CONNECTION_IDLE_TIMEOUT = 60
+    HTTP_CONNECTION_POOL_WAIT_TIMEOUT = None
+    READ_CHUNK_SIZE = 32768
+    XML_DECODER = AWSXMLExpatDecoder
+
+    def __init__(self, endpoint, access_key, secret_key, secure=False):
+        """
+        @type endpoint: the amazon endpoint of the service
+        @type endpoint: str
+        @type access_key: amazon access key
+        @type access_key: str
+        @type secret_key: amazon secret key
+        @type secret_key: str
+        @type secure: use https
+        @type secure: bool
+        """
+        self.endpoint = endpoint
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.secure = secure
+        self.connections = AsyncConnectionPool(secure=secure, maxsize=self.HTTP_CONNECTION_POOL_SIZE,
+                                               idletimeout=self.HTTP_CONNECTION_IDLE_TIMEOUT,
+                                               waittimeout=self.HTTP_CONNECTION_POOL_WAIT_TIMEOUT)
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self.count = {}
+
+    def checkForErrors(self, awsresponse, httpstatus, httpreason, httpheaders):
+        """
+        Checks for aws error responses, this should be overriden by each subclass
+        """
+        pass
+
+    def closeConnections(self):
+        self.connections.closeAll()
+
+    async def request(self, method='GET', host=None, uri='/', headers=None, query=None, body=b'',
+                      region=None, service=None, expires=None, signmethod=None, statusexpected=None,
+                      xmlexpected=True, inputobject=None, retry=None, receptiontimeout=None, xmldecoder=None):
+        """
+        @param body: the request body, it has to be bytes so it can be sent again on retry
+        @type body: bytes
+        @param inputobject: the raw (non xml) response body is written into it, by default an io.BytesIO
+        @type inputobject: object implementing write(bytes)
+        @param receptiontimeout: the timeout of one attempt in seconds
+        @type receptiontimeout: float
+        @param xmldecoder: factory of the xml response decoder, by default XML_DECODER
+        @type xmldecoder: function
+        """
+        if retry is None: retry = self.HTTP_CONNECTION_RETRY_NUMBER
+        if receptiontimeout is None: receptiontimeout = self.HTTP_RECEPTION_TIMEOUT
+        if host is None: host = self.endpoint
+        if headers is None: headers = {}
+        if query is None: query = {}
+        if statusexpected is None: statusexpected = [200]
+        if body is None: body = b''
+        if isinstance(body, str): body = body.encode()
+        headers['Connection'] = 'keep-alive'
+
+        _redirectcount = 0
+        _retrycount = 0
+        _outputiooffset = None
+        if inputobject is not None and hasattr(inputobject, 'seek'):
+            _outputiooffset = inputobject.tell()
+        while True:
+            if _outputiooffset is not None and (_retrycount > 0 or _redirectcount > 0):
+                inputobject.seek(_outputiooffset)
+                inputobject.truncate()
+            # every attempt is signed again, on copies so the previous signature does not get into the new one
+            signedheaders, signedquery, body, querystring = auth.signRequestWithQueryString(
+                access_key=self.access_key, secret_key=self.secret_key, endpoint=host, region=region,
+                service=service, signmethod=signmethod, uri=uri, method=method, headers=dict(headers),
+                query=dict(query), body=body, expires=expires)
+            url = "%s?%s" % (uri, querystring) if querystring != '' else uri
+            self.logger.debug("Requesting %s %s %s query=%s headers=%s", method, host, uri, signedquery,
+                              signedheaders)
+
+            if method not in self.count:
+                self.count[method] = 0
+            self.count[method] += 1
+
+            try:
+                result = await asyncio.wait_for(
+                    self._attempt(host, method, url, signedheaders, body, xmlexpected, inputobject, xmldecoder),
+                    receptiontimeout)
+            except (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError, http.client.HTTPException,
+                    AWSDataException) as e:
+                if _retrycount < retry:
+                    _retrycount += 1
+                    self.logger.debug("retrying %s %s %s [%r]", method, host, uri, e)
+                    continue
+                if isinstance(e, asyncio.TimeoutError):
+                    raise AWSTimeout('operation timeout')
+                raise
+
+            if result['type'] == 'xmldict':
+                awsresponse = result['awsresponse']
+                if awsresponse is not None:
+                    if 300 <= result['status'] < 400:
+                        error = awsresponse.get('Error') if isinstance(awsresponse, dict) else None
+                        if isinstance(error, dict) and \
+                                error.get('Code') in ('TemporaryRedirect', 'PermanentRedirect', 'Redirect') and \
+                                _redirectcount < 3:
+                            _redirectcount += 1
+                            host = error['Endpoint']
+                            continue
+                    if self.checkForErrors(awsresponse, result['status'], result['reason'],
+                                           result['headers']) is True:
+                        if _retrycount < retry:
+                            _retrycount += 1
+                            continue
+
+            if statusexpected is not True and result['status'] not in statusexpected:
+                raise AWSStatusException(result)
+            return result
+
+    async def _attempt(self, host, method, url, headers, body, xmlexpected, inputobject, xmldecoder):
+        connection = await self.connections.checkout(host)
+        reusable = False
+        try:
+            request = ["%s %s HTTP/1.1\r\n" % (method, url)]
+            for name, value in headers.items():
+                request.append("%s: %s\r\n" % (name, value))
+            if 'Content-Length' not in headers and (body or method in ('POST', 'PUT')):
+                request.append("Content-Length: %d\r\n" % (len(body),))
+            request.append("\r\n")
+            connection.writer.write(''.join(request).encode('latin-1'))
+            if body:
+                connection.writer.write(body)
+            await connection.writer.drain()
+
+            statusline = await connection.reader.readline()
+            if not statusline:
+                # most probably a keep-alive connection closed by the server
+                raise EOFError('connection closed by the server')
+            version, status, reason = (statusline.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+            if not version.startswith('HTTP/'):
+                raise http.client.BadStatusLine(statusline)
+            status = int(status)
+            responseheaders = email.parser.BytesParser(_class=http.client.HTTPMessage).parsebytes(
+                await connection.reader.readuntil(b'\r\n\r\n'))
+            result = {'status': status, 'reason': reason, 'headers': dict(responseheaders)}
+
+            isxml = xmlexpected or responseheaders.get('Content-Type') in ('application/xml', 'text/xml')
+            decoder = None
+            if isxml:
+                decoder = self.XML_DECODER() if xmldecoder is None else xmldecoder()
+            elif inputobject is None:
+                inputobject = io.BytesIO()
+
+            received = 0
+            async for data in self._readBody(connection.reader, method, status, responseheaders):
+                received += len(data)
+                if isxml:
+                    try:
+                        decoder.feed(data)
+                    except Exception:
+                        # not xml, ex: the html error page of a proxy, the connection is not reused
+                        result.update({'type': 'error', 'data': data})
+                        raise AWSDataException('xml-expected', result)
+                else:
+                    inputobject.write(data)
+
+            reusable = version != 'HTTP/1.0' and responseheaders.get('Connection', '').lower() != 'close' and \
+                ('Content-Length' in responseheaders or 'chunked' in responseheaders.get('Transfer-Encoding', '') or
+                 method == 'HEAD' or status in (204, 304))
+
+            if isxml:
+                if received == 0 and not xmlexpected:
+                    result['type'] = 'empty'
+                    return result
+                try:
+                    result['awsresponse'] = decoder.getdict()
+                except Exception:
+                    if xmlexpected:
+                        raise AWSDataException('xml-expected', result)
+                    raise
+                result['type'] = 'xmldict'
+            else:
+                if status == 206 and 'Content-Range' in responseheaders:
+                    contentrange = responseheaders['Content-Range'].split(' ')[1].split('/')
+                    start, end = contentrange[0].split('-')
+                    result['sizeinfo'] = {'size': int(contentrange[1]), 'start': int(start), 'end': int(end),
+                                          'downloaded': received}
+                else:
+                    result['sizeinfo'] = {'size': received, 'start': 0, 'end': received - 1, 'downloaded': received}
+                result['type'] = 'raw'
+                result['inputobject'] = inputobject
+            return result
+        finally:
+            self.connections.checkin(connection, reusable)
+
+    async def _readBody(self, reader, method, status, headers):
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            return
+        if 'chunked' in headers.get('Transfer-Encoding', ''):
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    # skip the trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                while size > 0:
+                    data = await reader.readexactly(min(size, self.READ_CHUNK_SIZE))
+                    size -= len(data)
+                    yield data
+                await reader.readexactly(2)
+        elif 'Content-Length' in headers:
+            size = int(headers['Content-Length'])
+            while size > 0:
+                data = await reader.readexactly(min(size, self.READ_CHUNK_SIZE))
+                size -= len(data)
+                yield data
+        else:
+            while True:
+                data = await reader.read(self.READ_CHUNK_SIZE)
+                if not data:
+                    return
+                yield data
@@ -0,0 +1,103 @@
+# awsutils/asyncio/connectionpool.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import asyncio, collections, ssl, time
+from awsutils.exceptions.aws import AWSTimeout
+
+
+class AsyncConnection:
+    def __init__(self, destination, reader, writer):
+        self.destination = destination
+        self.reader = reader
+        self.writer = writer
+        self.lastused = time.monotonic()
+
+    def isUsable(self):
+        """
+        An idle keep-alive connection can be reused if the server did not close it meanwhile, a server closing it
+        leaves the reader at eof
+        """
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    """
+    Keep-alive connection pool over asyncio streams, at most maxsize connections are open (checked out or idle) to a
+    destination at a time, the others wait for one to be checked in
+    """
+
+    def __init__(self, secure, maxsize=100, idletimeout=60, connecttimeout=10, waittimeout=None):
+        """
+        @param secure: use https
+        @type secure: bool
+        @param maxsize: maximum number of connections per destination
+        @type maxsize: int
+        @param idletimeout: idle connections older than this (in seconds) are closed instead of being reused
+        @type idletimeout: float
+        @param waittimeout: how long to wait for a free connection, None waits forever
+        @type waittimeout: float
+        """
+        self.secure = secure
+        self.maxsize = maxsize
+        self.idletimeout = idletimeout
+        self.connecttimeout = connecttimeout
+        self.waittimeout = waittimeout
+        self.port = 443 if secure else 80
+        self._sslcontext = ssl.create_default_context() if secure else None
+        self._idle = collections.defaultdict(collections.deque)
+        self._slots = {}
+
+    async def checkout(self, destination):
+        """
+        @return: a connection to destination, it has to be given back with checkin
+        @rtype: AsyncConnection
+        """
+        if destination not in self._slots:
+            self._slots[destination] = asyncio.Semaphore(self.maxsize)
+        try:
+            await asyncio.wait_for(self._slots[destination].acquire(), self.waittimeout)
+        except asyncio.TimeoutError:
+            raise AWSTimeout('timed out waiting for a connection to %s' % (destination,))
+
+        try:
+            idle = self._idle[destination]
+            now = time.monotonic()
+            while idle:
+                # the most recently used connection is the least likely to have been closed by the server
+                connection = idle.pop()
+                if now - connection.lastused < self.idletimeout and connection.isUsable():
+                    return connection
+                connection.close()
+
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(destination, self.port, ssl=self._sslcontext), self.connecttimeout)
+            return AsyncConnection(destination, reader, writer)
+        except BaseException:
+            self._slots[destination].release()
+            raise
+
+    def checkin(self, connection, reusable=True):
+        """
+        @param reusable: False if the connection is not in a state to send a new request on it
+        @type reusable: bool
+        """
+        if reusable and connection.isUsable():
+            connection.lastused = time.monotonic()
+            self._idle[connection.destination].append(connection)
+        else:
+            connection.close()
+        self._slots[connection.destination].release()
+
+    def closeAll(self):
+        """
+        Close the idle connections
+        """
+        for idle in self._idle.values():
+            while idle:
+                idle.pop().close()
@@ -0,0 +1,125 @@
+# awsutils/asyncio/s3client.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import binascii, base64
+from awsutils.asyncio.awsclient import AWSClient
+from awsutils.exceptions.aws import IntegrityCheckException, extractExceptionsFromModule2Dicitonary
+import awsutils.exceptions.s3
+from awsutils.utils.auth import SIGNATURE_S3_REST, urlquote
+
+OBJECT_HEADERS = ('ETag', 'x-amz-delete-marker', 'x-amz-expiration', 'x-amz-server-side-encryption',
+                  'x-amz-restore', 'x-amz-version-id', 'x-amz-website-redirect-location')
+
+
+class S3Client(AWSClient):
+    async def getBucket(self, bucketname, delimiter=None, marker=None, prefix=None, maxkeys=None):
+        query = {}
+        if delimiter is not None: query['delimiter'] = delimiter
+        if prefix is not None: query['prefix'] = prefix
+        if marker is not None: query['marker'] = marker
+        if maxkeys is not None: query['max-keys'] = maxkeys
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="GET", uri=uri, host=endpoint, query=query, signmethod=SIGNATURE_S3_REST)
+        return data['awsresponse']['ListBucketResult']
+
+    async def getObject(self, bucketname, objectname, inputobject=None, byterange=None, versionID=None,
+                        if_match=None, if_none_match=None):
+        """
+        byterange = list(start, end)
+        inputobject = any object implementing write(bytes), by default an io.BytesIO
+        """
+        query = {}
+        if versionID is not None:
+            query['vesionId'] = versionID
+        headers = {}
+        statusexpected = [404, 200]
+        if byterange is not None:
+            if len(byterange) > 1:
+                headers['Range'] = "bytes=%d-%d" % (byterange[0], byterange[1])
+            else:
+                headers['Range'] = "bytes=%d-" % (byterange[0],)
+            statusexpected = [200, 206]
+        if if_match is not None:
+            headers['If-Match'] = '"' + if_match + '"'
+            statusexpected.append(412)
+        if if_none_match is not None:
+            headers['If-None-Match'] = '"' + if_none_match + '"'
+            statusexpected.append(304)
+
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="GET", uri=uri + urlquote(objectname), headers=headers, host=endpoint,
+                                  statusexpected=statusexpected, query=query, inputobject=inputobject,
+                                  xmlexpected=False, signmethod=SIGNATURE_S3_REST)
+        result = dict((k, v) for k, v in data['headers'].items() if k in OBJECT_HEADERS or k.startswith('x-amz-meta-'))
+        result['status'] = data['status']
+        if data['status'] in (200, 206):
+            result['range'] = data['sizeinfo']
+            result['data'] = data['inputobject']
+        return result
+
+    async def headObject(self, bucketname, objectname, versionID=None):
+        query = {}
+        if versionID is not None:
+            query['vesionId'] = versionID
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="HEAD", uri=uri + urlquote(objectname), host=endpoint,
+                                  statusexpected=[404, 200], query=query, xmlexpected=False,
+                                  signmethod=SIGNATURE_S3_REST)
+        result = dict((k, v) for k, v in data['headers'].items() if k in OBJECT_HEADERS or k.startswith('x-amz-meta-'))
+        result['status'] = data['status']
+        return result
+
+    async def putObject(self, bucketname, objectname, value, md5digest=None, x_amz_server_side_encryption=None,
+                        x_amz_storage_class=None):
+        """
+        @param value: the object data
+        @type value: bytes
+        @param md5digest: the md5 digest of value, if given it's checked by S3 and against the returned ETag
+        @type md5digest: bytes
+        """
+        headers = {}
+        if x_amz_server_side_encryption is not None:
+            headers['x-amz-server-side-encryption'] = x_amz_server_side_encryption
+        if x_amz_storage_class is not None:
+            headers['x-amz-storage-class'] = x_amz_storage_class
+        if md5digest is not None:
+            headers['Content-MD5'] = base64.b64encode(md5digest).strip().decode()
+
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="PUT", uri=uri + urlquote(objectname), body=value, headers=headers,
+                                  host=endpoint, signmethod=SIGNATURE_S3_REST, xmlexpected=False)
+        headers = data['headers']
+        if md5digest is not None:
+            if headers['ETag'][1:-1] != binascii.hexlify(md5digest).decode():
+                raise IntegrityCheckException('putObject returned unexpected ETag value',
+                                              headers['ETag'][1:-1], binascii.hexlify(md5digest).decode())
+        return dict((k, v) for k, v in headers.items() if k in ('ETag', 'x-amz-expiration',
+                                                                'x-amz-server-side-encryption', 'x-amz-version-id'))
+
+    async def deleteObject(self, bucketname, objectname, versionID=None):
+        query = {}
+        if versionID is not None:
+            query['vesionId'] = versionID
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="DELETE", uri=uri + urlquote(objectname), host=endpoint, query=query,
+                                  statusexpected=[204], signmethod=SIGNATURE_S3_REST, xmlexpected=False)
+        return dict((k, v) for k, v in data['headers'].items() if k in ('x-amz-version-id', 'x-amz-delete-marker'))
+
+    #================================== helper functionality ===========================================================
+    def _buketname2PathAndEndpoint(self, bucketname):
+        if bucketname != bucketname.lower():
+            return "/" + bucketname + "/", self.endpoint
+        return '/', bucketname + "." + self.endpoint
+
+    EXCEPTIONS = extractExceptionsFromModule2Dicitonary('awsutils.exceptions.s3',
+                                                        awsutils.exceptions.s3.S3Exception)
+
+    def checkForErrors(self, awsresponse, httpstatus, httpreason, httpheaders):
+        if isinstance(awsresponse, dict) and 'Error' in awsresponse:
+            if awsresponse['Error']['Code'] in self.EXCEPTIONS:
+                raise self.EXCEPTIONS[awsresponse['Error']['Code']](awsresponse, httpstatus, httpreason, httpheaders)
+            else:
+                raise awsutils.exceptions.s3.S3Exception(awsresponse, httpstatus, httpreason, httpheaders)
@@ -0,0 +1,214 @@
+# awsutils/asyncio/sdbclient.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+from awsutils.asyncio.awsclient import AWSClient
+from awsutils.exceptions.aws import UserInputException, extractExceptionsFromModule2Dicitonary
+import awsutils.exceptions.sdb
+from awsutils.utils.auth import SIGNATURE_V2
+
+
+class SimpleDBClient(AWSClient):
+    VERSION = '2009-04-15'
+
+    def __init__(self, endpoint, access_key, secret_key, secure=False):
+        self.boxUssage = 0
+        AWSClient.__init__(self, endpoint, access_key, secret_key, secure)
+
+    async def select(self, selectExpression, consistentRead=None, nextToken=None, endpoint=None):
+        """
+        The Select operation returns a set of Attributes for ItemNames that match the select expression
+        http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_Select.html
+        @type selectExpression: the expression used to query the domain
+        @type selectExpression: str
+        @type consistentRead: when set to true, ensures that the most recent data is returned
+        @type consistentRead: bool
+        @type nextToken: where to start the next list of ItemNames
+        @type nextToken: str
+        @return: {'Items': list of items, 'NextToken': None on the last page, 'BoxUsage': float}, pass NextToken
+                 back for the following page
+        @rtype: dict
+        """
+        query = {'Action': 'Select', 'SelectExpression': selectExpression, 'Version': self.VERSION}
+        if consistentRead is not None:
+            query['ConsistentRead'] = consistentRead
+        if nextToken is not None:
+            query['NextToken'] = nextToken
+        data = await self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        data = data['awsresponse']
+        boxUsage = float(data['SelectResponse']['ResponseMetadata']['BoxUsage'])
+        self.boxUssage += boxUsage
+        data = data['SelectResponse']['SelectResult']
+        page = {'Items': [], 'NextToken': None, 'BoxUsage': boxUsage}
+        if isinstance(data, str):
+            return page
+        page['NextToken'] = data.get('NextToken')
+        if 'Item' in data:
+            page['Items'] = [data['Item']] if isinstance(data['Item'], dict) else data['Item']
+        return page
+
+    async def getAttributes(self, domainName, itemName, attributeName=None, consistentRead=None, endpoint=None):
+        """
+        Get the atributes for itemName in domainName
+        http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_GetAttributes.html
+        @return: a tuple of tuples (key, value)
+        @rtype: tuple
+        """
+        query = {'Action': 'GetAttributes', 'ItemName': itemName, 'DomainName': domainName, 'Version': self.VERSION}
+        if attributeName is not None:
+            query['AttributeName'] = attributeName
+        if consistentRead is not None:
+            query['ConsistentRead'] = consistentRead
+        data = await self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        data = data['awsresponse']
+        self.boxUssage += float(data['GetAttributesResponse']['ResponseMetadata']['BoxUsage'])
+        data = data['GetAttributesResponse']['GetAttributesResult']
+        if isinstance(data, str):
+            return None
+        data = data['Attribute']
+        if isinstance(data, dict): data = [data]
+        return tuple((attr['Name'], attr['Value']) for attr in data)
+
+    async def putAttributes(self, domainName, itemName, attributes, expected=None, endpoint=None):
+        """
+        Set/modify atributes for itemName in domainName
+        http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_PutAttributes.html
+        @param attributes: the new attributes
+                      ex: {"someattributename" : "somevalue",
+                          "someotherattributename" : ("somevalue", True) #=> indicates force owerwrite
+                          }
+                      or (("someattributename", "somevalue"), ("someotherattrname", "somevalue", True))
+        @type attributes: dict, tuple
+        @param expected: manipulate the attributes only if this attributes exist
+                      ex: {"someattributename" : ("somevalue", 1),
+                          "someotherattributename" : ("somevalue", 0)}
+        @type expected: dict
+        """
+        query = {'Action': 'PutAttributes', 'ItemName': itemName, 'DomainName': domainName, 'Version': self.VERSION}
+        i = 1
+        if isinstance(attributes, dict): attributes = attributes.items()
+        for attribute in attributes:
+            value = attribute[1]
+            query['Attribute.%d.Name' % (i,)] = attribute[0]
+            if isinstance(value, tuple) or isinstance(value, list):
+                query['Attribute.%d.Value' % (i,)] = value[0]
+                query['Attribute.%d.Replace' % (i,)] = value[1]
+            else:
+                if not isinstance(value, str): value = repr(value)
+                query['Attribute.%d.Value' % (i,)] = value
+            i += 1
+        if expected is not None:
+            i = 1
+            for name in expected:
+                query['Expected.%d.Name' % (i,)] = name
+                query['Expected.%d.Value' % (i,)] = expected[name][0]
+                query['Expected.%d.Exists' % (i,)] = expected[name][1]
+                i += 1
+        data = await self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        self.boxUssage += float(data['awsresponse']['PutAttributesResponse']['ResponseMetadata']['BoxUsage'])
+
+    async def deleteAttributes(self, domainName, itemName, attributes=None, expected=None, endpoint=None):
+        """
+        Delete atributes from itemName in domainName
+        http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_DeleteAttributes.html
+        @param attributes: the attributes to delete {name: value}, None deletes the whole item
+        @type attributes: dict
+        @param expected: manipulate the attributes only if this attributes exist
+                      ex: {"someattributename" : ("somevalue", 1),
+                          "someotherattributename" : ("somevalue", 0)}
+        @type expected: dict
+        """
+        query = {'Action': 'DeleteAttributes', 'ItemName': itemName, 'DomainName': domainName,
+                 'Version': self.VERSION}
+        if attributes is not None:
+            i = 1
+            for name in attributes:
+                query['Attribute.%d.Name' % (i,)] = name
+                query['Attribute.%d.Value' % (i,)] = attributes[name]
+                i += 1
+        if expected is not None:
+            i = 1
+            for name in expected:
+                query['Expected.%d.Name' % (i,)] = name
+                query['Expected.%d.Value' % (i,)] = expected[name][0]
+                query['Expected.%d.Exists' % (i,)] = expected[name][1]
+                i += 1
+        data = await self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        self.boxUssage += float(data['awsresponse']['DeleteAttributesResponse']['ResponseMetadata']['BoxUsage'])
+
+    async def batchPutAttributes(self, domainName, items, endpoint=None):
+        """
+        Set/modify atributes for multiple items from a given domain
+        http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_BatchPutAttributes.html
+        @param items: items to have their attributes manipulated
+                      ex: {"someItemname":{"someattributename" : "somevalue",
+                                       "someotherattributename" : ("somevalue", True) #=> indicates force owerwrite
+                                       }
+                        "someotherItemname":{"someattributename" : "somevalue"}}
+        @type items: dict
+        """
+        query = {'Action': 'BatchPutAttributes', 'DomainName': domainName, 'Version': self.VERSION}
+        i = 1
+        for itemName in items:
+            if i > 25:
+                raise UserInputException('25 item limit per BatchPutAttributes operation exceded')
+            query['Item.%d.ItemName' % (i,)] = itemName
+            a = 1
+            for attributeName in items[itemName]:
+                if a > 256:
+                    raise UserInputException('256 attribute name-value pairs per item exceded')
+                query['Item.%d.Attribute.%d.Name' % (i, a)] = attributeName
+                value = items[itemName][attributeName]
+                if isinstance(value, tuple) or isinstance(value, list):
+                    query['Item.%d.Attribute.%d.Value' % (i, a)] = value[0]
+                    query['Item.%d.Attribute.%d.Replace' % (i, a)] = value[1]
+                else:
+                    query['Item.%d.Attribute.%d.Value' % (i, a)] = value
+                a += 1
+            i += 1
+        data = await self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        self.boxUssage += float(data['awsresponse']['BatchPutAttributesResponse']['ResponseMetadata']['BoxUsage'])
+
+    async def batchDeleteAttributes(self, domainName, items, endpoint=None):
+        """
+        Delete atributes for multiple items
+        http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_BatchDeleteAttributes.html
+        @param items: items to have their attributes deleted
+                      ex: {"someItemname":{"someattributename" : "somevalue",
+                                       "someotherattributename" : "somevalue"}
+                        "someotherItemname":{"someattributename" : "somevalue"}}
+        @type items: dict
+        """
+        query = {'Action': 'BatchDeleteAttributes', 'DomainName': domainName, 'Version': self.VERSION}
+        i = 1
+        for itemName in items:
+            query['Item.%d.ItemName' % (i,)] = itemName
+            a = 1
+            for attributeName in items[itemName]:
+                query['Item.%d.Attribute.%d.Name' % (i, a)] = attributeName
+                query['Item.%d.Attribute.%d.Value' % (i, a)] = items[itemName][attributeName]
+                a += 1
+            i += 1
+        data = await self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        self.boxUssage += float(
+            data['awsresponse']['BatchDeleteAttributesResponse']['ResponseMetadata']['BoxUsage'])
+
+    #================================== helper functionality ===========================================================
+    EXCEPTIONS = extractExceptionsFromModule2Dicitonary('awsutils.exceptions.sdb',
+                                                        awsutils.exceptions.sdb.SDBException)
+
+    def checkForErrors(self, awsresponse, httpstatus, httpreason, httpheaders):
+        if 'Response' in awsresponse and 'Errors' in awsresponse['Response']:
+            #raise the first error we found
+            errors = awsresponse['Response']['Errors']['Error']
+            if isinstance(errors, dict): errors = [errors]
+            for error in errors:
+                self.boxUssage += float(error['BoxUsage'])
+            for error in errors:
+                if error['Code'].replace('.', '_') in self.EXCEPTIONS:
+                    raise self.EXCEPTIONS[error['Code'].replace('.', '_')](awsresponse, httpstatus, httpreason,
+                                                                           httpheaders)
+            else:
+                raise awsutils.exceptions.sdb.SDBException(awsresponse, httpstatus, httpreason, httpheaders)
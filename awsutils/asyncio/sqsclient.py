@@ -0,0 +1,200 @@
+# awsutils/asyncio/sqsclient.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import hashlib
+from awsutils.asyncio.awsclient import AWSClient
+from awsutils.sqs.urlcache import DEFAULT_URL_CACHE
+from awsutils.exceptions.aws import UserInputException, IntegrityCheckException, extractExceptionsFromModule2Dicitonary
+import awsutils.exceptions.sqs
+from awsutils.utils.auth import SIGNATURE_V4_HEADERS, canonicalQueryString
+
+
+class SQSClient(AWSClient):
+    VERSION = '2012-11-05'
+
+    def __init__(self, endpoint, access_key, secret_key, accNumber=None, secure=False, urlcache=None):
+        """
+        @param accNumber: the account number owning the queues, if None it's looked up (with GetQueueUrl) on the
+                          first use of every queue and remembered in urlcache
+        @type accNumber: str
+        @param urlcache: by default the in process DEFAULT_URL_CACHE
+        @type urlcache: SQSQueueUrlCache
+        """
+        AWSClient.__init__(self, endpoint, access_key, secret_key, secure)
+        self.accNumber = accNumber
+        self.urlcache = DEFAULT_URL_CACHE if urlcache is None else urlcache
+
+    async def _sqsrequest(self, query, qName=None, method="GET"):
+        query['Version'] = self.VERSION
+        uri = '/' if qName is None else await self.queueUri(qName)
+        if method == "POST":
+            # the batch requests may be too big for an url
+            data = await self.request(method="POST", signmethod=SIGNATURE_V4_HEADERS,
+                                      body=canonicalQueryString(query).encode(),
+                                      headers={'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'},
+                                      region=self.endpoint[4:-14], service='sqs', uri=uri)
+        else:
+            data = await self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query,
+                                      region=self.endpoint[4:-14], service='sqs', uri=uri)
+        return data['awsresponse']
+
+    async def queueUri(self, qName):
+        """
+        @return: the path of the queue url
+        @rtype: str
+        """
+        accNumber = self.accNumber
+        if accNumber is None:
+            accNumber = self.urlcache.get(self.access_key, self.endpoint, qName)
+        if accNumber is None:
+            url = await self.getQueueUrl(qName)
+            accNumber = url['accNumber']
+            self.urlcache.set(self.access_key, self.endpoint, qName, accNumber)
+        return "/%s/%s" % (accNumber, qName)
+
+    async def getQueueUrl(self, qName, queueOwnerAWSAccountId=None):
+        query = {'Action': 'GetQueueUrl', 'QueueName': qName}
+        if queueOwnerAWSAccountId is not None:
+            query['QueueOwnerAWSAccountId'] = queueOwnerAWSAccountId
+        data = await self._sqsrequest(query)
+        url = data['GetQueueUrlResponse']['GetQueueUrlResult']['QueueUrl'].split('/')
+        return {'endpoint': url[-3], 'accNumber': url[-2], 'qName': url[-1]}
+
+    async def receiveMessage(self, qName, attributes=None, maxNumberOfMessages=None, visibilityTimeout=None,
+                             waitTimeSeconds=None):
+        query = {'Action': 'ReceiveMessage'}
+        if maxNumberOfMessages is not None:
+            query['MaxNumberOfMessages'] = maxNumberOfMessages
+        if visibilityTimeout is not None:
+            query['VisibilityTimeout'] = visibilityTimeout
+        if waitTimeSeconds is not None:
+            query['WaitTimeSeconds'] = waitTimeSeconds
+        if isinstance(attributes, str):
+            query['AttributeName.1'] = attributes
+        elif isinstance(attributes, list):
+            for i in range(0, len(attributes)):
+                query['AttributeName.%d' % (i + 1,)] = attributes[i]
+        data = await self._sqsrequest(query, qName)
+        data = data['ReceiveMessageResponse']['ReceiveMessageResult']
+        if not isinstance(data, dict):
+            return []
+        if isinstance(data['Message'], dict):
+            return [data['Message']]
+        return data['Message']
+
+    async def deleteMessage(self, qName, receiptHandle):
+        data = await self._sqsrequest({'Action': 'DeleteMessage', 'ReceiptHandle': receiptHandle}, qName)
+        data['DeleteMessageResponse']
+
+    async def deleteMessageBatch(self, qName, receiptHandles):
+        """
+        @return: the ids of the successfully deleted entries, the receipt handle at index i has the id 'id-<i+1>'
+        @rtype: list
+        """
+        query = {'Action': 'DeleteMessageBatch'}
+        for i, receiptHandle in enumerate(receiptHandles, 1):
+            query['DeleteMessageBatchRequestEntry.%d.Id' % (i,)] = 'id-%d' % (i,)
+            query['DeleteMessageBatchRequestEntry.%d.ReceiptHandle' % (i,)] = receiptHandle
+        data = await self._sqsrequest(query, qName)
+        data = data['DeleteMessageBatchResponse']['DeleteMessageBatchResult']
+        if not isinstance(data, dict) or 'DeleteMessageBatchResultEntry' not in data:
+            return []
+        data = data['DeleteMessageBatchResultEntry']
+        if isinstance(data, dict):
+            return [data['Id']]
+        return [item['Id'] for item in data]
+
+    async def changeMessageVisibility(self, qName, receiptHandle, visibilityTimeout):
+        if visibilityTimeout > 43200:
+            raise UserInputException('param visibilityTimeout too big (max 43200 seconds)')
+        data = await self._sqsrequest({'Action': 'ChangeMessageVisibility', 'ReceiptHandle': receiptHandle,
+                                       'VisibilityTimeout': visibilityTimeout}, qName)
+        return data['ChangeMessageVisibilityResponse']
+
+    async def changeMessageVisibilityBatch(self, qName, receipts):
+        """
+        @param receipts: dictionary {receiptHandle:visibilityTimeout}
+        @type receipts: dict
+        """
+        query = {'Action': 'ChangeMessageVisibilityBatch'}
+        for i, receiptHandle in enumerate(receipts, 1):
+            if receipts[receiptHandle] > 43200:
+                raise UserInputException('param visibilityTimeout too big (max 43200 seconds)')
+            query['ChangeMessageVisibilityBatchRequestEntry.%s.Id' % (i,)] = 'msg%s' % (i,)
+            query['ChangeMessageVisibilityBatchRequestEntry.%s.ReceiptHandle' % (i,)] = receiptHandle
+            query['ChangeMessageVisibilityBatchRequestEntry.%s.VisibilityTimeout' % (i,)] = receipts[receiptHandle]
+        data = await self._sqsrequest(query, qName)
+        return data['ChangeMessageVisibilityBatchResponse']
+
+    async def sendMessage(self, qName, messageBody, delaySeconds=None, hashcheck=False):
+        query = {'Action': 'SendMessage', 'MessageBody': messageBody}
+        if delaySeconds is not None:
+            if delaySeconds > 900:
+                raise UserInputException('param delaySeconds too big (max 900 seconds)')
+            query['DelaySeconds'] = delaySeconds
+        data = await self._sqsrequest(query, qName, method="POST")
+        md5message = data['SendMessageResponse']['SendMessageResult']['MD5OfMessageBody']
+        if hashcheck:
+            md5calculated = hashlib.md5(messageBody.encode(encoding='utf8')).hexdigest()
+            if md5message != md5calculated:
+                raise IntegrityCheckException("sendMessage unexpected MD5OfMessageBody received",
+                                              md5message, md5calculated)
+
+    async def sendMessageBatch(self, qName, entries, hashcheck=False):
+        """
+        See awsutils.sqsclient.SQSClient.sendMessageBatch
+        @return: successful {index:MessageId}, failed {index:{'Code', 'Message', 'SenderFault'}}
+        @rtype: tuple
+        """
+        if not 0 < len(entries) <= 10:
+            raise UserInputException('param entries should have between 1 and 10 items')
+        query = {'Action': 'SendMessageBatch'}
+        bodies = []
+        for i, entry in enumerate(entries, 1):
+            delaySeconds = None
+            if not isinstance(entry, str):
+                entry, delaySeconds = entry
+            query['SendMessageBatchRequestEntry.%d.Id' % (i,)] = 'msg-%d' % (i,)
+            query['SendMessageBatchRequestEntry.%d.MessageBody' % (i,)] = entry
+            if delaySeconds is not None:
+                if delaySeconds > 900:
+                    raise UserInputException('param delaySeconds too big (max 900 seconds)')
+                query['SendMessageBatchRequestEntry.%d.DelaySeconds' % (i,)] = delaySeconds
+            bodies.append(entry)
+        data = await self._sqsrequest(query, qName, method="POST")
+        data = data['SendMessageBatchResponse']['SendMessageBatchResult']
+        successful, failed = {}, {}
+        if not isinstance(data, dict):
+            return successful, failed
+        items = data.get('SendMessageBatchResultEntry', [])
+        if isinstance(items, dict): items = [items]
+        for item in items:
+            index = int(item['Id'][4:]) - 1
+            if hashcheck:
+                md5calculated = hashlib.md5(bodies[index].encode(encoding='utf8')).hexdigest()
+                if item['MD5OfMessageBody'] != md5calculated:
+                    failed[index] = {'Code': 'MD5OfMessageBodyMismatch', 'SenderFault': 'false',
+                                     'Message': 'expected %s received %s' % (md5calculated,
+                                                                             item['MD5OfMessageBody'])}
+                    continue
+            successful[index] = item['MessageId']
+        items = data.get('BatchResultErrorEntry', [])
+        if isinstance(items, dict): items = [items]
+        for item in items:
+            failed[int(item['Id'][4:]) - 1] = item
+        return successful, failed
+
+    #================================== helper functionality ===========================================================
+    EXCEPTIONS = extractExceptionsFromModule2Dicitonary('awsutils.exceptions.sqs', awsutils.exceptions.sqs.SQSException)
+
+    def checkForErrors(self, awsresponse, httpstatus, httpreason, httpheaders):
+        if 'ErrorResponse' in awsresponse and 'Error' in awsresponse['ErrorResponse']:
+            error = awsresponse['ErrorResponse']['Error']
+            if error['Code'].replace('.', '_') in self.EXCEPTIONS:
+                raise self.EXCEPTIONS[error['Code'].replace('.', '_')](awsresponse, httpstatus, httpreason,
+                                                                       httpheaders)
+            else:
+                raise awsutils.exceptions.sqs.SQSException(awsresponse, httpstatus, httpreason, httpheaders)
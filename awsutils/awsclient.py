@@ -4,38 +4,73 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import time, io, socket, tempfile, logging
-import http.client
-import xml.sax
+import time, io, socket, logging
 
-try:
-    from select import poll as select_poll
-    from select import POLLIN as select_POLLIN
-except ImportError:  # Doesn't exist on OSX and other platforms
-    from select import select
-
-    select_poll = False
-
-from awsutils.utils.xmlhandler import AWSXMLHandler
-from awsutils.exceptions.aws import AWSTimeout, AWSDataException, AWSPartialReception, AWSStatusException
+from awsutils.utils.connectionpool import ConnectionPool, isConnectionUsable
+from awsutils.utils.xmlhandler import AWSXMLExpatDecoder
+from awsutils.exceptions.aws import AWSTimeout, AWSDataException, AWSPartialReception, AWSStatusException, \
+    UserInputException
 import awsutils.utils.auth as auth
+from awsutils.utils.spool import ThresholdSpool
 
 class AWSClient:
     MAX_IN_MEMORY_READ_CHUNK_SIZE_FOR_RAW_DATA = 1024 * 1024
     HTTP_CONNECTION_RETRY_NUMBER = 3
     HTTP_RECEPTION_TIMEOUT = 30
     TEMP_DIR = '.'
+    HTTP_CONNECTION_POOL_SIZE = 10
+    HTTP_CONNECTION_IDLE_TIMEOUT = 60
+    HTTP_CONNECTION_POOL_WAIT_TIMEOUT = None
+    # the size of the reusable buffer the raw (non xml) responses are read into
+    READ_CHUNK_SIZE = 32768
+    # where the raw responses are received when no inputobject is given (see awsutils.utils.spool), by default
+    # a ThresholdSpool of MAX_IN_MEMORY_READ_CHUNK_SIZE_FOR_RAW_DATA in TEMP_DIR
+    SPOOL_POLICY = None
+    # the response xml decoder, can be overridden per client instance (ex: with AWSXMLSaxDecoder)
+    XML_DECODER = AWSXMLExpatDecoder
 
     def __init__(self, endpoint, access_key, secret_key, secure=False):
         self.endpoint = endpoint
         self.access_key = access_key
         self.secret_key = secret_key
         self.secure = secure
-        self.connections = {}
+        self.connections = ConnectionPool(secure=secure, maxsize=self.HTTP_CONNECTION_POOL_SIZE,
+                                          idletimeout=self.HTTP_CONNECTION_IDLE_TIMEOUT,
+                                          waittimeout=self.HTTP_CONNECTION_POOL_WAIT_TIMEOUT)
         self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
         self.logger.addHandler(logging.NullHandler())
         self.count = {}
 
+    def createSpool(self, size, spool=None):
+        """
+        @param size: the size of the data to be received, None if unknown
+        @type size: int
+        @param spool: the spool policy, by default SPOOL_POLICY
+        @type spool: object
+        @return: a file like object where a response body of size bytes can be received
+        @rtype: object
+        """
+        if spool is None:
+            spool = self.SPOOL_POLICY
+        if spool is None:
+            spool = ThresholdSpool(self.MAX_IN_MEMORY_READ_CHUNK_SIZE_FOR_RAW_DATA, self.TEMP_DIR)
+        return spool.create(size)
+
+    def _writableBuffer(self, inputobject):
+        """
+        @return: a writable byte memoryview of inputobject if it exposes one (bytearray, mmap, ...), else None
+        @rtype: memoryview
+        """
+        if inputobject is None:
+            return None
+        try:
+            view = memoryview(inputobject)
+        except TypeError:
+            return None
+        if view.readonly:
+            return None
+        return view.cast('B')
+
     def checkForErrors(self, awsresponse, httpstatus, httpreason, httpheaders):
         """
         Checks for aws error responses, this should be overriden by each subclass
@@ -43,44 +78,19 @@ class AWSClient:
         pass
 
     def closeConnections(self):
-        for connection in self.connections.values():
-            connection.close()
+        self.connections.closeAll()
 
     def is_connection_usable(self, httpconnection):
-        sock = httpconnection.sock
-        if sock is None:
-            return False
-            # if we have to read that means either that the connection was dropped, or that we have input data and that
-            # is not a good thing in this scenario
-        if not select_poll:
-            return select([sock], [], [], 0.0)[0] == []
-        p = select_poll()
-        p.register(sock, select_POLLIN)
-        for (fno, _ev) in p.poll(0.0):
-            if fno == sock.fileno():
-                return False
-        return True
+        return isConnectionUsable(httpconnection)
 
     def getConnection(self, destination, port=None, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
-        #TODO: if there is need we can implement here proxy and socks proxy support
-        #TODO: for having this module thread safe we should bind the current thread to the connection pool key so each
-        # thread will have separate connection
-        if destination in self.connections:
-            if self.is_connection_usable(self.connections[destination]) and (
-                self.connections[destination]._HTTPConnection__state == http.client._CS_IDLE):
-                return self.connections[destination]
-                # this connection is bogus or dropped so close it
-            self.connections[destination].close()
-
-        self.logger.debug("connecting to %s", destination)
-        if self.secure:
-            #TODO: https context (certificate) checking
-            conn = http.client.HTTPSConnection(destination, timeout=timeout)
-        else:
-            conn = http.client.HTTPConnection(destination, timeout=timeout)
-
-        self.connections[destination] = conn
-        return conn
+        """
+        Check out a connection for destination from the pool, it has to be given back with releaseConnection
+        """
+        return self.connections.checkout(destination, timeout=timeout)
+
+    def releaseConnection(self, destination, connection):
+        self.connections.checkin(destination, connection)
 
     def request(self, method='GET', host=None, uri='/', headers=None, query=None, body=b'',
                 region=None, service=None,
@@ -93,11 +103,32 @@ class AWSClient:
                 operationtimeout=None,
                 retry=None,
                 receptiontimeout=None,
+                xmldecoder=None,
+                readchunksize=None,
+                spool=None,
+                formencoded=False,
                 _inputIOWrapper=None):
+        """
+        @param inputobject: where a raw response is received, any object implementing write(bytes) (the passed
+                            buffer is reused after write returns, so it must not be kept) or an object exposing a
+                            writable buffer (bytearray, mmap, ...) that is filled in place from its start
+        @type inputobject: object
+        @param xmldecoder: factory of the xml response decoder, by default XML_DECODER, a new decoder is created
+                           for every attempt
+        @type xmldecoder: function
+        @param readchunksize: the size of the chunks a raw response is read with, by default READ_CHUNK_SIZE
+        @type readchunksize: int
+        @param spool: the spool policy used if there is no inputobject, by default SPOOL_POLICY
+        @type spool: object
+        @param formencoded: send the signed query as an application/x-www-form-urlencoded body (use it with POST)
+                            instead of the url, for the requests too big for an url
+        @type formencoded: bool
+        """
 
         if retry is None: retry = self.HTTP_CONNECTION_RETRY_NUMBER
         if receptiontimeout is None: receptiontimeout = self.HTTP_RECEPTION_TIMEOUT
         if host is None: host = self.endpoint
+        if readchunksize is None: readchunksize = self.READ_CHUNK_SIZE
 
         _redirectcount = 0
         _retrycount = 0
@@ -107,60 +138,137 @@ class AWSClient:
         if query is None: query = {}
         if statusexpected is None: statusexpected = [200]
         headers['Connection'] = 'keep-alive'
+        if formencoded:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded; charset=utf-8'
         starttime = time.time()
+        # every attempt is signed from a copy, the signing adds its own parameters
+        requestheaders, requestquery = headers, query
+
+        conn = None
+        try:
+            while True:
+                # if request body is an io like object ensure that we set the pointer back to the start before retrying
+                if hasattr(body, 'reset'):
+                    if _redirectcount > 0 or _retrycount > 0:
+                        body.reset()
+                else:
+                    try:
+                        if _outputiooffset is None:
+                            _outputiooffset = body.tell()
+                        else:
+                            body.seek(_outputiooffset, io.SEEK_SET)
+                    except:
+                        pass
+
+                # give back the connection used by the previous attempt before checking out a new one
+                if conn is not None:
+                    self.releaseConnection(connhost, conn)
+                    conn = None
+                connhost = host
+                conn = self.getConnection(destination=host, timeout=receptiontimeout)
+
+                headers, query, body, querystring = auth.signRequestWithQueryString(
+                    access_key=self.access_key, secret_key=self.secret_key, endpoint=host, region=region,
+                    service=service, signmethod=signmethod, date=date, uri=uri, method=method,
+                    headers=dict(requestheaders), query=dict(requestquery), body=body, expires=expires)
+
+                self.logger.debug("Requesting %s %s %s query=%s headers=%s", method, host, uri, query, headers)
+
+                if formencoded:
+                    body = querystring.encode()
+                    url = uri
+                elif querystring != '':
+                    url = "%s?%s" % (uri, querystring)
+                else:
+                    url = uri
+
+                #counting the requests
+                if method not in self.count:
+                    self.count[method] = 0
+                self.count[method] += 1
 
-        while True:
-            # if request body is an io like object ensure that we set the pointer back to the start before retrying
-            if hasattr(body, 'reset'):
-                if _redirectcount > 0:
-                    body.reset()
-            else:
                 try:
-                    if _outputiooffset is None:
-                        _outputiooffset = body.tell()
+                    conn.request(method=method, url=url, body=body, headers=headers)
+                    response = conn.getresponse()
+                except Exception as _e:
+                    if _retrycount < retry:
+                        _retrycount += 1
+                        continue
+                    raise
+
+                data = None
+
+                if xmlexpected or ('Content-Type' in response.headers and
+                                   response.headers['Content-Type'] in ('application/xml', 'text/xml')):
+
+                    if ('Content-Length' not in response.headers) and ('Transfer-Encoding' not in response.headers or
+                                                                       response.headers['Transfer-Encoding'] != 'chunked'):
+                    #every xml response should have 'Content-Length' set or 'Transfer-Encoding' = chunked
+                    #take a peek of the data then consume the rest of it
+                        try:
+                            data = response.read(1024)
+                            while response.read(32768) != b'':
+                                pass
+                        except:
+                            pass
+                        resultdata = {'status':response.status, 'reason':response.reason, 'headers':dict(response.headers),
+                                      'data':data, 'type':'error'}
+                        raise AWSDataException('missing content length', resultdata)
+
+                    decoder = self.XML_DECODER() if xmldecoder is None else xmldecoder()
+
+                    doretry = False
+                    while True:
+                        try:
+                            if (operationtimeout is not None) and (time.time() - starttime > operationtimeout):
+                                raise AWSTimeout('operation timeout')
+                            data = response.read(amt=32768)
+                        except:
+                            # TODO: not all exception should retry, maybe an exception white list would be the way to go
+                            if _retrycount < retry:
+                                _retrycount += 1
+                                doretry = True
+                                break
+                            raise
+                        if len(data) == 0:
+                            break
+                        self.logger.debug("Received >> %s", data)
+                        decoder.feed(data)
+                    if doretry:
+                        continue
+
+                    awsresponse = decoder.getdict()
+
+                    if awsresponse is not None:
+                        if 300 <= response.status < 400:
+                            try:
+                                #TODO: we should differentiate between temporary and permanent redirect,
+                                #and handle correctly the second
+                                if awsresponse['Error']['Code'] in ('TemporaryRedirect', 'PermanentRedirect', 'Redirect'):
+                                    redirect = awsresponse['Error']['Endpoint']
+                                    if _redirectcount < 3:
+                                        _redirectcount += 1
+                                        host = redirect
+                                        continue
+                            except:
+                                pass
+
+                        if self.checkForErrors(awsresponse, response.status, response.reason, response.headers) is True:
+                            if _retrycount < retry:
+                                _retrycount += 1
+                                doretry = True
+                                break
+
+                    resultdata = {'status':response.status, 'reason':response.reason, 'headers':dict(response.headers),
+                                  'awsresponse':awsresponse, 'type':'xmldict'}
+
+                    if statusexpected is not True and response.status not in statusexpected:
+                        raise AWSStatusException(resultdata)
                     else:
-                        body.seek(_outputiooffset, io.SEEK_SET)
-                except:
-                    pass
-
-            conn = self.getConnection(destination=host, timeout=receptiontimeout)
-
-            headers, query, body = auth.signRequest(access_key=self.access_key, secret_key=self.secret_key,
-                                                         endpoint=host, region=region, service=service,
-                                                         signmethod=signmethod, date=date,
-                                                         uri=uri, method=method, headers=headers,
-                                                         query=query, body=body, expires=expires)
-
-            self.logger.debug("Requesting %s %s %s query=%s headers=%s", method, host, uri, query, headers)
-
-            if query != {}:
-                url = "%s?%s" % (uri, auth.canonicalQueryString(query))
-            else:
-                url = uri
-
-            #counting the requests
-            if method not in self.count:
-                self.count[method] = 0
-            self.count[method] += 1
-
-            try:
-                conn.request(method=method, url=url, body=body, headers=headers)
-                response = conn.getresponse()
-            except Exception as _e:
-                if _retrycount < retry:
-                    _retrycount += 1
-                    continue
-                raise
-
-            data = None
-
-            if xmlexpected or ('Content-Type' in response.headers and
-                               response.headers['Content-Type'] in ('application/xml', 'text/xml')):
-
-                if ('Content-Length' not in response.headers) and ('Transfer-Encoding' not in response.headers or
-                                                                   response.headers['Transfer-Encoding'] != 'chunked'):
-                #every xml response should have 'Content-Length' set or 'Transfer-Encoding' = chunked
-                #take a peek of the data then consume the rest of it
+                        return resultdata
+
+                if statusexpected is not True and response.status not in statusexpected:
+                    #take a peek of the data then consume the rest of it
                     try:
                         data = response.read(1024)
                         while response.read(32768) != b'':
@@ -169,136 +277,83 @@ class AWSClient:
                         pass
                     resultdata = {'status':response.status, 'reason':response.reason, 'headers':dict(response.headers),
                                   'data':data, 'type':'error'}
-                    raise AWSDataException('missing content length', resultdata)
+                    raise AWSStatusException(resultdata)
 
-                handler = AWSXMLHandler()
-                incrementalParser = xml.sax.make_parser()
-                incrementalParser.setContentHandler(handler)
+                if 'Content-Length' not in response.headers:
+                    #every non xml response should have  'Content-Length' set
+                    #take a peek of the data then consume the rest of it
+                    try:
+                        data = response.read(1024)
+                        while response.read(32768) != b'':
+                            pass
+                    except:
+                        pass
+                    if data == b'':
+                        return {'status':response.status, 'reason':response.reason,
+                                'headers':dict(response.headers), 'type':'empty'}
+
+                    raise AWSDataException('missing content length', {'status':response.status, 'reason':response.reason,
+                                                                      'headers':dict(response.headers),'data':data,
+                                                                      'type':'error'})
+
+                #if we are here then most probably we want to download some data
+                size = int(response.headers['Content-Length'])
+                if response.status == 206:
+                    contentrange = response.headers['Content-Range']
+                    contentrange = contentrange.split(' ')[1].split('/')
+                    range = contentrange[0].split('-')
+                    sizeinfo = {'size': int(contentrange[1]), 'start': int(range[0]), 'end': int(range[1]), 'downloaded': 0}
+                elif response.status == 200:
+                    sizeinfo = {'size': size, 'start': 0, 'end': size - 1, 'downloaded': 0}
+
+                if inputobject is None:
+                    inputobject = self.createSpool(size, spool)
+                    if _inputIOWrapper is not None:
+                        inputobject = _inputIOWrapper(inputobject)
+
+                target = self._writableBuffer(inputobject)
+                if target is None:
+                    readbuffer = memoryview(bytearray(readchunksize))
+                elif size > len(target):
+                    # the response body is not consumed, the connection can't be reused
+                    conn.close()
+                    raise UserInputException('inputobject buffer of %d bytes is too small for the %d bytes response'
+                                             % (len(target), size))
+
+                ammount = 0
 
-                doretry = False
                 while True:
                     try:
                         if (operationtimeout is not None) and (time.time() - starttime > operationtimeout):
                             raise AWSTimeout('operation timeout')
-                        data = response.read(amt=32768)
-                    except:
+                        if target is None:
+                            received = response.readinto(readbuffer)
+                        else:
+                            received = response.readinto(target[ammount:ammount + readchunksize])
+                        ammount += received
+
+                    except Exception as e:
+                        if ammount > 0:
+                            # don't loose partial data yet, it may be useful even in this situation
+                            sizeinfo['downloaded'] = ammount
+                            raise AWSPartialReception(status=response.status, reason=response.reason,
+                                                      headers=dict(response.headers), data=inputobject, sizeinfo=sizeinfo,
+                                                      exception=e)
+
                         # TODO: not all exception should retry, maybe an exception white list would be the way to go
                         if _retrycount < retry:
                             _retrycount += 1
-                            doretry = True
                             break
                         raise
-                    if len(data) == 0:
-                        break
-                    self.logger.debug("Received >> %s", data)
-                    incrementalParser.feed(data)
-                if doretry:
-                    continue
-
-                awsresponse = handler.getdict()
-
-                if awsresponse is not None:
-                    if 300 <= response.status < 400:
-                        try:
-                            #TODO: we should differentiate between temporary and permanent redirect,
-                            #and handle correctly the second
-                            if awsresponse['Error']['Code'] in ('TemporaryRedirect', 'PermanentRedirect', 'Redirect'):
-                                redirect = awsresponse['Error']['Endpoint']
-                                if _redirectcount < 3:
-                                    _redirectcount += 1
-                                    host = redirect
-                                    continue
-                        except:
-                            pass
-
-                    if self.checkForErrors(awsresponse, response.status, response.reason, response.headers) is True:
-                        if _retrycount < retry:
-                            _retrycount += 1
-                            doretry = True
-                            break
-
-                resultdata = {'status':response.status, 'reason':response.reason, 'headers':dict(response.headers),
-                              'awsresponse':awsresponse, 'type':'xmldict'}
-
-                if statusexpected is not True and response.status not in statusexpected:
-                    raise AWSStatusException(resultdata)
-                else:
-                    return resultdata
-
-            if statusexpected is not True and response.status not in statusexpected:
-                #take a peek of the data then consume the rest of it
-                try:
-                    data = response.read(1024)
-                    while response.read(32768) != b'':
-                        pass
-                except:
-                    pass
-                resultdata = {'status':response.status, 'reason':response.reason, 'headers':dict(response.headers),
-                              'data':data, 'type':'error'}
-                raise AWSStatusException(resultdata)
-
-            if 'Content-Length' not in response.headers:
-                #every non xml response should have  'Content-Length' set
-                #take a peek of the data then consume the rest of it
-                try:
-                    data = response.read(1024)
-                    while response.read(32768) != b'':
-                        pass
-                except:
-                    pass
-                if data == b'':
-                    return {'status':response.status, 'reason':response.reason,
-                            'headers':dict(response.headers), 'type':'empty'}
-
-                raise AWSDataException('missing content length', {'status':response.status, 'reason':response.reason,
-                                                                  'headers':dict(response.headers),'data':data,
-                                                                  'type':'error'})
-
-            #if we are here then most probably we want to download some data
-            size = int(response.headers['Content-Length'])
-            if response.status == 206:
-                contentrange = response.headers['Content-Range']
-                contentrange = contentrange.split(' ')[1].split('/')
-                range = contentrange[0].split('-')
-                sizeinfo = {'size': int(contentrange[1]), 'start': int(range[0]), 'end': int(range[1]), 'downloaded': 0}
-            elif response.status == 200:
-                sizeinfo = {'size': size, 'start': 0, 'end': size - 1, 'downloaded': 0}
-
-            if inputobject is None:
-                if size > self.MAX_IN_MEMORY_READ_CHUNK_SIZE_FOR_RAW_DATA:
-                    inputobject = tempfile.TemporaryFile(mode="w+b", dir=self.TEMP_DIR, prefix='awstmp-')
-                else:
-                    inputobject = io.BytesIO()
-                if _inputIOWrapper is not None:
-                    inputobject = _inputIOWrapper(inputobject)
-
-            ammount = 0
-
-            while True:
-                try:
-                    if (operationtimeout is not None) and (time.time() - starttime > operationtimeout):
-                        raise AWSTimeout('operation timeout')
-                    data = response.read(32768)
-                    ammount += len(data)
-
-                except Exception as e:
-                    if ammount > 0:
-                        # don't loose partial data yet, it may be useful even in this situation
-                        sizeinfo['downloaded'] = ammount
-                        raise AWSPartialReception(status=response.status, reason=response.reason,
-                                                  headers=dict(response.headers), data=inputobject, sizeinfo=sizeinfo,
-                                                  exception=e)
-
-                    # TODO: not all exception should retry, maybe an exception white list would be the way to go
-                    if _retrycount < retry:
-                        _retrycount += 1
-                        break
-                    raise
-
-                if (data == b'') or (ammount > size):
-                    return {'status':response.status, 'reason':response.reason, 'headers':dict(response.headers),
-                            'sizeinfo':sizeinfo, 'type':'raw', 'inputobject':inputobject}
-                inputobject.write(data)
 
-            # if we are here then we should retry
-            continue
+                    if (received == 0) or (ammount > size):
+                        return {'status':response.status, 'reason':response.reason, 'headers':dict(response.headers),
+                                'sizeinfo':sizeinfo, 'type':'raw', 'inputobject':inputobject}
+                    if target is None:
+                        inputobject.write(readbuffer[:received])
+
+                # if we are here then we should retry
+                continue
+        finally:
+            if conn is not None:
+                self.releaseConnection(connhost, conn)
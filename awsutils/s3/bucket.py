@@ -4,12 +4,22 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import os, hashlib, logging
+import os, io, json, hashlib, logging, threading, collections, queue
+import http.client
+import concurrent.futures
 from awsutils.s3.object import S3Object
-from awsutils.utils.wrappers import SimpleWindowedFileObjectReadWrapper, SimpleMd5FileObjectWriteWrapper
-from awsutils.exceptions.aws import AWSPartialReception, IntegrityCheckException, UserInputException
+from awsutils.utils.wrappers import SimpleWindowedFileObjectReadWrapper, SimpleMd5FileObjectWriteWrapper, \
+    SimplePositionalFileObjectReadWrapper, SimplePositionalFileObjectWriteWrapper
+from awsutils.exceptions.aws import AWSPartialReception, IntegrityCheckException, UserInputException, AWSTimeout, \
+    AWSException, AWSStatusException
+from awsutils.exceptions.s3 import InvalidRange, NoSuchUpload, InternalError, SlowDown, ServiceUnavailable
 
 class S3Bucket():
+    RANGE_DOWNLOAD_RETRY_NUMBER = 3
+    # the transient errors a range download is retried on, besides any 5xx response
+    RANGE_DOWNLOAD_RETRY_EXCEPTIONS = (OSError, http.client.HTTPException, AWSTimeout, InternalError, SlowDown,
+                                       ServiceUnavailable)
+
     def __init__(self, name, s3client,
                  owner=None,
                  creationdate=None):
@@ -33,7 +43,19 @@ class S3Bucket():
         else:
             return None
 
-    def getObjects(self, delimiter=None, marker=None, prefix=None, _maxkeys=250):
+    def getObjects(self, delimiter=None, marker=None, prefix=None, _maxkeys=250, streaming=False, _prefetch=1):
+        """
+        Generator: list the objects of the bucket
+        @param streaming: yield the objects while the listing responses are still being received, the next page is
+                          requested (on a separate connection) as soon as its marker is known
+        @type streaming: bool
+        @param _prefetch: in streaming mode the number of pages fetched ahead of the one being consumed
+        @type _prefetch: int
+        """
+        if streaming:
+            for item in self._getObjectsStreaming(delimiter, marker, prefix, _maxkeys, _prefetch):
+                yield item
+            return
         while True:
             data = self.s3client.getBucket(bucketname=self.name, delimiter=delimiter, marker=marker, prefix=prefix,
                 maxkeys=_maxkeys)
@@ -47,6 +69,78 @@ class S3Bucket():
             if data['IsTruncated'] != 'true':
                 break
 
+    def _getObjectsStreaming(self, delimiter, marker, prefix, maxkeys, prefetch):
+        # every page is fetched by its own thread into its own queue, the pages queue keeps them in order
+        pages = queue.Queue()
+        # the page being consumed + the ones fetched ahead
+        slots = threading.Semaphore(prefetch + 1)
+        stop = threading.Event()
+
+        def startPage(marker):
+            thread = threading.Thread(target=fetchPage, args=(marker,))
+            thread.daemon = True
+            thread.start()
+
+        def fetchPage(marker):
+            while not slots.acquire(timeout=1):
+                if stop.is_set():
+                    return
+            if stop.is_set():
+                slots.release()
+                return
+            items = queue.Queue()
+            pages.put(items)
+            state = {'truncated': False, 'nextmarker': None, 'lastkey': None, 'nextstarted': False}
+
+            def startNext():
+                if state['truncated'] and state['nextmarker'] is not None and not state['nextstarted']:
+                    state['nextstarted'] = True
+                    startPage(state['nextmarker'])
+
+            def streamcallback(name, value):
+                if name == 'Contents':
+                    # a retried request starts again from the first key of the page
+                    if state['lastkey'] is not None and value['Key'] <= state['lastkey']:
+                        return
+                    state['lastkey'] = value['Key']
+                    items.put(S3Object(name=value['Key'], bucketname=self.name, s3client=self.s3client))
+                elif name == 'IsTruncated':
+                    state['truncated'] = value == 'true'
+                    startNext()
+                elif name == 'NextMarker':
+                    # only returned for delimiter listings, before the Contents entries
+                    state['nextmarker'] = value
+                    startNext()
+
+            try:
+                self.s3client.getBucket(bucketname=self.name, delimiter=delimiter, marker=marker, prefix=prefix,
+                                        maxkeys=maxkeys, streamcallback=streamcallback)
+                if state['nextmarker'] is None:
+                    state['nextmarker'] = state['lastkey']
+                startNext()
+                items.put((None, state['nextstarted']))
+            except Exception as e:
+                items.put((e, False))
+
+        startPage(marker)
+        try:
+            while True:
+                items = pages.get()
+                while True:
+                    item = items.get()
+                    if isinstance(item, S3Object):
+                        yield item
+                        continue
+                    exception, more = item
+                    if exception is not None:
+                        raise exception
+                    break
+                slots.release()
+                if not more:
+                    break
+        finally:
+            stop.set()
+
     def hasObject(self, objectname):
         """
         Checks for an object existence by a head request
@@ -107,8 +201,32 @@ class S3Bucket():
             self.s3client.abortMultipartUpload(bucketname=self.name, objectname=upload['Key'],
                 uploadId=upload['UploadId'])
 
+    def getParts(self, objectname, uploadId, _maxparts=1000):
+        """
+        Generator: list the parts already uploaded for a multipart upload
+        @param objectname: the name of the object in the s3 bucket
+        @type objectname: str
+        @param uploadId: the multipart upload id
+        @type uploadId: str
+        @param _maxparts: this parameter stets the size of items requested per request
+        @type _maxparts: integer
+        """
+        part_number_marker = None
+        while True:
+            data = self.s3client.listParts(bucketname=self.name, objectname=objectname, uploadId=uploadId,
+                                           max_parts=_maxparts, part_number_marker=part_number_marker)
+            if 'Part' not in data:
+                break
+            parts = data['Part']
+            if isinstance(parts, dict): parts = [parts]
+            for part in parts:
+                yield part
+            if data['IsTruncated'] != 'true':
+                break
+            part_number_marker = data['NextPartNumberMarker']
+
     def uploadArbitrarySizedObject(self, objectname, outputobject, start=0, end=None, chunklen=5242880,
-                                   hashcheck=False):
+                                   hashcheck=False, concurrency=1, maxinflightbytes=None, journal=None):
         """
         upload a file like object of arbitrary length, uses multipart upload for files bigger than 2 x chunklen
         @param objectname: the name of the object in the s3 bucket
@@ -124,12 +242,24 @@ class S3Bucket():
         @type chunklen: int
         @param hashcheck: the functions checks for the upload data integrity using md5 hashes (partially implemented)
         @type hashcheck: bool
+        @param concurrency: number of parts uploaded in parallel, each on its own pooled connection
+                            (the s3client HTTP_CONNECTION_POOL_SIZE should be at least this big)
+        @type concurrency: int
+        @param maxinflightbytes: the maximum number of bytes of the parts being uploaded at the same time,
+                                 by default concurrency x chunklen
+        @type maxinflightbytes: int
+        @param journal: file name where the multipart upload progress is saved, if the upload fails it is not
+                        aborted and calling again with the same parameters resumes it, uploading only the parts
+                        missing on s3. The journal is removed once the upload is completed
+        @type journal: str
         @return: {'ETag': '"hash"', 'Bucket': bucketname, 'Location': 'http://bucketname.s3.amazonaws.com/objectname',
                  'Key': objectname}
         @rtype: dict
         """
         if chunklen < 5242880:
             raise UserInputException("Your proposed upload is smaller than the minimum allowed (by amazon) size")
+        if concurrency < 1:
+            raise UserInputException("param concurrency should be at least 1")
 
         closeoutputobject = False
         if isinstance(outputobject, str):
@@ -155,41 +285,14 @@ class S3Bucket():
                 return result
 
             #multipart upload =>
-            end = wrappedobj.end
+            layout = self._multipartLayout(start, wrappedobj.end, chunklen)
+            if journal is not None:
+                return self._resumableUpload(objectname, outputobject, start, wrappedobj.end, chunklen, layout,
+                                             hashcheck, concurrency, maxinflightbytes, journal)
             upload = self.s3client.initiateMultipartUpload(bucketname=self.name, objectname=objectname)
             try:
-                parts = {}
-                for partnumber in range(1, 10000):
-                    if chunklen * 2 > (end - start):
-                        tosendlen = (end - start)
-                    else:
-                        tosendlen = chunklen
-
-                    wrappedobj.resetBoundaries(start=start, end=start + tosendlen)
-
-                    size = wrappedobj.size
-
-                    if size <= 0:
-                        break
-
-                    result = self.s3client.uploadOjectPart(bucketname=self.name,
-                                                           objectname=objectname,
-                                                           partnumber=partnumber, uploadid=upload['UploadId'],
-                                                           value=wrappedobj,
-                                                           objlen=size)
-
-                    senthash = wrappedobj.getMd5HexDigest()
-                    if hashcheck and result['ETag'][1:-1] != senthash:
-                        raise IntegrityCheckException('uploadArbitrarySizedObject.uploadOjectPart unexpected '
-                                                      'ETag received',
-                                                      result['ETag'][1:-1], senthash)
-
-                    parts[partnumber] = result['ETag']
-                    start += tosendlen
-
-                else:
-                    raise Exception("we shouldn't reach this point")
-
+                parts = self._uploadParts(objectname, upload['UploadId'], outputobject, layout, hashcheck,
+                                          concurrency, maxinflightbytes)
                 result = self.s3client.completeMultipartUpload(bucketname=self.name, objectname=objectname,
                                                                uploadId=upload['UploadId'], parts=parts)
                 return result
@@ -202,24 +305,176 @@ class S3Bucket():
             if closeoutputobject:
                 outputobject.close()
 
+    def _multipartLayout(self, start, end, chunklen):
+        """
+        Split the [start, end) interval into parts of chunklen, the last part takes the remainder (< 2 x chunklen)
+        @return: list of (partnumber, start offset, size)
+        @rtype: list
+        """
+        layout = []
+        for partnumber in range(1, 10001):
+            if chunklen * 2 > (end - start):
+                tosendlen = (end - start)
+            else:
+                tosendlen = chunklen
+            if tosendlen <= 0:
+                break
+            layout.append((partnumber, start, tosendlen))
+            start += tosendlen
+        else:
+            raise Exception("we shouldn't reach this point")
+        return layout
+
+    def _uploadPart(self, objectname, uploadid, outputobject, partnumber, start, size, hashcheck, lock):
+        window = SimplePositionalFileObjectReadWrapper(outputobject, start=start, size=size, hashcheck=hashcheck,
+                                                       lock=lock)
+        result = self.s3client.uploadOjectPart(bucketname=self.name, objectname=objectname, partnumber=partnumber,
+                                               uploadid=uploadid, value=window, objlen=size)
+        senthash = window.getMd5HexDigest()
+        if hashcheck and result['ETag'][1:-1] != senthash:
+            raise IntegrityCheckException('uploadArbitrarySizedObject.uploadOjectPart unexpected ETag received',
+                                          result['ETag'][1:-1], senthash)
+        return result['ETag']
+
+    def _uploadParts(self, objectname, uploadid, outputobject, layout, hashcheck, concurrency, maxinflightbytes,
+                     onpartdone=None):
+        """
+        Upload the parts described by layout, keeping up to concurrency parts (and maxinflightbytes) in flight
+        @param onpartdone: called with (partnumber, ETag) after each uploaded part
+        @type onpartdone: function
+        @return: {partnumber: ETag}
+        @rtype: dict
+        """
+        parts = {}
+        if not layout:
+            return parts
+        # serializes seek + read on objects without a file descriptor
+        lock = threading.Lock()
+
+        if concurrency == 1:
+            for partnumber, start, size in layout:
+                parts[partnumber] = self._uploadPart(objectname, uploadid, outputobject, partnumber, start, size,
+                                                     hashcheck, lock)
+                if onpartdone is not None:
+                    onpartdone(partnumber, parts[partnumber])
+            return parts
+
+        layout = collections.deque(layout)
+        if maxinflightbytes is None:
+            maxinflightbytes = concurrency * max(item[2] for item in layout)
+        pending = {}
+        inflightbytes = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                while layout or pending:
+                    # always allow at least one part in flight, even if it's bigger than maxinflightbytes
+                    while layout and len(pending) < concurrency and (
+                            not pending or inflightbytes + layout[0][2] <= maxinflightbytes):
+                        partnumber, start, size = layout.popleft()
+                        future = executor.submit(self._uploadPart, objectname, uploadid, outputobject, partnumber,
+                                                 start, size, hashcheck, lock)
+                        pending[future] = (partnumber, size)
+                        inflightbytes += size
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        partnumber, size = pending.pop(future)
+                        inflightbytes -= size
+                        parts[partnumber] = future.result()
+                        if onpartdone is not None:
+                            onpartdone(partnumber, parts[partnumber])
+                        self.logger.debug("uploaded part %d of %s", partnumber, objectname)
+            except:
+                for future in pending:
+                    future.cancel()
+                raise
+        return parts
+
+    def _resumableUpload(self, objectname, outputobject, start, end, chunklen, layout, hashcheck, concurrency,
+                         maxinflightbytes, journal):
+        state = None
+        if os.path.isfile(journal):
+            with open(journal, "r") as f:
+                state = json.load(f)
+            if (state.get('bucket'), state.get('objectname'), state.get('start'), state.get('end'),
+                    state.get('chunklen')) != (self.name, objectname, start, end, chunklen):
+                raise UserInputException("the journal %s belongs to a different upload" % (journal,))
+
+        parts = {}
+        if state is not None:
+            # trust only the parts that s3 really has, with the expected size and ETag
+            sizes = dict((partnumber, size) for partnumber, _start, size in layout)
+            journaled = dict((int(partnumber), etag) for partnumber, etag in state['parts'].items())
+            try:
+                for part in self.getParts(objectname, state['uploadId']):
+                    partnumber = int(part['PartNumber'])
+                    if partnumber not in sizes or int(part['Size']) != sizes[partnumber]:
+                        continue
+                    if partnumber in journaled and journaled[partnumber] != part['ETag']:
+                        continue
+                    parts[partnumber] = part['ETag']
+                self.logger.debug("resuming upload %s of %s, %d parts already uploaded", state['uploadId'],
+                                  objectname, len(parts))
+            except NoSuchUpload:
+                self.logger.debug("upload %s of %s is gone, starting a new one", state['uploadId'], objectname)
+                state = None
+                parts = {}
 
-    def downloadArbitrarySizedObject(self, objectname, inputobject=None, hashcheck=False, byterange=None):
+        if state is None:
+            upload = self.s3client.initiateMultipartUpload(bucketname=self.name, objectname=objectname)
+            state = {'bucket': self.name, 'objectname': objectname, 'start': start, 'end': end,
+                     'chunklen': chunklen, 'uploadId': upload['UploadId'], 'parts': {}}
+        state['parts'] = dict((str(partnumber), etag) for partnumber, etag in parts.items())
+        self._writeJournal(journal, state)
+
+        def onpartdone(partnumber, etag):
+            state['parts'][str(partnumber)] = etag
+            self._writeJournal(journal, state)
+
+        missing = [item for item in layout if item[0] not in parts]
+        parts.update(self._uploadParts(objectname, state['uploadId'], outputobject, missing, hashcheck,
+                                       concurrency, maxinflightbytes, onpartdone))
+        result = self.s3client.completeMultipartUpload(bucketname=self.name, objectname=objectname,
+                                                       uploadId=state['uploadId'], parts=parts)
+        os.remove(journal)
+        return result
+
+    def _writeJournal(self, journal, state):
+        # write then rename so a crash never leaves a truncated journal behind
+        with open(journal + '.tmp', "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(journal + '.tmp', journal)
+
+    def downloadArbitrarySizedObject(self, objectname, inputobject=None, hashcheck=False, byterange=None,
+                                     concurrency=1, chunklen=8388608):
         """
         download an object from s3 to a file like object, it's capable to resume interrupted uploads
         @param objectname: the name of the object in the s3 bucket
         @type objectname: str
         @param inputobject: - file like object opened in "w+b" mode (must provide the write, seek and tell methods)
                             - file name where we want to receive the data "w+b" mode
-                            - None so the data is returned in a tempfile.TemporaryFile "w+b" mode
+                            - None so the data is returned in an object created by the s3client spool policy
         @type inputobject: object
         @param hashcheck: enable checking of the downloaded data integrity (won't work if the object is multipart upload)
+                          with concurrency > 1 a byterange not covering the whole object is not checked
         @type hashcheck: bool
         @param byterange: a list with the desired range to be downloaded. ex: (10,) or (100,1000)
         @type byterange: list
+        @param concurrency: number of ranges downloaded in parallel, each on its own pooled connection and written
+                            at its offset in inputobject (the s3client HTTP_CONNECTION_POOL_SIZE should be at least
+                            this big)
+        @type concurrency: int
+        @param chunklen: the size of the ranges when concurrency > 1
+        @type chunklen: int
         @return: {'input': if the input object was autogenerated by the downloadArbitrarySizedObject
                   'range':{'start':download start offset, 'end':end offset, 'size':the object size on s3}}
         @rtype: dict
         """
+        if concurrency < 1:
+            raise UserInputException("param concurrency should be at least 1")
+        if concurrency > 1:
+            return self._downloadRanges(objectname, inputobject, hashcheck, byterange, concurrency, chunklen)
 
         closeinputobject = False
         if isinstance(inputobject, str):
@@ -303,5 +558,121 @@ class S3Bucket():
 
         return {'input':_inputobject, 'range':range}
 
+    def _downloadRange(self, objectname, inputobject, offset, start, end, lock):
+        """
+        Download the [start, end] range of the object to inputobject at offset, partially received data is kept and
+        only the missing part is requested again
+        """
+        retrycount = 0
+        while True:
+            writer = SimplePositionalFileObjectWriteWrapper(inputobject, offset, lock=lock)
+            try:
+                self.logger.debug("downloading byterange %s-%s", start, end)
+                return self.s3client.getObject(bucketname=self.name, objectname=objectname, inputobject=writer,
+                                               byterange=(start, end))
+            except AWSPartialReception as e:
+                start += e.sizeinfo['downloaded']
+                offset += e.sizeinfo['downloaded']
+            except Exception as e:
+                # the permanent errors (NoSuchKey, AccessDenied, InvalidRange, ...) are raised at once
+                if not self._isTransientError(e) or retrycount >= self.RANGE_DOWNLOAD_RETRY_NUMBER:
+                    raise
+                retrycount += 1
+                self.logger.debug("retrying byterange %s-%s [%r]", start, end, e)
+
+    def _isTransientError(self, e):
+        if isinstance(e, self.RANGE_DOWNLOAD_RETRY_EXCEPTIONS):
+            return True
+        if isinstance(e, AWSException):
+            return e.httpstatus is not None and e.httpstatus >= 500
+        if isinstance(e, AWSStatusException):
+            return isinstance(e.data, dict) and e.data.get('status', 0) >= 500
+        return False
+
+    def _downloadRanges(self, objectname, inputobject, hashcheck, byterange, concurrency, chunklen):
+        closeinputobject = False
+        if isinstance(inputobject, str):
+            inputobject = open(inputobject, "w+b")
+            closeinputobject = True
+        elif inputobject is None:
+            # the size is not known yet
+            inputobject = self.s3client.createSpool(None)
+        else:
+            # the ranges are written bypassing the python level buffers
+            inputobject.flush()
+
+        try:
+            base = inputobject.tell()
+            start = 0 if byterange is None else byterange[0]
+            end = None if byterange is None or len(byterange) < 2 else byterange[1]
+            lock = threading.Lock()
+
+            # the first range tells us the object size
+            firstend = start + chunklen - 1
+            if end is not None:
+                firstend = min(firstend, end)
+            try:
+                result = self._downloadRange(objectname, inputobject, base, start, firstend, lock)
+                size = result['range']['size']
+                etag = result['ETag'][1:-1]
+                offset = result['range']['end'] + 1
+            except InvalidRange:
+                if byterange is not None:
+                    raise
+                # empty object, there are no ranges to download
+                size = 0
+                etag = hashlib.md5().hexdigest()
+                offset = 0
+
+            if end is None or end > size - 1:
+                end = size - 1
+
+            ranges = []
+            while offset <= end:
+                ranges.append((offset, min(offset + chunklen - 1, end)))
+                offset += chunklen
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [executor.submit(self._downloadRange, objectname, inputobject, base + rstart - start,
+                                           rstart, rend, lock) for rstart, rend in ranges]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        if future.result()['ETag'][1:-1] != etag:
+                            raise IntegrityCheckException('downloadArbitrarySizedObject: object changed during the '
+                                                          'download', future.result()['ETag'][1:-1], etag)
+                except:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+            if hashcheck:
+                if '-' in etag:
+                    self.logger.debug("multipart upload, can't check for integrity by ETag")
+                elif start != 0 or end != size - 1:
+                    self.logger.debug("partial range, can't check for integrity by ETag")
+                else:
+                    # only the written region, the file may hold other data after it
+                    md5 = hashlib.md5()
+                    inputobject.seek(base, io.SEEK_SET)
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        data = inputobject.read(min(remaining, 1048576))
+                        if data == b'':
+                            break
+                        md5.update(data)
+                        remaining -= len(data)
+                    if etag != md5.hexdigest():
+                        raise IntegrityCheckException('downloadArbitrarySizedObject returned unexpected ETag',
+                                                      etag, md5.hexdigest())
+            inputobject.seek(base + end - start + 1, io.SEEK_SET)
+
+        finally:
+            if closeinputobject:
+                inputobject.close()
+
+        if closeinputobject:
+            inputobject = None
+        return {'input':inputobject, 'range':{'start':start, 'end':end, 'size':size}}
+
     def __repr__(self):
         return repr(self.__dict__)
@@ -4,12 +4,13 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import binascii, base64, json, hashlib
+import binascii, base64, json, hashlib, functools
 from awsutils.exceptions.aws import UserInputException, IntegrityCheckException, extractExceptionsFromModule2Dicitonary
 from awsutils.awsclient import AWSClient
 from awsutils.utils.auth import SIGNATURE_S3_REST
 import awsutils.exceptions.s3
 from awsutils.utils.auth import urlquote
+from awsutils.utils.xmlhandler import AWSXMLExpatDecoder
 
 class S3Client(AWSClient):
     #==================================== operations on the service ====================================================
@@ -50,17 +51,24 @@ class S3Client(AWSClient):
         self.request(method="DELETE", uri=uri, host=endpoint, statusexpected=[204], query={'website': None},
                      signmethod=SIGNATURE_S3_REST)
 
-    def getBucket(self, bucketname, delimiter=None, marker=None, prefix=None, maxkeys=None):
+    def getBucket(self, bucketname, delimiter=None, marker=None, prefix=None, maxkeys=None, streamcallback=None):
         """
         List Objects
+        streamcallback: if set it's called with (name, value) for each ListBucketResult child while the response
+                        is received, the Contents entries are passed only to it and are missing from the result.
+                        On a retried request the entries already seen are passed again
         """
         query = {}
         if delimiter is not None: query['delimiter'] = delimiter
         if prefix is not None: query['prefix'] = prefix
         if marker is not None: query['marker'] = marker
         if maxkeys is not None: query['max-keys'] = maxkeys
+        xmldecoder = None
+        if streamcallback is not None:
+            xmldecoder = functools.partial(AWSXMLExpatDecoder, callback=streamcallback, detached={'Contents'})
         uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
-        data = self.request(method="GET", uri=uri, host=endpoint, query=query, signmethod=SIGNATURE_S3_REST)
+        data = self.request(method="GET", uri=uri, host=endpoint, query=query, signmethod=SIGNATURE_S3_REST,
+                            xmldecoder=xmldecoder)
         return data['awsresponse']['ListBucketResult']
 
     def getBucketAcl(self, bucketname):
@@ -156,12 +164,15 @@ class S3Client(AWSClient):
 
     def getObject(self, bucketname, objectname, inputobject=None, byterange=None, versionID=None,
                   if_modified_since=None, if_unmodified_since=None, if_match=None, if_none_match=None,
-                  _inputIOWrapper=None):
+                  readchunksize=None, spool=None, _inputIOWrapper=None):
         """
         range = list(start, end)
-        inputbuffer = be any object implementing write(bytes)
+        inputbuffer = be any object implementing write(bytes) or a writable buffer (bytearray, mmap, ...) big enough
+        for the object, that is filled in place
         if no inputbuffer is provided then the response will be depending on the response size an io.BytesIO or a
         tempfile.TemporaryFile opened to mode w+b
+        readchunksize = the size of the chunks the data is read with, by default the client's READ_CHUNK_SIZE
+        spool = the spool policy used if there is no inputbuffer, by default the client's SPOOL_POLICY
         """
         query = {}
         if versionID is not None:
@@ -193,8 +204,8 @@ class S3Client(AWSClient):
         uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
         data = self.request(method="GET", uri=uri + urlquote(objectname),
                             headers=headers, host=endpoint, statusexpected=statusexpected,
-                            query=query, inputobject=inputobject, xmlexpected=False,
-                            _inputIOWrapper=_inputIOWrapper, signmethod=SIGNATURE_S3_REST)
+                            query=query, inputobject=inputobject, xmlexpected=False, readchunksize=readchunksize,
+                            spool=spool, _inputIOWrapper=_inputIOWrapper, signmethod=SIGNATURE_S3_REST)
 
         headers = data['headers']
 
@@ -420,7 +431,8 @@ class S3Client(AWSClient):
 
     def completeMultipartUpload(self, bucketname, objectname, uploadId, parts):
         data = ["<CompleteMultipartUpload>"]
-        for partnumber in parts:
+        # the parts have to be listed in ascending order
+        for partnumber in sorted(parts):
             data.append("<Part><PartNumber>%s</PartNumber><ETag>%s</ETag></Part>" % (partnumber, parts[partnumber]))
         data.append("</CompleteMultipartUpload>")
 
@@ -0,0 +1,120 @@
+# awsutils/sdb/bulkdelete.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import queue, logging, threading
+from awsutils.exceptions.aws import UserInputException
+from awsutils.sdb.scan import SDBScan
+from awsutils.sdb.bulkwriter import MAX_BATCH_ITEMS, sendWithRetry
+
+
+class SDBBulkDelete:
+    """
+    Deletes the items matched by a select: the item names are streamed from an itemName() scan of the domain into
+    a bounded queue of 25 item batches, consumed by concurrency threads calling BatchDeleteAttributes. The throttled
+    batches are retried with exponential backoff, as by SDBBulkWriter.
+    """
+    def __init__(self, sdbclient, domainName, where=None, concurrency=4, queuesize=None, segments=1,
+                 consistentRead=None, prefetch=1, maxattempts=5, backoff=0.5, endpoint=None):
+        """
+        @param sdbclient: the client used for the requests, its HTTP_CONNECTION_POOL_SIZE should be at least
+                          concurrency + segments
+        @type sdbclient: SimpleDBClient
+        @param where: delete only the items matching this select expression condition, by default all of them
+        @type where: str
+        @param concurrency: the number of batches deleted in parallel
+        @type concurrency: int
+        @param queuesize: the number of batches waiting for a deleter, by default 2 * concurrency
+        @type queuesize: int
+        @param segments: the number of parallel selects producing the item names, see SDBScan
+        @type segments: int
+        @param maxattempts: the number of times a batch is sent before it is reported in failures
+        @type maxattempts: int
+        @param backoff: the base of the delay before a retry in seconds, doubled by every attempt, with full jitter
+        @type backoff: float
+        """
+        if concurrency < 1:
+            raise UserInputException("param concurrency should be at least 1")
+        self.sdbclient = sdbclient
+        self.domainName = domainName
+        self.concurrency = concurrency
+        self.maxattempts = maxattempts
+        self.backoff = backoff
+        self.endpoint = endpoint
+        # a single segment needs no boundaries, don't count the domain for nothing
+        self.scan = SDBScan(sdbclient, domainName, segments=segments, output='itemName()', where=where,
+                            boundaries=[] if segments == 1 else None, consistentRead=consistentRead,
+                            prefetch=prefetch, endpoint=endpoint)
+        # statistics of the deleted batches
+        self.batches = 0
+        self.items = 0
+        self.retries = 0
+        self.boxUsage = 0.0
+        # (item names, exception) of the batches not deleted
+        self.failures = []
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._lock = threading.Lock()
+        self._batches = queue.Queue(maxsize=concurrency * 2 if queuesize is None else queuesize)
+
+    @property
+    def selectBoxUsage(self):
+        return self.scan.boxUsage
+
+    def run(self):
+        """
+        Delete the items, returns when all the selected items are deleted or failed
+        @return: the failures
+        @rtype: list
+        """
+        deleters = []
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._delete, name="SDBBulkDelete")
+            thread.daemon = True
+            thread.start()
+            deleters.append(thread)
+        try:
+            batch = []
+            for item in self.scan:
+                batch.append(item['Name'])
+                if len(batch) == MAX_BATCH_ITEMS:
+                    self._batches.put(batch)
+                    batch = []
+            if batch:
+                self._batches.put(batch)
+        finally:
+            self.scan.close()
+            for thread in deleters:
+                self._batches.put(None)
+            for thread in deleters:
+                thread.join()
+        self.logger.debug("deleted %d items in %d batches, %d failed batches", self.items, self.batches,
+                          len(self.failures))
+        return self.failures
+
+    def _delete(self):
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                return
+            items = dict((itemName, {}) for itemName in batch)
+            try:
+                boxUsage = sendWithRetry(lambda: self.sdbclient.batchDeleteAttributes(self.domainName, items,
+                                                                                      endpoint=self.endpoint),
+                                         self.maxattempts, self.backoff, self._retried)
+            except Exception as e:
+                self.logger.warning("batch of %d items failed: %s", len(batch), e)
+                with self._lock:
+                    self.failures.append((batch, e))
+                continue
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.boxUsage += boxUsage
+
+    def _retried(self, exception, delay):
+        self.logger.debug("batch throttled (%s), retrying in %.2fs", exception, delay)
+        with self._lock:
+            self.retries += 1
@@ -0,0 +1,206 @@
+# awsutils/sdb/bulkwriter.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import time, random, logging, threading
+import concurrent.futures
+from awsutils.exceptions.aws import UserInputException
+from awsutils.utils.auth import urlquote
+import awsutils.exceptions.sdb
+
+# the BatchPutAttributes limits
+MAX_BATCH_ITEMS = 25
+MAX_ITEM_ATTRIBUTES = 256
+MAX_VALUE_BYTES = 1024
+# the request size limit is 1MB, keep some room for the rest of the request, the batch is counted form encoded
+MAX_BATCH_BYTES = 1000 * 1000
+# the parameter names and separators of an item and its attributes, with the most digits a batch can have
+ITEM_OVERHEAD = len('Item.%d.ItemName=&' % (MAX_BATCH_ITEMS,))
+ATTRIBUTE_OVERHEAD = len('Item.%d.Attribute.%d.Name=&Item.%d.Attribute.%d.Value=&'
+                         % (MAX_BATCH_ITEMS, MAX_ITEM_ATTRIBUTES, MAX_BATCH_ITEMS, MAX_ITEM_ATTRIBUTES))
+REPLACE_OVERHEAD = len('Item.%d.Attribute.%d.Replace=&' % (MAX_BATCH_ITEMS, MAX_ITEM_ATTRIBUTES))
+
+
+# the exceptions of a batch worth retrying
+RETRY_EXCEPTIONS = (awsutils.exceptions.sdb.ServiceUnavailable, awsutils.exceptions.sdb.InternalError)
+
+
+def sendWithRetry(send, maxattempts=5, backoff=0.5, onretry=None):
+    """
+    Call send() until it succeeds, retrying the RETRY_EXCEPTIONS with exponential backoff and full jitter
+    @param send: the request, returning its BoxUsage
+    @type send: callable
+    @param onretry: called with the exception and the delay before every retry
+    @type onretry: callable
+    @return: the result of send()
+    """
+    attempt = 1
+    while True:
+        try:
+            return send()
+        except RETRY_EXCEPTIONS as e:
+            if attempt >= maxattempts:
+                raise
+            delay = random.uniform(0, backoff * 2 ** (attempt - 1))
+            if onretry is not None:
+                onretry(e, delay)
+            attempt += 1
+            time.sleep(delay)
+
+
+class SDBBulkWriter:
+    """
+    Writes any number of items with BatchPutAttributes: the items are collected in batches within the SimpleDB
+    limits and the batches are sent by concurrency threads, the throttled (ServiceUnavailable) batches are retried
+    with exponential backoff. The batches are sent concurrently, put the same item once or use a single thread if
+    the order of the writes matters.
+    """
+    def __init__(self, sdbclient, domainName, concurrency=4, maxattempts=5, backoff=0.5, endpoint=None):
+        """
+        @param sdbclient: the client used for the requests, its HTTP_CONNECTION_POOL_SIZE should be at least
+                          concurrency
+        @type sdbclient: SimpleDBClient
+        @param concurrency: the number of batches sent in parallel
+        @type concurrency: int
+        @param maxattempts: the number of times a batch is sent before it is reported in failures
+        @type maxattempts: int
+        @param backoff: the base of the delay before a retry in seconds, doubled by every attempt, with full jitter
+        @type backoff: float
+        """
+        if concurrency < 1:
+            raise UserInputException("param concurrency should be at least 1")
+        self.sdbclient = sdbclient
+        self.domainName = domainName
+        self.concurrency = concurrency
+        self.maxattempts = maxattempts
+        self.backoff = backoff
+        self.endpoint = endpoint
+        # statistics of the sent batches
+        self.batches = 0
+        self.items = 0
+        self.retries = 0
+        self.boxUsage = 0.0
+        # (items, exception) of the batches not written
+        self.failures = []
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._lock = threading.Lock()
+        # bounds the batches waiting for a thread, so a fast producer doesn't buffer the whole input
+        self._slots = threading.Semaphore(concurrency * 2)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self._futures = set()
+        self._batch = {}
+        self._batchSize = 0
+        self._closed = False
+
+    def put(self, itemName, attributes):
+        """
+        Queue an item to be written, blocks while too many batches are waiting to be sent
+        @param attributes: the attributes of the item, as in SimpleDBClient.putAttributes:
+                           {"someattributename" : "somevalue", "someotherattributename" : ("somevalue", True)}
+                           or (("someattributename", "somevalue"), ("someattributename", "someothervalue"))
+                           an item with more than 256 attributes is split between batches
+        @type attributes: dict, tuple
+        """
+        if self._closed:
+            raise UserInputException("the writer is closed")
+        if isinstance(attributes, dict): attributes = attributes.items()
+        size = len(urlquote(itemName)) + ITEM_OVERHEAD
+        chunk, chunkSize = [], size
+        for name, value in attributes:
+            if not isinstance(value, (list, tuple)) and not isinstance(value, str):
+                value = repr(value)
+            text = value[0] if isinstance(value, (list, tuple)) else value
+            if len(name.encode()) > MAX_VALUE_BYTES or len(text.encode()) > MAX_VALUE_BYTES:
+                raise UserInputException("attribute names and values are limited to %d bytes, item %s attribute %s"
+                                         % (MAX_VALUE_BYTES, itemName, name))
+            if len(chunk) == MAX_ITEM_ATTRIBUTES:
+                self._add(itemName, chunk, chunkSize)
+                chunk, chunkSize = [], size
+            chunk.append((name, value))
+            chunkSize += len(urlquote(name)) + len(urlquote(text)) + ATTRIBUTE_OVERHEAD
+            if isinstance(value, (list, tuple)):
+                chunkSize += len(urlquote(str(value[1]))) + REPLACE_OVERHEAD
+        if chunk:
+            self._add(itemName, chunk, chunkSize)
+
+    def putItems(self, items):
+        """
+        @param items: {itemName: attributes} or an iterable of (itemName, attributes)
+        @type items: dict, iterable
+        """
+        if isinstance(items, dict): items = items.items()
+        for itemName, attributes in items:
+            self.put(itemName, attributes)
+
+    def flush(self):
+        """
+        Send the incomplete batch and wait until all the batches are sent
+        @return: the failures so far
+        @rtype: list
+        """
+        if self._batch:
+            self._send()
+        with self._lock:
+            futures = list(self._futures)
+        concurrent.futures.wait(futures)
+        return self.failures
+
+    def close(self):
+        if not self._closed:
+            self.flush()
+            self._closed = True
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _add(self, itemName, attributes, size):
+        # the same item name can appear only once in a batch
+        if len(self._batch) == MAX_BATCH_ITEMS or itemName in self._batch or \
+                self._batchSize + size > MAX_BATCH_BYTES:
+            self._send()
+        self._batch[itemName] = attributes
+        self._batchSize += size
+
+    def _send(self):
+        batch = self._batch
+        self._batch, self._batchSize = {}, 0
+        self._slots.acquire()
+        future = self._executor.submit(self._write, batch)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        self._slots.release()
+
+    def _write(self, batch):
+        try:
+            boxUsage = sendWithRetry(lambda: self.sdbclient.batchPutAttributes(self.domainName, batch,
+                                                                               endpoint=self.endpoint),
+                                     self.maxattempts, self.backoff, self._retried)
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.boxUsage += boxUsage
+
+    def _retried(self, exception, delay):
+        self.logger.debug("batch throttled (%s), retrying in %.2fs", exception, delay)
+        with self._lock:
+            self.retries += 1
+
+    def _fail(self, batch, exception):
+        self.logger.warning("batch of %d items failed: %s", len(batch), exception)
+        with self._lock:
+            self.failures.append((batch, exception))
@@ -0,0 +1,83 @@
+# awsutils/sdb/itemcache.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import time, threading, collections
+
+
+class SDBItemCache:
+    """
+    A least recently used cache of SimpleDBClient.getAttributes results, the entries expire after ttl seconds.
+    The client invalidates the items it writes or deletes, the changes made by other clients are seen after ttl.
+    """
+    def __init__(self, maxitems=1024, ttl=60):
+        """
+        @param maxitems: the number of items kept, the least recently used one is dropped above it
+        @type maxitems: int
+        @param ttl: the seconds a result is served from the cache
+        @type ttl: float
+        """
+        self.maxitems = maxitems
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # (endpoint, domainName, itemName) => {attributeName: (expires, result)}
+        self._items = collections.OrderedDict()
+        # changed by every invalidation, a result fetched across an invalidation may be stale and is not stored
+        self.version = 0
+
+    def get(self, endpoint, domainName, itemName, attributeName=None):
+        """
+        @return: (hit, result, version), result is None on a miss, pass the version to put with the fetched result
+        @rtype: tuple
+        """
+        key = (endpoint, domainName, itemName)
+        with self.lock:
+            entry = self._items.get(key)
+            if entry is not None and attributeName in entry:
+                expires, result = entry[attributeName]
+                if expires > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return True, result, self.version
+                del entry[attributeName]
+            self.misses += 1
+            return False, None, self.version
+
+    def put(self, endpoint, domainName, itemName, attributeName, result, version=None):
+        """
+        @param version: the version returned by the get missing the result, if the cache was invalidated since
+                        the result is not stored
+        @type version: int
+        """
+        key = (endpoint, domainName, itemName)
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            self._items.setdefault(key, {})[attributeName] = (time.monotonic() + self.ttl, result)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxitems:
+                self._items.popitem(last=False)
+
+    def invalidate(self, endpoint, domainName, itemNames):
+        with self.lock:
+            self.version += 1
+            for itemName in itemNames:
+                self._items.pop((endpoint, domainName, itemName), None)
+
+    def invalidateDomain(self, endpoint, domainName):
+        with self.lock:
+            self.version += 1
+            for key in [key for key in self._items if key[:2] == (endpoint, domainName)]:
+                del self._items[key]
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,223 @@
+# awsutils/sdb/scan.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import queue, logging, threading
+from awsutils.exceptions.aws import UserInputException
+from awsutils.sdb.selectiterator import SDBSelectIterator
+
+# the biggest limit accepted by select
+MAX_SELECT_LIMIT = 2500
+
+
+def quoteName(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+def quoteValue(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+class SDBScan:
+    """
+    Scans a domain with parallel selects: the domain is split into itemName() range segments, every segment is
+    selected by its own background thread (and pooled connection) and the results are merged into one iterator
+    """
+    def __init__(self, sdbclient, domainName, segments=4, output='*', where=None, ordered=False, boundaries=None,
+                 consistentRead=None, prefetch=1, endpoint=None):
+        """
+        @param sdbclient: the client used for the select requests, its HTTP_CONNECTION_POOL_SIZE should be at least
+                          segments
+        @type sdbclient: SimpleDBClient
+        @param segments: the number of segments selected in parallel
+        @type segments: int
+        @param output: the select output, '*', 'itemName()' or a list of attribute names
+        @type output: str, list
+        @param where: select only the items matching this select expression condition
+        @type where: str
+        @param ordered: yield the items in itemName() order, the segments are still fetched in parallel but a
+                        segment only runs prefetch pages ahead of the one being consumed, so an ordered scan is as
+                        fast as an unordered one only with a prefetch close to the number of pages per segment
+                        (buffered in memory)
+        @type ordered: bool
+        @param boundaries: the item names where the segments start (sorted, without the first segment's start), by
+                           default they are sampled with sampleBoundaries
+        @type boundaries: list
+        @param prefetch: the number of pages fetched ahead by every segment
+        @type prefetch: int
+        """
+        if segments < 1:
+            raise UserInputException("param segments should be at least 1")
+        self.sdbclient = sdbclient
+        self.domainName = domainName
+        self.segments = segments
+        self.output = output if isinstance(output, str) else ', '.join(quoteName(name) for name in output)
+        self.where = where
+        self.ordered = ordered
+        self.boundaries = boundaries
+        self.consistentRead = consistentRead
+        self.prefetch = prefetch
+        self.endpoint = endpoint
+        # the BoxUsage of the boundary sampling requests
+        self.samplingBoxUsage = 0.0
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._iterators = []
+        self._stop = threading.Event()
+
+    @property
+    def boxUsage(self):
+        return self.samplingBoxUsage + sum(iterator.boxUsage for iterator in self._iterators)
+
+    def expression(self, output, conditions=(), order=False, limit=None):
+        conditions = list(conditions)
+        if self.where is not None:
+            conditions.insert(0, '(%s)' % (self.where,))
+        if order:
+            # ordering by itemName() needs a condition on it
+            conditions.append('itemName() is not null')
+        expression = ['select %s from %s' % (output, quoteName(self.domainName))]
+        if conditions:
+            expression.append('where ' + ' and '.join(conditions))
+        if order:
+            expression.append('order by itemName()')
+        if limit is not None:
+            expression.append('limit %d' % (limit,))
+        return ' '.join(expression)
+
+    def sampleBoundaries(self):
+        """
+        Find the item names splitting the domain in segments of about the same size. The items are counted with
+        count(*) queries, the NextToken of a count(*) query limited to n items is used to skip to the n-th item
+        of the same itemName() ordered query, so no item data is transferred.
+        @return: the first item names of the segments, except the first one
+        @rtype: list
+        """
+        total = self._count(self.expression('count(*)'))
+        boundaries = []
+        if self.segments == 1 or total < self.segments:
+            return boundaries
+        step = total // self.segments
+        position, nextToken = 0, None
+        for segment in range(1, self.segments):
+            while position < segment * step:
+                limit = min(MAX_SELECT_LIMIT, segment * step - position)
+                page = self._selectPage(self.expression('count(*)', order=True, limit=limit), nextToken)
+                position += self._pageCount(page)
+                nextToken = page['NextToken']
+                if nextToken is None:
+                    return boundaries
+            page = self._selectPage(self.expression('itemName()', order=True, limit=1), nextToken)
+            if not page['Items']:
+                break
+            boundaries.append(page['Items'][0]['Name'])
+        self.logger.debug("sampled boundaries %s of %d items", boundaries, total)
+        return boundaries
+
+    def __iter__(self):
+        boundaries = self.boundaries
+        if boundaries is None:
+            boundaries = self.sampleBoundaries()
+        limits = [None] + list(boundaries) + [None]
+        for start, end in zip(limits[:-1], limits[1:]):
+            conditions = []
+            if start is not None:
+                conditions.append('itemName() >= %s' % (quoteValue(start),))
+            if end is not None:
+                conditions.append('itemName() < %s' % (quoteValue(end),))
+            self._iterators.append(SDBSelectIterator(self.sdbclient, self.expression(self.output, conditions,
+                                                                                     order=self.ordered),
+                                                     consistentRead=self.consistentRead, endpoint=self.endpoint,
+                                                     prefetch=self.prefetch))
+        if self.ordered:
+            return self._ordered()
+        return self._merged()
+
+    def close(self):
+        self._stop.set()
+        for iterator in self._iterators:
+            iterator.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _ordered(self):
+        try:
+            for iterator in self._iterators:
+                iterator.start()
+            for iterator in self._iterators:
+                for item in iterator:
+                    yield item
+        finally:
+            self.close()
+
+    def _merged(self):
+        # the segment threads hand over whole pages
+        items = queue.Queue(maxsize=len(self._iterators) * self.prefetch)
+        for iterator in self._iterators:
+            thread = threading.Thread(target=self._drain, args=(iterator, items), name="SDBScan")
+            thread.daemon = True
+            thread.start()
+        running = len(self._iterators)
+        try:
+            while running:
+                page = items.get()
+                if page is None:
+                    running -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    for item in page:
+                        yield item
+        finally:
+            self.close()
+
+    def _drain(self, iterator, items):
+        try:
+            while True:
+                page = iterator.nextPage()
+                if not page:
+                    break
+                self._put(items, page)
+            self._put(items, None)
+        except Exception as e:
+            self._put(items, e)
+
+    def _put(self, items, page):
+        while not self._stop.is_set():
+            try:
+                items.put(page, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def _selectPage(self, expression, nextToken=None):
+        page = self.sdbclient.selectPage(expression, consistentRead=self.consistentRead, nextToken=nextToken,
+                                         endpoint=self.endpoint)
+        self.samplingBoxUsage += page['BoxUsage']
+        return page
+
+    def _pageCount(self, page):
+        count = 0
+        for item in page['Items']:
+            attributes = item['Attribute']
+            if isinstance(attributes, dict): attributes = [attributes]
+            for attribute in attributes:
+                if attribute['Name'] == 'Count':
+                    count += int(attribute['Value'])
+        return count
+
+    def _count(self, expression):
+        # a long count returns partial counts with a NextToken
+        count, nextToken = 0, None
+        while True:
+            page = self._selectPage(expression, nextToken)
+            count += self._pageCount(page)
+            nextToken = page['NextToken']
+            if nextToken is None:
+                return count
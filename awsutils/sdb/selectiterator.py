@@ -0,0 +1,120 @@
+# awsutils/sdb/selectiterator.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import queue, logging, threading, collections
+
+
+class SDBSelectIterator:
+    """
+    Iterates over all the items matched by a select expression following NextToken, a background thread fetches
+    the following pages (up to prefetch ahead) while the current one is consumed
+    """
+    def __init__(self, sdbclient, selectExpression, consistentRead=None, nextToken=None, endpoint=None, prefetch=1):
+        """
+        @param sdbclient: the client used for the select requests
+        @type sdbclient: SimpleDBClient
+        @param nextToken: start from this page (ex: the nextToken of an interrupted iteration)
+        @type nextToken: str
+        @param prefetch: the number of pages fetched ahead of the one being consumed
+        @type prefetch: int
+        """
+        if prefetch < 1:
+            raise ValueError("prefetch should be at least 1")
+        self.sdbclient = sdbclient
+        self.selectExpression = selectExpression
+        self.consistentRead = consistentRead
+        self.endpoint = endpoint
+        # the BoxUsage of the pages fetched so far
+        self.boxUsage = 0.0
+        self.pages = 0
+        # the NextToken of the page being consumed, None on the last page
+        self.nextToken = nextToken
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._items = collections.deque()
+        self._pages = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._thread = None
+        self._finished = False
+
+    def __iter__(self):
+        return self
+
+    def start(self):
+        """
+        Start fetching the pages before the first item is requested
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._fetch, name="SDBSelectIterator")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __next__(self):
+        while not self._items:
+            if self._finished:
+                raise StopIteration
+            self.start()
+            page = self._pages.get()
+            if isinstance(page, Exception):
+                self._finished = True
+                raise page
+            self.nextToken = page['NextToken']
+            self._items.extend(page['Items'])
+            if self.nextToken is None:
+                self._finished = True
+        return self._items.popleft()
+
+    def nextPage(self):
+        """
+        @return: the items of the current page not consumed yet or the items of the next page, [] at the end
+        @rtype: list
+        """
+        try:
+            page = [next(self)]
+        except StopIteration:
+            return []
+        page.extend(self._items)
+        self._items.clear()
+        return page
+
+    def close(self):
+        """
+        Stop fetching pages, the request in progress (if any) is finished in the background
+        """
+        self._finished = True
+        self._items.clear()
+        self._stop.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _put(self, page):
+        while not self._stop.is_set():
+            try:
+                self._pages.put(page, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch(self):
+        nextToken = self.nextToken
+        while not self._stop.is_set():
+            try:
+                page = self.sdbclient.selectPage(self.selectExpression, consistentRead=self.consistentRead,
+                                                 nextToken=nextToken, endpoint=self.endpoint)
+            except Exception as e:
+                self._put(e)
+                return
+            self.boxUsage += page['BoxUsage']
+            self.pages += 1
+            self.logger.debug("fetched page %d with %d items", self.pages, len(page['Items']))
+            if not self._put(page) or page['NextToken'] is None:
+                return
+            nextToken = page['NextToken']
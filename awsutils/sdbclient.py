@@ -8,12 +8,23 @@ import collections
 from awsutils.exceptions.aws import UserInputException, extractExceptionsFromModule2Dicitonary
 from awsutils.awsclient import AWSClient
 from awsutils.utils.auth import SIGNATURE_V2
+from awsutils.sdb.selectiterator import SDBSelectIterator
+from awsutils.sdb.scan import SDBScan
+from awsutils.sdb.bulkwriter import SDBBulkWriter
+from awsutils.sdb.bulkdelete import SDBBulkDelete
+from awsutils.sdb.itemcache import SDBItemCache
 import awsutils.exceptions.sdb
 
 class SimpleDBClient(AWSClient):
 
-    def __init__(self, endpoint, access_key, secret_key, secure=False):
+    def __init__(self, endpoint, access_key, secret_key, secure=False, itemcache=None):
+        """
+        @param itemcache: serve getAttributes from this cache, the items written or deleted by this client are
+                          invalidated in it, True creates an SDBItemCache with the default settings
+        @type itemcache: SDBItemCache
+        """
         self.boxUssage = 0
+        self.itemcache = SDBItemCache() if itemcache is True else itemcache
         AWSClient.__init__(self, endpoint, access_key, secret_key, secure)
 
     def batchDeleteAttributes(self, domainName, items, endpoint=None):
@@ -27,6 +38,8 @@ class SimpleDBClient(AWSClient):
                                        "someotherattributename" : "somevalue"}
                         "someotherItemname":{"someattributename" : "somevalue"}}
         @type items: dict
+        @return: the BoxUsage of the request
+        @rtype: float
         """
         if endpoint is None: endpoint = self.endpoint
         query = {'Action': 'BatchDeleteAttributes', 'DomainName':domainName, 'Version': '2009-04-15'}
@@ -39,10 +52,16 @@ class SimpleDBClient(AWSClient):
                 query['Item.%d.Attribute.%d.Value'%(i,a)] = items[itemName][attributeName]
                 a += 1
             i += 1
-        data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        # a batch easily outgrows the url length limit, the parameters are posted in the body
+        try:
+            data = self.request(method="POST", signmethod=SIGNATURE_V2, query=query, host=endpoint,
+                                formencoded=True)
+        finally:
+            self._invalidate(endpoint, domainName, items)
         data = data['awsresponse']
         boxUsage = float(data['BatchDeleteAttributesResponse']['ResponseMetadata']['BoxUsage'])
         self.boxUssage += boxUsage
+        return boxUsage
 
     def batchPutAttributes(self, domainName, items, endpoint=None):
         """
@@ -55,7 +74,11 @@ class SimpleDBClient(AWSClient):
                                        "someotherattributename" : ("somevalue", True) #=> indicates force owerwrite
                                        }
                         "someotherItemname":{"someattributename" : "somevalue"}}
+                      the attributes of an item can be also given as (("someattributename", "somevalue"), ...)
+                      for multi valued attributes
         @type items: dict
+        @return: the BoxUsage of the request
+        @rtype: float
         """
         if endpoint is None: endpoint = self.endpoint
         query = {'Action': 'BatchPutAttributes', 'DomainName':domainName, 'Version': '2009-04-15'}
@@ -64,12 +87,13 @@ class SimpleDBClient(AWSClient):
             if i > 25:
                 raise UserInputException('25 item limit per BatchPutAttributes operation exceded')
             query['Item.%d.ItemName'%(i,)] = itemName
+            attributes = items[itemName]
+            if isinstance(attributes, dict): attributes = attributes.items()
             a = 1
-            for attributeName in items[itemName]:
+            for attributeName, v in attributes:
                 if a > 256:
                     raise UserInputException('256 attribute name-value pairs per item exceded')
                 query['Item.%d.Attribute.%d.Name'%(i,a)] = attributeName
-                v = items[itemName][attributeName]
                 if isinstance(v, (list, tuple)):
                     query['Item.%d.Attribute.%d.Value'%(i,a)] = v[0]
                     query['Item.%d.Attribute.%d.Replace'%(i,a)] = v[1]
@@ -77,10 +101,16 @@ class SimpleDBClient(AWSClient):
                     query['Item.%d.Attribute.%d.Value'%(i,a)] = v
                 a += 1
             i += 1
-        data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        # a batch easily outgrows the url length limit, the parameters are posted in the body
+        try:
+            data = self.request(method="POST", signmethod=SIGNATURE_V2, query=query, host=endpoint,
+                                formencoded=True)
+        finally:
+            self._invalidate(endpoint, domainName, items)
         data = data['awsresponse']
         boxUsage = float(data['BatchPutAttributesResponse']['ResponseMetadata']['BoxUsage'])
         self.boxUssage += boxUsage
+        return boxUsage
 
     def createDomain(self, domainName, endpoint=None):
         """
@@ -105,7 +135,11 @@ class SimpleDBClient(AWSClient):
         """
         if endpoint is None: endpoint = self.endpoint
         query = {'Action': 'DeleteDomain', 'DomainName':domainName, 'Version': '2009-04-15'}
-        data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        try:
+            data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        finally:
+            if self.itemcache is not None:
+                self.itemcache.invalidateDomain(endpoint, domainName)
         data = data['awsresponse']
         boxUsage = float(data['DeleteDomainResponse']['ResponseMetadata']['BoxUsage'])
         self.boxUssage += boxUsage
@@ -168,6 +202,16 @@ class SimpleDBClient(AWSClient):
         @type consistentRead: bool
         @type nextToken: where to start the next list of ItemNames
         @type nextToken: str
+        @return: the items of one page, see selectPage and selectAll for the following pages
+        @rtype: list
+        """
+        return self.selectPage(selectExpression, consistentRead, nextToken, endpoint)['Items']
+
+    def selectPage(self, selectExpression, consistentRead=None, nextToken=None, endpoint=None):
+        """
+        Same as select but it also returns the NextToken of the following page
+        @return: {'Items': list of items, 'NextToken': None on the last page, 'BoxUsage': float}
+        @rtype: dict
         """
         if endpoint is None: endpoint = self.endpoint
         query = {'Action': 'Select', 'SelectExpression':selectExpression, 'Version': '2009-04-15'}
@@ -180,10 +224,58 @@ class SimpleDBClient(AWSClient):
         boxUsage = float(data['SelectResponse']['ResponseMetadata']['BoxUsage'])
         self.boxUssage += boxUsage
         data = data['SelectResponse']['SelectResult']
-        if isinstance(data, str): return []
-        data = data['Item']
-        if isinstance(data, dict): return [data]
-        return data
+        page = {'Items': [], 'NextToken': None, 'BoxUsage': boxUsage}
+        if isinstance(data, str):
+            return page
+        page['NextToken'] = data.get('NextToken')
+        if 'Item' in data:
+            page['Items'] = [data['Item']] if isinstance(data['Item'], dict) else data['Item']
+        return page
+
+    def selectAll(self, selectExpression, consistentRead=None, nextToken=None, endpoint=None, prefetch=1):
+        """
+        Iterate over all the items matched by selectExpression, following NextToken
+        @param prefetch: the number of pages fetched in the background ahead of the one being consumed
+        @type prefetch: int
+        @rtype: SDBSelectIterator
+        """
+        return SDBSelectIterator(self, selectExpression, consistentRead=consistentRead, nextToken=nextToken,
+                                 endpoint=endpoint, prefetch=prefetch)
+
+    def scan(self, domainName, segments=4, output='*', where=None, ordered=False, boundaries=None,
+             consistentRead=None, prefetch=1, endpoint=None):
+        """
+        Iterate over the items of a domain selecting segments of it in parallel, see SDBScan
+        @rtype: SDBScan
+        """
+        return SDBScan(self, domainName, segments=segments, output=output, where=where, ordered=ordered,
+                       boundaries=boundaries, consistentRead=consistentRead, prefetch=prefetch, endpoint=endpoint)
+
+    def bulkWriter(self, domainName, concurrency=4, maxattempts=5, backoff=0.5, endpoint=None):
+        """
+        Write any number of items with concurrent BatchPutAttributes requests, see SDBBulkWriter
+        ex: with sdbclient.bulkWriter('domain') as writer:
+                writer.putItems(items)
+            print(writer.failures, writer.boxUsage)
+        @rtype: SDBBulkWriter
+        """
+        return SDBBulkWriter(self, domainName, concurrency=concurrency, maxattempts=maxattempts, backoff=backoff,
+                             endpoint=endpoint)
+
+    def bulkDelete(self, domainName, where=None, concurrency=4, queuesize=None, segments=1, consistentRead=None,
+                   prefetch=1, maxattempts=5, backoff=0.5, endpoint=None):
+        """
+        Delete the items of domainName matching the where select condition with concurrent BatchDeleteAttributes
+        requests, see SDBBulkDelete
+        ex: sdbclient.bulkDelete('domain', where="`created` < '2013-01-01'")
+        @return: the deleter after it finished, with its statistics and failures
+        @rtype: SDBBulkDelete
+        """
+        deleter = SDBBulkDelete(self, domainName, where=where, concurrency=concurrency, queuesize=queuesize,
+                                segments=segments, consistentRead=consistentRead, prefetch=prefetch,
+                                maxattempts=maxattempts, backoff=backoff, endpoint=endpoint)
+        deleter.run()
+        return deleter
 
     def getAttributes(self, domainName, itemName, attributeName=None, consistentRead=None, endpoint=None):
         """
@@ -195,12 +287,26 @@ class SimpleDBClient(AWSClient):
         @type itemName: str
         @param attributeName: the name of the attribute
         @type attributeName: str
-        @param consistentRead: when set to true, ensures that the most recent data is returned
+        @param consistentRead: when set to true, ensures that the most recent data is returned, it also bypasses
+                               the itemcache (the result is still stored in it)
         @type consistentRead: bool
         @return: a tuple of tuples (key, value)
         @rtype: tuple
         """
         if endpoint is None: endpoint = self.endpoint
+        if self.itemcache is None:
+            return self._getAttributes(domainName, itemName, attributeName, consistentRead, endpoint)
+        if consistentRead:
+            version = self.itemcache.version
+        else:
+            hit, cached, version = self.itemcache.get(endpoint, domainName, itemName, attributeName)
+            if hit:
+                return cached
+        result = self._getAttributes(domainName, itemName, attributeName, consistentRead, endpoint)
+        self.itemcache.put(endpoint, domainName, itemName, attributeName, result, version)
+        return result
+
+    def _getAttributes(self, domainName, itemName, attributeName, consistentRead, endpoint):
         query = {'Action': 'GetAttributes', 'ItemName': itemName, 'DomainName':domainName, 'Version': '2009-04-15'}
         if attributeName is not None:
             query['AttributeName'] = attributeName
@@ -257,7 +363,10 @@ class SimpleDBClient(AWSClient):
                 query['Expected.%d.Value'%(i,)] = expected[name]
                 query['Expected.%d.Exists'%(i,)] = expected[name]
                 i += 1
-        data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        try:
+            data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        finally:
+            self._invalidate(endpoint, domainName, (itemName,))
         data = data['awsresponse']
         boxUsage = float(data['PutAttributesResponse']['ResponseMetadata']['BoxUsage'])
         self.boxUssage += boxUsage
@@ -296,13 +405,20 @@ class SimpleDBClient(AWSClient):
                 query['Expected.%d.Value'%(i,)] = expected[name][0]
                 query['Expected.%d.Exists'%(i,)] = expected[name][1]
                 i += 1
-        data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        try:
+            data = self.request(method="GET", signmethod=SIGNATURE_V2, query=query, host=endpoint)
+        finally:
+            self._invalidate(endpoint, domainName, (itemName,))
         data = data['awsresponse']
         boxUsage = float(data['DeleteAttributesResponse']['ResponseMetadata']['BoxUsage'])
         self.boxUssage += boxUsage
 
     #================================== helper functionality ===========================================================
 
+    def _invalidate(self, endpoint, domainName, itemNames):
+        if self.itemcache is not None:
+            self.itemcache.invalidate(endpoint, domainName, itemNames)
+
     EXCEPTIONS = extractExceptionsFromModule2Dicitonary('awsutils.exceptions.sdb',
                                                          awsutils.exceptions.sdb.SDBException)
 
@@ -312,7 +428,7 @@ class SimpleDBClient(AWSClient):
             errors = awsresponse['Response']['Errors']['Error']
             if isinstance(errors, dict): errors = [errors]
             for error in errors:
-                self.boxUssage += error['BoxUsage']
+                self.boxUssage += float(error.get('BoxUsage', 0))
             for error in errors:
                 if error['Code'].replace('.','_') in self.EXCEPTIONS:
                     raise self.EXCEPTIONS[error['Code'].replace('.','_')](awsresponse, httpstatus,
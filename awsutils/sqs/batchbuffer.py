@@ -0,0 +1,177 @@
+# awsutils/sqs/batchbuffer.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import abc, time, logging, threading
+from awsutils.exceptions.aws import UserInputException
+
+
+class SQSBatchBuffer(abc.ABC):
+    """
+    Base of the client side batching buffers: the added items are sent in batches of BATCH_SIZE items (and at most
+    MAX_BATCH_PAYLOAD bytes) as soon as a batch is full or when its oldest item waited maxdelay seconds, the failed
+    items are retried with the next batch, the subclasses implement _sendBatch
+    """
+    BATCH_SIZE = 10
+    MAX_BATCH_PAYLOAD = None
+
+    def __init__(self, sqsclient, qName, maxdelay=1, maxattempts=3, onfailure=None):
+        """
+        @param sqsclient: the sqsclient to be used for communication
+        @type sqsclient: SQSClient
+        @param qName: the sqs queue name
+        @type qName: str
+        @param maxdelay: the maximum time in seconds an item waits in the buffer
+        @type maxdelay: float
+        @param maxattempts: give up an item after this many failures
+        @type maxattempts: int
+        @param onfailure: called with the item given up
+        @type onfailure: callable
+        """
+        self.sqsclient = sqsclient
+        self.qName = qName
+        self.maxdelay = maxdelay
+        self.maxattempts = maxattempts
+        self.onfailure = onfailure
+        self.succeeded = 0
+        self.failed = 0
+        self.requests = 0
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        # entries are [item, size, timestamp, attempts]
+        self._pending = []
+        self._pendingsize = 0
+        self._condition = threading.Condition()
+        self._flushing = threading.Lock()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="%s-%s" % (type(self).__name__, qName))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _add(self, item, size=0):
+        if self.MAX_BATCH_PAYLOAD is not None and size > self.MAX_BATCH_PAYLOAD:
+            raise UserInputException('the item is bigger than %d bytes' % (self.MAX_BATCH_PAYLOAD,))
+        with self._condition:
+            if self._stopping:
+                raise UserInputException("the buffer is closed")
+            self._pending.append([item, size, time.time(), 0])
+            self._pendingsize += size
+            if self._full():
+                self._condition.notify_all()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """
+        Send everything buffered, the items failing now are kept for the next flush
+        """
+        with self._condition:
+            count = len(self._pending)
+        while count > 0:
+            count -= self._flushBatch()
+
+    def close(self):
+        """
+        Flush the buffer and stop the background flusher, the items still failing are given up
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+        for attempt in range(self.maxattempts):
+            if not self._pending:
+                break
+            self.flush()
+        with self._condition:
+            pending, self._pending, self._pendingsize = self._pending, [], 0
+        for entry in pending:
+            self._giveup(entry[0], 'the buffer was closed')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _full(self):
+        return len(self._pending) >= self.BATCH_SIZE or \
+            (self.MAX_BATCH_PAYLOAD is not None and self._pendingsize >= self.MAX_BATCH_PAYLOAD)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    if self._full():
+                        break
+                    if self._pending:
+                        remaining = self._pending[0][2] + self.maxdelay - time.time()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                if self._stopping:
+                    return
+            self._flushBatch()
+
+    def _takeBatch(self):
+        with self._condition:
+            count, size = 0, 0
+            for entry in self._pending[:self.BATCH_SIZE]:
+                if self.MAX_BATCH_PAYLOAD is not None and count and size + entry[1] > self.MAX_BATCH_PAYLOAD:
+                    break
+                count += 1
+                size += entry[1]
+            batch, self._pending = self._pending[:count], self._pending[count:]
+            self._pendingsize -= size
+            return batch
+
+    def _flushBatch(self):
+        """
+        @return: the number of entries taken from the buffer
+        @rtype: int
+        """
+        with self._flushing:
+            batch = self._takeBatch()
+            if not batch:
+                return 0
+            self.requests += 1
+            try:
+                failed = self._sendBatch([entry[0] for entry in batch])
+            except Exception as e:
+                self.logger.warn("%s batch error [%s]", type(self).__name__, e)
+                failed = dict((i, (True, str(e))) for i in range(len(batch)))
+            retry = []
+            for i, entry in enumerate(batch):
+                if i not in failed:
+                    self.succeeded += 1
+                    continue
+                retriable, error = failed[i]
+                entry[3] += 1
+                if not retriable or entry[3] >= self.maxattempts:
+                    self._giveup(entry[0], error)
+                else:
+                    entry[2] = time.time()
+                    retry.append(entry)
+            if retry:
+                self.logger.warn("%d items failed, requeued", len(retry))
+                with self._condition:
+                    self._pending[:0] = retry
+                    self._pendingsize += sum(entry[1] for entry in retry)
+            return len(batch)
+
+    @abc.abstractmethod
+    def _sendBatch(self, items):
+        """
+        @return: the failed items {index:(retriable, error)}
+        @rtype: dict
+        """
+
+    def _giveup(self, item, error):
+        self.failed += 1
+        self.logger.warn("%s gave up %s [%s]", type(self).__name__, item, error)
+        if self.onfailure is not None:
+            self.onfailure(item)
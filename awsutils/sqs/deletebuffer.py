@@ -0,0 +1,26 @@
+# awsutils/sqs/deletebuffer.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+from awsutils.sqs.batchbuffer import SQSBatchBuffer
+
+
+class SQSDeleteBuffer(SQSBatchBuffer):
+    """
+    Collects receipt handles and deletes them with DeleteMessageBatch in groups of 10, a batch is sent as soon as
+    it is full or when its oldest entry waited maxdelay seconds; the failed entries are retried with the next batch
+    """
+
+    def add(self, receiptHandle):
+        self._add(receiptHandle)
+
+    @property
+    def deleted(self):
+        return self.succeeded
+
+    def _sendBatch(self, items):
+        succeeded = set(self.sqsclient.deleteMessageBatch(self.qName, items))
+        return dict((i, (True, 'DeleteMessageBatch entry failed')) for i in range(len(items))
+                    if 'id-%d' % (i + 1,) not in succeeded)
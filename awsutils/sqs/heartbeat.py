@@ -0,0 +1,140 @@
+# awsutils/sqs/heartbeat.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import time, logging, threading
+
+
+class SQSHeartbeat:
+    """
+    Keeps the tracked in flight messages invisible: shortly before the visibility timeout of a message runs out it is
+    extended, the messages due about the same time are grouped into ChangeMessageVisibilityBatch requests
+    """
+    COOLDOWN_AFTER_ERROR = 1
+    # SQS does not extend the visibility beyond 12 hours from the reception
+    MAX_LIFETIME = 43200
+
+    def __init__(self, sqsclient, qName, margin=10, extension=None):
+        """
+        @param sqsclient: the sqsclient to be used for communication
+        @type sqsclient: SQSClient
+        @param qName: the sqs queue name
+        @type qName: str
+        @param margin: extend the visibility when less than this many seconds are left
+        @type margin: float
+        @param extension: the new visibility timeout, None keeps the message's current one
+        @type extension: int
+        """
+        self.sqsclient = sqsclient
+        self.qName = qName
+        self.margin = margin
+        self.extension = extension
+        self.extended = 0
+        self.requests = 0
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        # receiptHandle: [message, first reception timestamp]
+        self._tracked = {}
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="SQSHeartbeat-%s" % (qName,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def track(self, message):
+        """
+        @type message: SQSMessage
+        """
+        with self._condition:
+            self._tracked[message.receiptHandle] = [message, message.receptionTimestamp]
+            self._condition.notify_all()
+
+    def untrack(self, message):
+        """
+        @type message: SQSMessage
+        """
+        with self._condition:
+            self._tracked.pop(message.receiptHandle, None)
+
+    def __len__(self):
+        return len(self._tracked)
+
+    def close(self):
+        with self._condition:
+            self._stopping = True
+            self._tracked.clear()
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.time()
+                    deadlines = [self._deadline(entry[0]) for entry in self._tracked.values()]
+                    if deadlines and min(deadlines) - self.margin <= now:
+                        break
+                    self._condition.wait(min(deadlines) - self.margin - now if deadlines else None)
+                # take along everything due within the next margin as well, so they share the requests
+                due = [(receiptHandle, entry[0], entry[1]) for receiptHandle, entry in self._tracked.items()
+                       if self._deadline(entry[0]) - 2 * self.margin <= now]
+            if not self._extend(due):
+                time.sleep(self.COOLDOWN_AFTER_ERROR)
+
+    def _deadline(self, message):
+        return message.receptionTimestamp + int(message.VisibilityTimeout)
+
+    def _extend(self, due):
+        """
+        @return: False if a request failed
+        @rtype: bool
+        """
+        success = True
+        now = time.time()
+        receipts = {}
+        for receiptHandle, message, firstreception in due:
+            extension = int(message.VisibilityTimeout) if self.extension is None else self.extension
+            extension = min(extension, int(self.MAX_LIFETIME - (now - firstreception)))
+            if extension <= self.margin:
+                self.logger.warn('message reached the maximum visibility timeout %s', message)
+                self.untrack(message)
+                continue
+            receipts[receiptHandle] = (message, extension)
+
+        receiptHandles = list(receipts)
+        for i in range(0, len(receiptHandles), 10):
+            batch = receiptHandles[i:i + 10]
+            requesttime = time.time()
+            self.requests += 1
+            try:
+                data = self.sqsclient.changeMessageVisibilityBatch(
+                    self.qName, dict((receiptHandle, receipts[receiptHandle][1]) for receiptHandle in batch))
+            except Exception as e:
+                self.logger.warn('changeMessageVisibilityBatch error [%s]', e)
+                success = False
+                continue
+            succeeded = self._succeededIds(data)
+            for n, receiptHandle in enumerate(batch, 1):
+                message, extension = receipts[receiptHandle]
+                if 'msg%d' % (n,) in succeeded:
+                    message.receptionTimestamp = requesttime
+                    message.VisibilityTimeout = message.visibilityTimeout = extension
+                    self.extended += 1
+                else:
+                    # most likely deleted meanwhile or the receipt handle expired
+                    self.logger.warn('could not extend the visibility of %s', message)
+                    self.untrack(message)
+        return success
+
+    def _succeededIds(self, data):
+        data = data.get('ChangeMessageVisibilityBatchResult') if isinstance(data, dict) else None
+        if not isinstance(data, dict) or 'ChangeMessageVisibilityBatchResultEntry' not in data:
+            return set()
+        data = data['ChangeMessageVisibilityBatchResultEntry']
+        if isinstance(data, dict):
+            data = [data]
+        return set(item['Id'] for item in data)
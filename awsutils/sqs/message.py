@@ -22,7 +22,7 @@ class SQSMessage:
     def delete(self):
         if self.queue is None:
             raise UserInputException('This message does not belong to any queue')
-        self.queue.sqsclient.deleteMessage(self.queue.qName, self.receiptHandle)
+        self.queue.delete(self)
 
     def visibilityTimeoutLeft(self):
         if self.queue is None:
@@ -34,8 +34,12 @@ class SQSMessage:
             raise UserInputException('This message does not belong to any queue')
         if self.receiptHandle is None:
             raise UserInputException('This message does not have a receipt handle')
-        self.queue.lsqsclient.changeMessageVisibility(self.queue.qName, self.receiptHandle, visibilityTimeout)
-        self.VisibilityTimeout = visibilityTimeout
+        if visibilityTimeout == 0 and self.queue.heartbeat is not None:
+            self.queue.heartbeat.untrack(self)
+        requesttime = time.time()
+        self.queue.sqsclient.changeMessageVisibility(self.queue.qName, self.receiptHandle, visibilityTimeout)
+        self.receptionTimestamp = requesttime
+        self.VisibilityTimeout = self.visibilityTimeout = visibilityTimeout
 
     def __repr__(self):
         return 'SQSMessage: ' + repr(self.__dict__)
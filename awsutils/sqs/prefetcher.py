@@ -0,0 +1,161 @@
+# awsutils/sqs/prefetcher.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import time, logging, threading, collections
+
+
+class SQSPrefetcher:
+    """
+    Background poller keeping a local buffer of received messages: when the buffer drops to lowwatermark it long
+    polls for batches of (up to) 10 messages until the buffer reaches highwatermark
+    """
+    COOLDOWN_BETWEEN_RECEIVEMESSAGES = 1
+
+    def __init__(self, queue, attributes='All', visibilityTimeout=None, highwatermark=20, lowwatermark=10,
+                 waitTimeSeconds=20, neverfail=True):
+        """
+        @param queue: the queue to receive from
+        @type queue: SQSQueue
+        @param visibilityTimeout: the visibility timeout requested for the received messages
+        @type visibilityTimeout: int
+        @param highwatermark: the poller stops receiving when the buffer has this many messages
+        @type highwatermark: int
+        @param lowwatermark: the poller starts receiving again when the buffer drops to this many messages
+        @type lowwatermark: int
+        @param waitTimeSeconds: long polling time (max 20)
+        @type waitTimeSeconds: int
+        @param neverfail: don't stop on aws exceptions, just log them
+        @type neverfail: bool
+        """
+        if not 0 <= lowwatermark < highwatermark:
+            raise ValueError("0 <= lowwatermark < highwatermark")
+        self.queue = queue
+        self.attributes = attributes
+        self.visibilityTimeout = visibilityTimeout
+        self.highwatermark = highwatermark
+        self.lowwatermark = lowwatermark
+        self.waitTimeSeconds = waitTimeSeconds
+        self.neverfail = neverfail
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._buffer = collections.deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._exception = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._poll, name="SQSPrefetcher-%s" % (self.queue.qName,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, release=True):
+        """
+        Stop the poller, the poll in progress (if any) is finished in the background
+        @param release: make the buffered messages visible again right away for the other consumers
+        @type release: bool
+        """
+        with self._condition:
+            self._stopping = True
+            messages = list(self._buffer)
+            self._buffer.clear()
+            self._condition.notify_all()
+        if release and messages:
+            self.release(messages)
+
+    def release(self, messages):
+        if self.queue.heartbeat is not None:
+            for message in messages:
+                self.queue.heartbeat.untrack(message)
+        for i in range(0, len(messages), 10):
+            try:
+                self.queue.sqsclient.changeMessageVisibilityBatch(
+                    self.queue.qName, dict((message.receiptHandle, 0) for message in messages[i:i + 10]))
+            except Exception as e:
+                self.logger.warn("could not release the buffered messages [%s]", e)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def get(self, timeout=None):
+        """
+        Take the next buffered message, the messages whose visibility timeout expired while buffered are dropped
+        @param timeout: how long to wait for a message, None waits forever
+        @type timeout: float
+        @return: the message or None if the timeout expired
+        @rtype: SQSMessage
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                while self._buffer:
+                    message = self._buffer.popleft()
+                    if len(self._buffer) <= self.lowwatermark:
+                        self._condition.notify_all()
+                    if message.visibilityTimeoutLeft() > 0:
+                        return message
+                    self.logger.warn('message expired in the buffer %s', message)
+                if self._exception is not None:
+                    exception, self._exception = self._exception, None
+                    raise exception
+                if self._stopping:
+                    return None
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+
+    def _poll(self):
+        while True:
+            with self._condition:
+                while not self._stopping and len(self._buffer) > self.lowwatermark:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+
+            # fill up the buffer to the high watermark
+            while True:
+                with self._condition:
+                    if self._stopping:
+                        return
+                    needed = self.highwatermark - len(self._buffer)
+                if needed <= 0:
+                    break
+                receptionTimestamp = time.time()
+                try:
+                    items = self.queue.sqsclient.receiveMessage(self.queue.qName, self.attributes,
+                                                                maxNumberOfMessages=min(needed, 10),
+                                                                visibilityTimeout=self.visibilityTimeout,
+                                                                waitTimeSeconds=self.waitTimeSeconds)
+                except Exception as e:
+                    if not self.neverfail:
+                        with self._condition:
+                            self._exception = e
+                            self._stopping = True
+                            self._condition.notify_all()
+                        return
+                    self.logger.warn('receiveMessage error [%s]', e)
+                    time.sleep(self.COOLDOWN_BETWEEN_RECEIVEMESSAGES)
+                    continue
+
+                messages = [self.queue.buildMessage(item, self.visibilityTimeout, receptionTimestamp)
+                            for item in items]
+                with self._condition:
+                    if self._stopping:
+                        # stop() was called during the poll
+                        release = messages
+                    else:
+                        release = None
+                        self._buffer.extend(messages)
+                        self._condition.notify_all()
+                if release:
+                    self.release(release)
+                    return
+                if not messages and not self.waitTimeSeconds:
+                    time.sleep(self.COOLDOWN_BETWEEN_RECEIVEMESSAGES)
@@ -7,6 +7,10 @@
 import time, logging
 from awsutils.exceptions.aws import UserInputException
 from awsutils.sqs.message import SQSMessage
+from awsutils.sqs.prefetcher import SQSPrefetcher
+from awsutils.sqs.deletebuffer import SQSDeleteBuffer
+from awsutils.sqs.sendbuffer import SQSSendBuffer
+from awsutils.sqs.heartbeat import SQSHeartbeat
 
 class SQSQueue:
     COOLDOWN_BETWEEN_RECEIVEMESSAGES = 1
@@ -21,6 +25,9 @@ class SQSQueue:
         self.VisibilityTimeout = 60
         self.qName = qName
         self.sqsclient = sqsclient
+        self.deleteBuffer = None
+        self.sendBuffer = None
+        self.heartbeat = None
         self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
         self.logger.addHandler(logging.NullHandler())
         if loadAttributes:
@@ -41,17 +48,94 @@ class SQSQueue:
         """
         if message.messageBody is None:
             raise UserInputException('this message has no body')
-        self.sqsclient.sendMessage(self.qName, message.messageBody, delaySeconds)
+        if self.sendBuffer is not None:
+            self.sendBuffer.add(message.messageBody, delaySeconds)
+        else:
+            self.sqsclient.sendMessage(self.qName, message.messageBody, delaySeconds)
+
+    def startSendBuffer(self, linger=0.1, maxattempts=3, onfailure=None):
+        """
+        From now on send coalesces the messages into SendMessageBatch requests, see SQSSendBuffer
+        @param linger: the maximum time in seconds a message waits for a batch to fill up
+        @type linger: float
+        @param maxattempts: give up a message after this many failures
+        @type maxattempts: int
+        @param onfailure: called with the (messageBody, delaySeconds) of the messages given up
+        @type onfailure: callable
+        @rtype: SQSSendBuffer
+        """
+        if self.sendBuffer is None:
+            self.sendBuffer = SQSSendBuffer(self.sqsclient, self.qName, linger, maxattempts, onfailure)
+        return self.sendBuffer
+
+    def stopSendBuffer(self):
+        """
+        Send the buffered messages and switch back to one SendMessage request per message
+        """
+        if self.sendBuffer is not None:
+            sendBuffer, self.sendBuffer = self.sendBuffer, None
+            sendBuffer.close()
 
     def delete(self, message):
         if message.receiptHandle is None:
             raise UserInputException('this message does not have receiptHandle set')
         if message.queue != self:
             raise UserInputException('this message does not belong to this queue')
-        self.sqsclient.deleteMessage(message.queue.qName, message.receiptHandle)
+        if self.heartbeat is not None:
+            self.heartbeat.untrack(message)
+        if self.deleteBuffer is not None:
+            self.deleteBuffer.add(message.receiptHandle)
+        else:
+            self.sqsclient.deleteMessage(message.queue.qName, message.receiptHandle)
         message.queue = None
         message.receiptHandle = None
 
+    def startHeartbeat(self, margin=10, extension=None):
+        """
+        From now on the visibility of every received message is extended until it is deleted (or its visibility is
+        changed to 0), see SQSHeartbeat
+        @param margin: extend the visibility when less than this many seconds are left
+        @type margin: float
+        @param extension: the new visibility timeout, None keeps the message's current one
+        @type extension: int
+        @rtype: SQSHeartbeat
+        """
+        if self.heartbeat is None:
+            self.heartbeat = SQSHeartbeat(self.sqsclient, self.qName, margin, extension)
+        return self.heartbeat
+
+    def stopHeartbeat(self):
+        """
+        Stop extending the visibility of the in flight messages
+        """
+        if self.heartbeat is not None:
+            heartbeat, self.heartbeat = self.heartbeat, None
+            heartbeat.close()
+
+    def startDeleteBuffer(self, maxdelay=1, maxattempts=3, onfailure=None):
+        """
+        From now on delete (and so the autodelete of the message generators) batches the deletions with
+        DeleteMessageBatch, see SQSDeleteBuffer
+        @param maxdelay: the maximum time in seconds a deletion is delayed
+        @type maxdelay: float
+        @param maxattempts: give up a deletion after this many failures
+        @type maxattempts: int
+        @param onfailure: called with the receipt handle of the deletions given up
+        @type onfailure: callable
+        @rtype: SQSDeleteBuffer
+        """
+        if self.deleteBuffer is None:
+            self.deleteBuffer = SQSDeleteBuffer(self.sqsclient, self.qName, maxdelay, maxattempts, onfailure)
+        return self.deleteBuffer
+
+    def stopDeleteBuffer(self):
+        """
+        Flush the pending deletions and switch back to one DeleteMessage request per message
+        """
+        if self.deleteBuffer is not None:
+            deleteBuffer, self.deleteBuffer = self.deleteBuffer, None
+            deleteBuffer.close()
+
     def receive(self, attributes='All', maxNumberOfMessages=1, visibilityTimeout=None, waitTimeSeconds=None):
         """
         @type visibilityTimeout: int
@@ -59,6 +143,7 @@ class SQSQueue:
         @type maxNumberOfMessages: int
         """
         messages = []
+        receptionTimestamp = time.time()
         if waitTimeSeconds is None or waitTimeSeconds <= 20:
             messages = self.sqsclient.receiveMessage(self.qName, attributes, maxNumberOfMessages,
                                                      visibilityTimeout, waitTimeSeconds)
@@ -69,7 +154,7 @@ class SQSQueue:
                 _waitTimeSeconds = min(remainingtime, 20)
                 if _waitTimeSeconds <= 0:
                     return None
-                print(time.time(), waitTimeSeconds, _waitTimeSeconds)
+                receptionTimestamp = time.time()
                 messages = self.sqsclient.receiveMessage(self.qName, attributes, maxNumberOfMessages,
                                                          visibilityTimeout, _waitTimeSeconds)
                 if messages != []:
@@ -81,18 +166,8 @@ class SQSQueue:
             else: return []
 
         result = []
-        if visibilityTimeout is None:
-            visibilityTimeout = int(self.VisibilityTimeout)
-
         for item in messages:
-            message = SQSMessage(item['Body'])
-            message.id = item['MessageId']
-            message.receiptHandle = item['ReceiptHandle']
-            message.queue = self
-            message.visibilityTimeout = visibilityTimeout
-            message.receptionTimestamp = time.time()
-            for attribute in item['Attribute']:
-                setattr(message, attribute['Name'], attribute['Value'])
+            message = self.buildMessage(item, visibilityTimeout, receptionTimestamp)
             if maxNumberOfMessages == 1:
                 return message
             result.append(message)
@@ -110,6 +185,7 @@ class SQSQueue:
         @rtype: SQSMessage
         """
         while True:
+            receptionTimestamp = time.time()
             try:
                 items = self.sqsclient.receiveMessage(self.qName, attributes,
                                                       maxNumberOfMessages = 1,
@@ -126,30 +202,81 @@ class SQSQueue:
                 time.sleep(self.COOLDOWN_BETWEEN_RECEIVEMESSAGES)
                 continue
 
-            item = items[0]
-
-            message = SQSMessage(item['Body'])
-            message.id = item['MessageId']
-            message.receiptHandle = item['ReceiptHandle']
-            message.queue = self
-            message.visibilityTimeout = visibilityTimeout
-            message.receptionTimestamp = time.time()
-            for attribute in item['Attribute']:
-                setattr(message, attribute['Name'], attribute['Value'])
+            message = self.buildMessage(items[0], visibilityTimeout, receptionTimestamp)
 
             yield message
 
             if autodelete:
-                timeleft = message.visibilityTimeoutLeft()
-                if timeleft < 0:
-                    self.logger.warn('Missed the message deletion by %s s. %s', -1*timeleft, message)
-                else:
-                    try:
-                        self.delete(message)
-                    except Exception as e:
-                        if neverfail:
-                            self.logger.warn("Could not delete the message %s [%s]", message, e)
-                        raise
+                self._autodelete(message, neverfail)
+
+    def bufferedMessages(self, attributes='All', visibilityTimeout=None, autodelete=True, neverfail=True,
+                         highwatermark=20, lowwatermark=10):
+        """
+        Generator to retrieve infinitely messages from a queue, a background thread long polls for batches of 10
+        messages keeping a local buffer between lowwatermark and highwatermark messages
+        @param visibilityTimeout:
+        @type visibilityTimeout: int
+        @param autodelete: the message deletion will be attempted upon release
+        @type autodelete: bool
+        @param neverfail: don't fail on aws exceptions
+        @type neverfail: bool
+        @param highwatermark: the poller stops receiving when the buffer has this many messages
+        @type highwatermark: int
+        @param lowwatermark: the poller starts receiving again when the buffer drops to this many messages
+        @type lowwatermark: int
+        @rtype: SQSMessage
+        """
+        prefetcher = SQSPrefetcher(self, attributes=attributes, visibilityTimeout=visibilityTimeout,
+                                   highwatermark=highwatermark, lowwatermark=lowwatermark, neverfail=neverfail)
+        prefetcher.start()
+        try:
+            while True:
+                message = prefetcher.get()
+                yield message
+                if autodelete:
+                    self._autodelete(message, neverfail)
+        finally:
+            prefetcher.stop()
+
+    def buildMessage(self, item, visibilityTimeout=None, receptionTimestamp=None):
+        """
+        Create a SQSMessage from a receiveMessage result item
+        @param visibilityTimeout: the visibility timeout requested on reception, None means the queue's
+        @type visibilityTimeout: int
+        @param receptionTimestamp: when the receive request was sent
+        @type receptionTimestamp: float
+        @rtype: SQSMessage
+        """
+        if visibilityTimeout is None:
+            visibilityTimeout = int(self.VisibilityTimeout)
+        if receptionTimestamp is None:
+            receptionTimestamp = time.time()
+        message = SQSMessage(item['Body'])
+        message.id = item['MessageId']
+        message.receiptHandle = item['ReceiptHandle']
+        message.queue = self
+        message.visibilityTimeout = visibilityTimeout
+        message.VisibilityTimeout = visibilityTimeout
+        message.receptionTimestamp = receptionTimestamp
+        attributes = item.get('Attribute', [])
+        if isinstance(attributes, dict): attributes = [attributes]
+        for attribute in attributes:
+            setattr(message, attribute['Name'], attribute['Value'])
+        if self.heartbeat is not None:
+            self.heartbeat.track(message)
+        return message
+
+    def _autodelete(self, message, neverfail):
+        timeleft = message.visibilityTimeoutLeft()
+        if timeleft < 0:
+            self.logger.warn('Missed the message deletion by %s s. %s', -1*timeleft, message)
+        else:
+            try:
+                self.delete(message)
+            except Exception as e:
+                if not neverfail:
+                    raise
+                self.logger.warn("Could not delete the message %s [%s]", message, e)
 
     def __repr__(self):
         return "SQSQueue: " + repr(self.__dict__)
@@ -0,0 +1,28 @@
+# awsutils/sqs/sendbuffer.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+from awsutils.sqs.batchbuffer import SQSBatchBuffer
+
+
+class SQSSendBuffer(SQSBatchBuffer):
+    """
+    Coalesces the sent messages into SendMessageBatch requests of up to 10 messages and 256 KiB, a batch is sent as
+    soon as it is full or when its oldest message lingered maxdelay seconds; the MD5OfMessageBody of every message
+    is verified and only the failed messages are sent again
+    """
+    MAX_BATCH_PAYLOAD = 262144
+
+    def add(self, messageBody, delaySeconds=None):
+        self._add((messageBody, delaySeconds), len(messageBody.encode(encoding='utf8')))
+
+    @property
+    def sent(self):
+        return self.succeeded
+
+    def _sendBatch(self, items):
+        successful, failed = self.sqsclient.sendMessageBatch(self.qName, items, hashcheck=True)
+        return dict((i, (error.get('SenderFault') != 'true', "%s: %s" % (error.get('Code'), error.get('Message'))))
+                    for i, error in failed.items())
@@ -0,0 +1,73 @@
+# awsutils/sqs/urlcache.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import os, json, logging, threading
+
+
+class SQSQueueUrlCache:
+    """
+    Remembers the account number owning the queues (the path of the queue url) per access key and endpoint, so the
+    clients don't have to look it up on every start; with a path it is persisted in a json file
+    """
+
+    def __init__(self, path=None):
+        """
+        @param path: the json file to persist the cache, None keeps it in process only
+        @type path: str
+        """
+        self.path = path
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._lock = threading.Lock()
+        self._data = None
+
+    def get(self, access_key, endpoint, qName):
+        """
+        @return: the account number owning the queue or None if unknown
+        @rtype: str
+        """
+        with self._lock:
+            return self._load().get(access_key, {}).get(endpoint, {}).get(qName)
+
+    def set(self, access_key, endpoint, qName, accNumber):
+        with self._lock:
+            queues = self._load().setdefault(access_key, {}).setdefault(endpoint, {})
+            if queues.get(qName) != accNumber:
+                queues[qName] = accNumber
+                self._save()
+
+    def discard(self, access_key, endpoint, qName):
+        with self._lock:
+            queues = self._load().get(access_key, {}).get(endpoint, {})
+            if queues.pop(qName, None) is not None:
+                self._save()
+
+    def _load(self):
+        if self._data is None:
+            self._data = {}
+            if self.path is not None and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError) as e:
+                    self.logger.warn("could not load the queue url cache %s [%s]", self.path, e)
+        return self._data
+
+    def _save(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self._data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            self.logger.warn("could not save the queue url cache %s [%s]", self.path, e)
+
+
+# shared by the clients created without an explicit cache
+DEFAULT_URL_CACHE = SQSQueueUrlCache()
@@ -0,0 +1,156 @@
+# awsutils/sqs/workerpool.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import logging, threading, concurrent.futures
+from awsutils.sqs.prefetcher import SQSPrefetcher
+
+
+class SQSWorkerPool:
+    """
+    Consumes a queue with a pool of worker threads (or processes): a shared SQSPrefetcher long polls for messages,
+    at most maxinflight messages are handed to the workers at a time. The handler gets the message body, if it
+    returns anything but False the message is acknowledged (deleted) otherwise, or if it raises, the message is
+    negatively acknowledged (its visibility timeout is set to nackdelay so it is redelivered)
+    """
+    POLL_TIMEOUT = 1
+
+    def __init__(self, queue, handler, workers=4, maxinflight=None, processes=False, nackdelay=0, heartbeat=True,
+                 batchdelete=True, visibilityTimeout=None, highwatermark=20, lowwatermark=10):
+        """
+        @param queue: the queue to consume
+        @type queue: SQSQueue
+        @param handler: called with the message body, with processes=True it has to be picklable
+        @type handler: callable
+        @param workers: the number of worker threads or processes
+        @type workers: int
+        @param maxinflight: the maximum number of messages handed to the workers, by default 2 * workers
+        @type maxinflight: int
+        @param processes: use worker processes instead of threads
+        @type processes: bool
+        @param nackdelay: the visibility timeout set on the negatively acknowledged messages
+        @type nackdelay: int
+        @param heartbeat: extend the visibility of the messages while they are processed, see SQSQueue.startHeartbeat
+        @type heartbeat: bool
+        @param batchdelete: acknowledge with DeleteMessageBatch, see SQSQueue.startDeleteBuffer
+        @type batchdelete: bool
+        """
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.maxinflight = 2 * workers if maxinflight is None else maxinflight
+        self.processes = processes
+        self.nackdelay = nackdelay
+        self.heartbeat = heartbeat
+        self.batchdelete = batchdelete
+        self.visibilityTimeout = visibilityTimeout
+        self.highwatermark = highwatermark
+        self.lowwatermark = lowwatermark
+        self.acked = 0
+        self.nacked = 0
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._slots = threading.BoundedSemaphore(self.maxinflight)
+        self._countlock = threading.Lock()
+        self._stopping = threading.Event()
+        self._executor = None
+        self._prefetcher = None
+        self._dispatcher = None
+        self._started = []
+
+    def start(self):
+        if self.heartbeat and self.queue.heartbeat is None:
+            self.queue.startHeartbeat()
+            self._started.append(self.queue.stopHeartbeat)
+        if self.batchdelete and self.queue.deleteBuffer is None:
+            self.queue.startDeleteBuffer()
+            self._started.append(self.queue.stopDeleteBuffer)
+        if self.processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        self._prefetcher = SQSPrefetcher(self.queue, visibilityTimeout=self.visibilityTimeout,
+                                         highwatermark=self.highwatermark, lowwatermark=self.lowwatermark)
+        self._prefetcher.start()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="SQSWorkerPool-%s" % (self.queue.qName,))
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def stop(self, drain=True):
+        """
+        Stop receiving, the buffered messages are released right away
+        @param drain: wait for the messages being processed to be finished and (n)acknowledged
+        @type drain: bool
+        """
+        self._stopping.set()
+        self._prefetcher.stop()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=drain)
+        if drain:
+            for i in range(self.maxinflight):
+                self._slots.acquire()
+            for i in range(self.maxinflight):
+                self._slots.release()
+        for stop in reversed(self._started):
+            stop()
+        self._started = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _dispatch(self):
+        while not self._stopping.is_set():
+            if not self._slots.acquire(timeout=self.POLL_TIMEOUT):
+                continue
+            try:
+                message = self._prefetcher.get(self.POLL_TIMEOUT)
+            except Exception as e:
+                self._slots.release()
+                self.logger.error("receive error [%s]", e)
+                continue
+            if message is None:
+                self._slots.release()
+                continue
+            try:
+                future = self._executor.submit(self.handler, message.messageBody)
+            except Exception as e:
+                self.logger.error("could not submit the message %s [%s]", message, e)
+                self._nack(message)
+                self._slots.release()
+                continue
+            future.add_done_callback(lambda future, message=message: self._done(future, message))
+
+    def _done(self, future, message):
+        try:
+            try:
+                success = future.result() is not False
+            except Exception as e:
+                self.logger.warn("handler failed on %s [%s]", message, e)
+                success = False
+            if success:
+                self._ack(message)
+            else:
+                self._nack(message)
+        finally:
+            self._slots.release()
+
+    def _ack(self, message):
+        with self._countlock:
+            self.acked += 1
+        self.queue._autodelete(message, neverfail=True)
+
+    def _nack(self, message):
+        with self._countlock:
+            self.nacked += 1
+        if self.queue.heartbeat is not None:
+            self.queue.heartbeat.untrack(message)
+        try:
+            message.changeVisibility(self.nackdelay)
+        except Exception as e:
+            self.logger.warn("could not nack the message %s [%s]", message, e)
@@ -7,9 +7,10 @@
 import hashlib, json
 import awsutils.exceptions.sqs
 from awsutils.exceptions.aws import UserInputException, IntegrityCheckException, extractExceptionsFromModule2Dicitonary
-from awsutils.utils.auth import urlquote
+from awsutils.utils.auth import urlquote, canonicalQueryString
 from awsutils.awsclient import AWSClient
 from awsutils.iamclient import IAMClient
+from awsutils.sqs.urlcache import DEFAULT_URL_CACHE
 from awsutils.utils.auth import SIGNATURE_V4_HEADERS
 
 SQS_PERMISSIONS = {'*', 'SendMessage', 'ReceiveMessage', 'DeleteMessage', 'ChangeMessageVisibility',
@@ -22,17 +23,45 @@ SQS_QUEUE_ATTRIBUTES = {'All', 'ApproximateNumberOfMessages', 'ApproximateNumber
 
 class SQSClient(AWSClient):
 
-    def __init__(self, endpoint, access_key, secret_key, accNumber=None, secure=False):
+    def __init__(self, endpoint, access_key, secret_key, accNumber=None, secure=False, urlcache=None):
+        """
+        @param accNumber: the account number owning the queues, if None it's looked up (with GetQueueUrl) on the
+                          first use of every queue and remembered in urlcache
+        @type accNumber: str
+        @param urlcache: by default the in process DEFAULT_URL_CACHE
+        @type urlcache: SQSQueueUrlCache
+        """
         AWSClient.__init__(self, endpoint, access_key, secret_key, secure)
-        #try to retrieve the curent user's account number
-        if accNumber is None:
-            iam = IAMClient(access_key, secret_key)
+        self._accNumber = accNumber
+        self.urlcache = DEFAULT_URL_CACHE if urlcache is None else urlcache
+
+    @property
+    def accNumber(self):
+        """
+        The current user's account number, if it was not given it is retrieved with IAMClient on the first access
+        """
+        if self._accNumber is None:
+            iam = IAMClient(self.access_key, self.secret_key)
             userinfo = iam.getUser()
-            self.accNumber = userinfo['UserId']
+            self._accNumber = userinfo['UserId']
             iam.closeConnections()
-            iam = None
-        else:
-            self.accNumber = accNumber
+        return self._accNumber
+
+    def queueUri(self, qName):
+        """
+        @param qName: the sqs queue name
+        @type qName: str
+        @return: the path of the queue url
+        @rtype: str
+        """
+        accNumber = self._accNumber
+        if accNumber is None:
+            accNumber = self.urlcache.get(self.access_key, self.endpoint, qName)
+        if accNumber is None:
+            url = self.getQueueUrl(qName)
+            accNumber = url['accNumber']
+            self.urlcache.set(self.access_key, self.endpoint, qName, accNumber)
+        return "/%s/%s" % (accNumber, qName)
 
     def addPermission(self, qName, label, permissions):
         """
@@ -51,7 +80,7 @@ class SQSClient(AWSClient):
             i += 1
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query,
                             region=self.endpoint[4:-14], service='sqs', host=self.endpoint,
-                            uri="/%s/%s" % (self.accNumber, qName))
+                            uri=self.queueUri(qName))
         data['awsresponse']['AddPermissionResponse']
 
     def removePermission(self, qName, label):
@@ -62,7 +91,7 @@ class SQSClient(AWSClient):
         query ={'Action':'RemovePermission', 'Label':label, 'Version':'2012-11-05'}
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query,
                             region=self.endpoint[4:-14], service='sqs', host=self.endpoint,
-                            uri="/%s/%s" % (self.accNumber, qName))
+                            uri=self.queueUri(qName))
         data['awsresponse']['RemovePermissionResponse']
 
     def changeMessageVisibility(self, qName, receiptHandle, visibilityTimeout):
@@ -75,7 +104,7 @@ class SQSClient(AWSClient):
         query = {'Action': 'ChangeMessageVisibility', 'ReceiptHandle': receiptHandle,
                  'VisibilityTimeout': visibilityTimeout, 'Version': '2012-11-05'}
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-                             service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                             service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         return data['awsresponse']['ChangeMessageVisibilityResponse']
 
     def changeMessageVisibilityBatch(self, qName, receipts):
@@ -95,7 +124,7 @@ class SQSClient(AWSClient):
             query['ChangeMessageVisibilityBatchRequestEntry.%s.VisibilityTimeout'%(i,)] = receipts[receiptHandle]
             i += 1
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-                             service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                             service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         return data['awsresponse']['ChangeMessageVisibilityBatchResponse']
 
     def createQueue(self, qName, delaySeconds=None, maximumMessageSize=None, messageRetentionPeriod=None,
@@ -154,6 +183,8 @@ class SQSClient(AWSClient):
         if url[7] == '/': url = url[8:]
         else: url = url[7:]
         url = url.split('/')
+        if self._accNumber is None:
+            self.urlcache.set(self.access_key, self.endpoint, url[2], url[1])
         return {'endpoint': url[0], 'accNumber': url[1], 'qName': url[2]}
 
     def deleteQueue(self, qName):
@@ -163,8 +194,9 @@ class SQSClient(AWSClient):
         """
         query ={'Action':'DeleteQueue', 'Version': '2012-11-05'}
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-                             service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                             service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         data['awsresponse']['DeleteQueueResponse']
+        self.urlcache.discard(self.access_key, self.endpoint, qName)
 
     def setQueueAttributes(self, qName, delaySeconds=None, maximumMessageSize=None, messageRetentionPeriod=None,
                            receiveMessageWaitTimeSeconds=None, visibilityTimeout=None, policy=None):
@@ -218,7 +250,7 @@ class SQSClient(AWSClient):
             i += 1
 
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-            service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+            service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         data['awsresponse']['SetQueueAttributesResponse']
 
     def getQueueAttributes(self, qName, attributes = 'All'):
@@ -237,7 +269,7 @@ class SQSClient(AWSClient):
                 query['AttributeName.%d'%(i,)] = attribute
                 i += 1
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query,region=self.endpoint[4:-14],
-                             service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                             service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         return data['awsresponse']['GetQueueAttributesResponse']['GetQueueAttributesResult']['Attribute']
 
 
@@ -312,7 +344,7 @@ class SQSClient(AWSClient):
                 query['AttributeName.%d' % (i + 1,)] = attributes[i]
 
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-                             service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                             service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         data = data['awsresponse']['ReceiveMessageResponse']['ReceiveMessageResult']
         if not isinstance(data, dict):
             return []
@@ -327,13 +359,17 @@ class SQSClient(AWSClient):
         """
         query = {'Action': 'DeleteMessage', 'ReceiptHandle': receiptHandle, 'Version': '2012-11-05'}
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-                            service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                            service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         data['awsresponse']['DeleteMessageResponse']
 
     def deleteMessageBatch(self, qName, receiptHandles):
         """
         @param qName: the sqs queue name
         @type qName: str
+        @param receiptHandles: at most 10 receipt handles
+        @type receiptHandles: list
+        @return: the ids of the successfully deleted entries, the receipt handle at index i has the id 'id-<i+1>'
+        @rtype: list
         """
         query = {'Action': 'DeleteMessageBatch', 'Version': '2012-11-05'}
         i = 1
@@ -342,13 +378,13 @@ class SQSClient(AWSClient):
             query['DeleteMessageBatchRequestEntry.%d.ReceiptHandle'%(i,)] = receiptHandle
             i += 1
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-                            service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                            service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         data = data['awsresponse']['DeleteMessageBatchResponse']['DeleteMessageBatchResult']
-        if isinstance(data, str):
+        if not isinstance(data, dict) or 'DeleteMessageBatchResultEntry' not in data:
             return []
         data = data['DeleteMessageBatchResultEntry']
         if isinstance(data, dict):
-            return data['Id']
+            return [data['Id']]
         result = []
         for item in data:
             result.append(item['Id'])
@@ -365,7 +401,7 @@ class SQSClient(AWSClient):
                 raise UserInputException('param delaySeconds too big (max 900 seconds)')
             query['DelaySeconds'] = delaySeconds
         data = self.request(method="GET", signmethod=SIGNATURE_V4_HEADERS, query=query, region=self.endpoint[4:-14],
-                             service='sqs', host=self.endpoint, uri="/%s/%s" % (self.accNumber, qName))
+                             service='sqs', host=self.endpoint, uri=self.queueUri(qName))
         md5message = data['awsresponse']['SendMessageResponse']['SendMessageResult']['MD5OfMessageBody']
         if hashcheck:
             messageBody = messageBody.encode(encoding='utf8')
@@ -376,6 +412,61 @@ class SQSClient(AWSClient):
                 raise IntegrityCheckException("sendMessage unexpected MD5OfMessageBody received",
                                               md5message, md5calculated)
 
+    def sendMessageBatch(self, qName, entries, hashcheck=False):
+        """
+        @param qName: the sqs queue name
+        @type qName: str
+        @param entries: at most 10 messageBody or (messageBody, delaySeconds) items, the request is sent with POST
+                        so the total payload may reach the 256 KiB limit
+        @type entries: list
+        @param hashcheck: verify the MD5OfMessageBody of the successful entries, the mismatching ones are reported
+                          as failed with the code MD5OfMessageBodyMismatch
+        @type hashcheck: bool
+        @return: successful {index:MessageId}, failed {index:{'Code', 'Message', 'SenderFault'}}
+        @rtype: tuple
+        """
+        if not 0 < len(entries) <= 10:
+            raise UserInputException('param entries should have between 1 and 10 items')
+        query = {'Action': 'SendMessageBatch', 'Version': '2012-11-05'}
+        bodies = []
+        for i, entry in enumerate(entries, 1):
+            delaySeconds = None
+            if not isinstance(entry, str):
+                entry, delaySeconds = entry
+            query['SendMessageBatchRequestEntry.%d.Id' % (i,)] = 'msg-%d' % (i,)
+            query['SendMessageBatchRequestEntry.%d.MessageBody' % (i,)] = entry
+            if delaySeconds is not None:
+                if delaySeconds > 900:
+                    raise UserInputException('param delaySeconds too big (max 900 seconds)')
+                query['SendMessageBatchRequestEntry.%d.DelaySeconds' % (i,)] = delaySeconds
+            bodies.append(entry)
+        body = canonicalQueryString(query).encode()
+        data = self.request(method="POST", signmethod=SIGNATURE_V4_HEADERS, body=body,
+                            headers={'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'},
+                            region=self.endpoint[4:-14], service='sqs', host=self.endpoint,
+                            uri=self.queueUri(qName))
+        data = data['awsresponse']['SendMessageBatchResponse']['SendMessageBatchResult']
+        successful, failed = {}, {}
+        if not isinstance(data, dict):
+            return successful, failed
+        items = data.get('SendMessageBatchResultEntry', [])
+        if isinstance(items, dict): items = [items]
+        for item in items:
+            index = int(item['Id'][4:]) - 1
+            if hashcheck:
+                md5calculated = hashlib.md5(bodies[index].encode(encoding='utf8')).hexdigest()
+                if item['MD5OfMessageBody'] != md5calculated:
+                    failed[index] = {'Code': 'MD5OfMessageBodyMismatch', 'SenderFault': 'false',
+                                     'Message': 'expected %s received %s' % (md5calculated,
+                                                                             item['MD5OfMessageBody'])}
+                    continue
+            successful[index] = item['MessageId']
+        items = data.get('BatchResultErrorEntry', [])
+        if isinstance(items, dict): items = [items]
+        for item in items:
+            failed[int(item['Id'][4:]) - 1] = item
+        return successful, failed
+
     #================================== helper functionality ===========================================================
     EXCEPTIONS = extractExceptionsFromModule2Dicitonary('awsutils.exceptions.sqs', awsutils.exceptions.sqs.SQSException)
 
@@ -4,7 +4,7 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import time, functools, xml
+import time, asyncio, functools, hashlib, xml.sax
 import tornado.ioloop
 import tornado.web
 import tornado.httpserver
@@ -16,8 +16,62 @@ from awsutils.exceptions.aws import AWSStatusException, AWSDataException
 import awsutils.utils.auth as auth
 
 
+def callbackCompatible(method):
+    """
+    Keeps the old callback calling convention of a native coroutine method working: without a callback the
+    coroutine is returned as it is (await it), if a callback is given (as keyword or as the first positional
+    argument) the coroutine is scheduled, the callback is called on the ioloop with the result and None is returned.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        callback = kwargs.pop('callback', None)
+        if callback is None and args and callable(args[0]):
+            callback, args = args[0], args[1:]
+        if callback is None:
+            return method(self, *args, **kwargs)
+        future = asyncio.ensure_future(method(self, *args, **kwargs), loop=self._ioloop.asyncio_loop)
+        self._ioloop.add_future(future, lambda future: callback(future.result()))
+    return wrapper
+
+
+class StreamingSink:
+    """
+    Receives the body of a non xml response chunk by chunk, successful (2xx) bodies are written straight to
+    inputobject (or collected in memory if there is none), any other body is kept in memory to be parsed as an
+    aws error response.
+    """
+    def __init__(self, inputobject=None, md5=False):
+        """
+        @param inputobject: any object implementing write(bytes)
+        @type inputobject: object
+        @param md5: calculate the md5 digest of the written data
+        @type md5: bool
+        """
+        self.inputobject = inputobject
+        self.md5 = hashlib.md5() if md5 else None
+        self.status = None
+        self.size = 0
+        self.chunks = []
+
+    def header(self, line):
+        if line.startswith('HTTP/'):
+            self.status = int(line.split(' ', 2)[1])
+
+    def write(self, data):
+        if self.status is None or not 200 <= self.status < 300 or self.inputobject is None:
+            self.chunks.append(data)
+        else:
+            self.inputobject.write(data)
+        if self.md5 is not None:
+            self.md5.update(data)
+        self.size += len(data)
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
 class AWSClient:
-    def __init__(self, endpoint, access_key, secret_key, secure=False, _ioloop=None):
+    def __init__(self, endpoint, access_key, secret_key, secure=False, _ioloop=None, max_body_size=None):
         """
         @type endpoint: the amazon endpoint of the service
         @type endpoint: str
@@ -29,6 +83,9 @@ class AWSClient:
         @type secure: bool
         @type _ioloop: the tornado ioloop for processing the events
         @type _ioloop: tornado.ioloop.IOLoop
+        @param max_body_size: the largest accepted response body, by default the AsyncHTTPClient's (100MB for
+                              the simple http client), if given a private AsyncHTTPClient is used
+        @type max_body_size: int
         """
         self.endpoint = endpoint
         self.access_key = access_key
@@ -38,7 +95,10 @@ class AWSClient:
             _ioloop = tornado.ioloop.IOLoop.instance()
         self._ioloop = _ioloop
         self.count = {}
-        self.http_client = tornado.httpclient.AsyncHTTPClient()
+        if max_body_size is None:
+            self.http_client = tornado.httpclient.AsyncHTTPClient()
+        else:
+            self.http_client = tornado.httpclient.AsyncHTTPClient(force_instance=True, max_body_size=max_body_size)
 
     def streamingCallback(self, incrementalParser, collector, data):
         collector.append(data)
@@ -52,24 +112,50 @@ class AWSClient:
     def checkForErrors(self, awsresponse, httpstatus, httpreason, httpheaders):
         pass
 
-    @tornado.gen.engine
-    def request(self, callback, endpoint=None, method='GET', uri='/', query=None, headers=None, statusexpected=None,
-                body=b'', signmethod=None, region=None, service=None, date=time.gmtime(), xmlexpected=True,
-                connect_timeout=2, request_timeout=5):
+    @callbackCompatible
+    async def request(self, endpoint=None, method='GET', uri='/', query=None, headers=None, statusexpected=None,
+                      body=b'', signmethod=None, region=None, service=None, date=time.gmtime(), xmlexpected=True,
+                      connect_timeout=2, request_timeout=5, inputobject=None, md5=False, body_producer=None):
+        """
+        @param xmlexpected: if False the response body is not fed to the xml parser, a successful body is written
+                            to inputobject as it arrives (or returned as bytes in data if there is no inputobject)
+        @type xmlexpected: bool
+        @param request_timeout: the timeout of the whole request in seconds, 0 disables it
+        @type request_timeout: float
+        @param inputobject: any object implementing write(bytes), used only if xmlexpected is False
+        @type inputobject: object
+        @param md5: calculate the md5 hexdigest of the received body, used only if xmlexpected is False
+        @type md5: bool
+        @param body_producer: streams the request body instead of body, called with a write function it must
+                              return an awaitable (see tornado.httpclient.HTTPRequest), the Content-Length header
+                              has to be set
+        @type body_producer: function
+        """
 
         if endpoint is None: endpoint = self.endpoint
         if statusexpected is None: statusexpected = [200]
-        headers, query, body = auth.signRequest(access_key=self.access_key, secret_key=self.secret_key,
-                                                endpoint=endpoint, region=region, service=service,
-                                                signmethod=signmethod, date=date,
-                                                uri=uri, method=method, headers=headers,
-                                                query=query, body=body)
-
-        awsresponse = []
-        handler = AWSXMLHandler()
-        incrementalParser = xml.sax.make_parser()
-        incrementalParser.setContentHandler(handler)
-        streamingCallback = functools.partial(self.streamingCallback, incrementalParser, awsresponse)
+        headers = {} if headers is None else dict(headers)
+        if method == "POST" and 'Content-Type' not in headers:
+            # tornado adds it after signing otherwise, it's part of some signatures
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        headers, query, body, querystring = auth.signRequestWithQueryString(access_key=self.access_key,
+                                                                            secret_key=self.secret_key,
+                                                                            endpoint=endpoint, region=region,
+                                                                            service=service, signmethod=signmethod,
+                                                                            date=date, uri=uri, method=method,
+                                                                            headers=headers, query=query, body=body)
+
+        if xmlexpected:
+            awsresponse = []
+            handler = AWSXMLHandler()
+            incrementalParser = xml.sax.make_parser()
+            incrementalParser.setContentHandler(handler)
+            streamingCallback = functools.partial(self.streamingCallback, incrementalParser, awsresponse)
+            headerCallback = None
+        else:
+            sink = StreamingSink(inputobject, md5)
+            streamingCallback = sink.write
+            headerCallback = sink.header
 
         protocol = 'https' if self.secure else 'http'
 
@@ -78,34 +164,59 @@ class AWSClient:
             self.count[method] = 0
         self.count[method] += 1
 
-        if method != "POST": body = None
-        request = tornado.httpclient.HTTPRequest("%s://%s%s?%s" % (protocol, endpoint, uri, auth.canonicalQueryString(query)),
-                                                 headers=headers, body=body, streaming_callback=streamingCallback,
-                                                 connect_timeout=connect_timeout, request_timeout=request_timeout, method=method)
-
-        #TODO: timeout handling
+        if body_producer is not None or method not in ("POST", "PUT"):
+            body = None
+        request = tornado.httpclient.HTTPRequest("%s://%s%s?%s" % (protocol, endpoint, uri, querystring),
+                                                 headers=headers, body=body, body_producer=body_producer,
+                                                 streaming_callback=streamingCallback,
+                                                 header_callback=headerCallback, connect_timeout=connect_timeout,
+                                                 request_timeout=request_timeout, method=method)
 
-        response = yield tornado.gen.Task(self.http_client.fetch, request)
+        try:
+            response = await self.http_client.fetch(request, raise_error=False)
+        except tornado.httpclient.HTTPError as e:
+            response = e.response
+            if response is None:
+                raise AWSStatusException({'status': e.code, 'headers': {}, 'data': None})
 
         resultdata = {'status':response.code, 'headers':dict(response.headers), 'data':None}
 
         if response.code == 599:
             raise AWSStatusException(resultdata)
 
-        if not hasattr(handler, 'exception'):
-            awsresponsexml = handler.getdict()
-            self.checkForErrors(awsresponsexml, response.code, '', response.headers)
-            #TODO: redirect handling
-        else:
-            if xmlexpected:
-                raise AWSDataException('xml-expected')
-
         if xmlexpected:
-            resultdata['data'] = awsresponsexml
+            if hasattr(handler, 'exception'):
+                resultdata['data'] = b''.join(awsresponse)
+                raise AWSDataException('xml-expected', resultdata)
+            resultdata['data'] = handler.getdict()
+            self.checkForErrors(resultdata['data'], response.code, '', response.headers)
+            #TODO: redirect handling
         else:
-            resultdata['data'] = b''.join(awsresponse)
+            if sink.status is None or not 200 <= sink.status < 300:
+                # most probably an aws error response
+                handler = AWSXMLHandler()
+                try:
+                    xml.sax.parseString(sink.getvalue(), handler)
+                except Exception:
+                    pass
+                else:
+                    self.checkForErrors(handler.getdict(), response.code, '', response.headers)
+            if inputobject is None or sink.chunks:
+                resultdata['data'] = sink.getvalue()
+            resultdata['inputobject'] = inputobject
+            resultdata['sizeinfo'] = self._sizeinfo(response, sink.size)
+            if md5:
+                resultdata['md5'] = sink.md5.hexdigest()
 
         if statusexpected is not True and response.code not in statusexpected:
             raise AWSStatusException(resultdata)
 
-        self._ioloop.add_callback(functools.partial(callback, resultdata))
\ No newline at end of file
+        return resultdata
+
+    def _sizeinfo(self, response, downloaded):
+        if response.code == 206 and 'Content-Range' in response.headers:
+            contentrange = response.headers['Content-Range'].split(' ')[1].split('/')
+            start, end = contentrange[0].split('-')
+            size = int(contentrange[1]) if contentrange[1] != '*' else None
+            return {'size': size, 'start': int(start), 'end': int(end), 'downloaded': downloaded}
+        return {'size': downloaded, 'start': 0, 'end': downloaded - 1, 'downloaded': downloaded}
@@ -1,6 +1,4 @@
-import functools, collections
-import tornado.gen
-from awsutils.tornado.awsclient import AWSClient
+from awsutils.tornado.awsclient import AWSClient, callbackCompatible
 from awsutils.exceptions.aws import UserInputException, extractExceptionsFromModule2Dicitonary
 import awsutils.exceptions.sdb
 from awsutils.utils.auth import SIGNATURE_V4_HEADERS
@@ -19,11 +17,11 @@ class SimpleDbClient(AWSClient):
         """
         AWSClient.__init__(self, 'iam.amazonaws.com', access_key, secret_key, secure=True, _ioloop = _ioloop)
 
-    @tornado.gen.engine
-    def getUser(self, callback, userName=None):
+    @callbackCompatible
+    async def getUser(self, userName=None):
         query = {'Action': 'GetUser', 'Version': self.VERSION}
         if userName is not None:
             query['UserName'] = userName
-        data = yield tornado.gen.Task(self.request, query=query, signmethod=SIGNATURE_V4_HEADERS)
-        data = data['awsresponse']['GetUserResponse']['GetUserResult']['User']
-        self._ioloop.add_callback(functools.partial(callback, data))
\ No newline at end of file
+        data = await self.request(query=query, signmethod=SIGNATURE_V4_HEADERS, region='us-east-1', service='iam')
+        data = data['data']['GetUserResponse']['GetUserResult']['User']
+        return data
\ No newline at end of file
@@ -1,23 +1,40 @@
-# awsutils/tornado/sdbclient.py
+# awsutils/tornado/s3client.py
 # Copyright 2013 Sandor Attila Gerendi (Sanyi)
 #
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import functools
+import os, io, base64, binascii, hashlib, collections
 import tornado.gen
-from awsutils.tornado.awsclient import AWSClient
-from awsutils.exceptions.aws import UserInputException, extractExceptionsFromModule2Dicitonary
+from awsutils.tornado.awsclient import AWSClient, callbackCompatible
+from awsutils.exceptions.aws import UserInputException, IntegrityCheckException, \
+    extractExceptionsFromModule2Dicitonary
 import awsutils.exceptions.s3
 from awsutils.utils.auth import SIGNATURE_S3_REST
 from awsutils.utils.auth import urlquote
 
 
 class S3Client(AWSClient):
-    @tornado.gen.engine
-    def getObject(self, callback, bucketname, objectname, byterange=None, versionID=None,
-                  if_modified_since=None, if_unmodified_since=None, if_match=None, if_none_match=None):
+    # the size of the chunks read from the files streamed with body_producer
+    UPLOAD_CHUNK_SIZE = 65536
 
+    @callbackCompatible
+    async def getObject(self, bucketname, objectname, byterange=None, versionID=None,
+                        if_modified_since=None, if_unmodified_since=None, if_match=None, if_none_match=None,
+                        inputobject=None, md5=False, request_timeout=5):
+        """
+        byterange = list(start, end)
+        @param inputobject: any object implementing write(bytes), the object data is written to it as it arrives,
+                            if None the data is returned as bytes
+        @type inputobject: object
+        @param md5: calculate the md5 hexdigest of the received data, a whole (not ranged) object is checked against
+                    the ETag returned by S3 (if the object was not uploaded with multipart upload)
+        @type md5: bool
+        @param request_timeout: the timeout of the whole download in seconds, 0 disables it
+        @type request_timeout: float
+        objects bigger than the http client's max_body_size are refused, create the client with a bigger
+        max_body_size for large downloads
+        """
         query = {}
         if versionID is not None:
             query['vesionId'] = versionID
@@ -47,15 +64,20 @@ class S3Client(AWSClient):
 
         uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
 
-        data = yield tornado.gen.Task(self.request, uri=uri + urlquote(objectname), endpoint=endpoint, query=query,
-                                      statusexpected=statusexpected, headers=headers, xmlexpected=False,
-                                      signmethod=SIGNATURE_S3_REST)
+        data = await self.request(uri=uri + urlquote(objectname), endpoint=endpoint, query=query,
+                                  statusexpected=statusexpected, headers=headers, xmlexpected=False,
+                                  signmethod=SIGNATURE_S3_REST, inputobject=inputobject, md5=md5,
+                                  request_timeout=request_timeout)
 
-        self._ioloop.add_callback(functools.partial(callback, data))
+        if md5 and data['status'] == 200:
+            etag = data['headers'].get('Etag', '')[1:-1]
+            if etag and '-' not in etag and etag != data['md5']:
+                raise IntegrityCheckException('getObject received data with unexpected md5', data['md5'], etag)
+        return data
 
-    @tornado.gen.engine
-    def headObject(self, callback, bucketname, objectname, versionID=None, byterange=None, if_modified_since=None,
-                   if_unmodified_since=None, if_match=None, if_none_match=None):
+    @callbackCompatible
+    async def headObject(self, bucketname, objectname, versionID=None, byterange=None, if_modified_since=None,
+                         if_unmodified_since=None, if_match=None, if_none_match=None):
         query = {}
         if versionID is not None:
             query['vesionId'] = versionID
@@ -85,13 +107,250 @@ class S3Client(AWSClient):
 
         uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
 
-        data = yield tornado.gen.Task(self.request, uri=uri + urlquote(objectname), endpoint=endpoint, query=query,
-                                      statusexpected=statusexpected, headers=headers, xmlexpected=False, method='HEAD',
-                                      signmethod=SIGNATURE_S3_REST)
+        data = await self.request(uri=uri + urlquote(objectname), endpoint=endpoint, query=query,
+                                  statusexpected=statusexpected, headers=headers, xmlexpected=False, method='HEAD',
+                                  signmethod=SIGNATURE_S3_REST)
 
-        self._ioloop.add_callback(functools.partial(callback, data))
+        return data
+
+    @callbackCompatible
+    async def putObject(self, bucketname, objectname, value, objlen=None, md5digest=None,
+                        x_amz_server_side_encryption=None, x_amz_storage_class=None, request_timeout=0):
+        """
+        @param value: the object data, bytes or a file object opened in "rb" mode, a file object is streamed
+                      from its current position and needs objlen
+        @type value: bytes, object
+        @param md5digest: the md5 digest of value, if given it's checked by S3 and against the returned ETag
+        @type md5digest: bytes
+        @param request_timeout: the timeout of the whole upload in seconds, 0 disables it, a fixed limit fails the
+                                big uploads on a slow link
+        @type request_timeout: float
+        """
+        headers = {}
+        if x_amz_server_side_encryption is not None:
+            headers['x-amz-server-side-encryption'] = x_amz_server_side_encryption
+        if x_amz_storage_class is not None:
+            headers['x-amz-storage-class'] = x_amz_storage_class
+        if md5digest is not None:
+            headers['Content-MD5'] = base64.b64encode(md5digest).strip().decode()
+
+        body, body_producer = value, None
+        if hasattr(value, 'read'):
+            if objlen is None:
+                raise UserInputException('param objlen is needed to stream a file object')
+            headers['Content-Length'] = str(objlen)
+            body, body_producer = b'', self._fileBodyProducer(value, value.tell(), objlen)
+
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="PUT", uri=uri + urlquote(objectname), endpoint=endpoint, body=body,
+                                  body_producer=body_producer, headers=headers, xmlexpected=False,
+                                  signmethod=SIGNATURE_S3_REST, request_timeout=request_timeout)
+        headers = data['headers']
+        if md5digest is not None:
+            if headers['Etag'][1:-1] != binascii.hexlify(md5digest).decode():
+                raise IntegrityCheckException('putObject returned unexpected ETag value',
+                                              headers['Etag'][1:-1], binascii.hexlify(md5digest).decode())
+        return {'ETag': headers['Etag']}
+
+    @callbackCompatible
+    async def initiateMultipartUpload(self, bucketname, objectname, x_amz_server_side_encryption=None,
+                                      x_amz_storage_class=None):
+        headers = {}
+        if x_amz_server_side_encryption is not None:
+            headers['x-amz-server-side-encryption'] = x_amz_server_side_encryption
+        if x_amz_storage_class is not None:
+            headers['x-amz-storage-class'] = x_amz_storage_class
+
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="POST", uri=uri + urlquote(objectname), endpoint=endpoint, headers=headers,
+                                  query={"uploads": None}, signmethod=SIGNATURE_S3_REST)
+        data = data['data']['InitiateMultipartUploadResult']
+        if data['Bucket'] != bucketname or data['Key'] != objectname:
+            raise IntegrityCheckException('unexpected bucket/key name received', (data['Bucket'], data['Key']),
+                                          (bucketname, objectname))
+        return data
+
+    @callbackCompatible
+    async def uploadOjectPart(self, bucketname, objectname, partnumber, uploadid, value, objlen=None, md5digest=None,
+                              body_producer=None, request_timeout=0):
+        """
+        @param value: the part data, ignored if body_producer is given
+        @type value: bytes
+        @param objlen: the length of the part, needed with body_producer
+        @type objlen: int
+        @param request_timeout: the timeout of the whole part upload in seconds, 0 disables it
+        @type request_timeout: float
+        """
+        headers = {}
+        if objlen is not None:
+            headers['Content-Length'] = str(objlen)
+        if md5digest is not None:
+            headers['Content-MD5'] = base64.b64encode(md5digest).strip().decode()
+
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="PUT", uri=uri + urlquote(objectname), endpoint=endpoint, body=value,
+                                  body_producer=body_producer, headers=headers, xmlexpected=False,
+                                  query={"partNumber": partnumber, "uploadId": uploadid},
+                                  signmethod=SIGNATURE_S3_REST, request_timeout=request_timeout)
+        headers = data['headers']
+        if md5digest is not None:
+            if headers['Etag'][1:-1] != binascii.hexlify(md5digest).decode():
+                raise IntegrityCheckException('uploadOjectPart returned unexpected ETag value', headers['Etag'][1:-1],
+                                              binascii.hexlify(md5digest).decode())
+        return {'ETag': headers['Etag']}
+
+    @callbackCompatible
+    async def completeMultipartUpload(self, bucketname, objectname, uploadId, parts):
+        data = ["<CompleteMultipartUpload>"]
+        # the parts have to be listed in ascending order
+        for partnumber in sorted(parts):
+            data.append("<Part><PartNumber>%s</PartNumber><ETag>%s</ETag></Part>" % (partnumber, parts[partnumber]))
+        data.append("</CompleteMultipartUpload>")
+
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        data = await self.request(method="POST", uri=uri + urlquote(objectname), endpoint=endpoint,
+                                  body="".join(data).encode(), query={"uploadId": uploadId},
+                                  signmethod=SIGNATURE_S3_REST)
+        data = data['data']['CompleteMultipartUploadResult']
+        if data['Bucket'] != bucketname or data['Key'] != objectname:
+            raise IntegrityCheckException('unexpected bucket/key name received', (data['Bucket'], data['Key']),
+                                          (bucketname, objectname))
+        return data
+
+    @callbackCompatible
+    async def abortMultipartUpload(self, bucketname, objectname, uploadId):
+        uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+        await self.request(method="DELETE", uri=uri + urlquote(objectname), endpoint=endpoint, statusexpected=[204],
+                           query={"uploadId": uploadId}, signmethod=SIGNATURE_S3_REST, xmlexpected=False)
+
+    @callbackCompatible
+    async def uploadArbitrarySizedObject(self, bucketname, objectname, outputobject, start=0, end=None,
+                                         chunklen=5242880, hashcheck=False, concurrency=4, request_timeout=0):
+        """
+        upload a file of arbitrary length, uses multipart upload for files bigger than 2 x chunklen, the parts are
+        streamed from the file with body_producer and up to concurrency parts are uploaded at the same time
+        @param outputobject: file object opened in "rb" mode or a file name
+        @type outputobject: object
+        @param start: the start offset from where we upload the data
+        @type start: int
+        @param end: the end offset to upload the data, if not provided means the end of the file
+        @type end: int
+        @param chunklen: the multipart upload part size
+        @type chunklen: int
+        @param hashcheck: check the ETag of every part (and of a single put object) against the md5 of the sent data
+        @type hashcheck: bool
+        @param concurrency: number of parts uploaded at the same time (the AsyncHTTPClient max_clients should be
+                            at least this big)
+        @type concurrency: int
+        @param request_timeout: the timeout of every part upload in seconds, 0 disables it
+        @type request_timeout: float
+        @return: {'ETag': '"hash"'} or the CompleteMultipartUploadResult
+        @rtype: dict
+        """
+        if chunklen < 5242880:
+            raise UserInputException("Your proposed upload is smaller than the minimum allowed (by amazon) size")
+        if concurrency < 1:
+            raise UserInputException("param concurrency should be at least 1")
+
+        closeoutputobject = False
+        if isinstance(outputobject, str):
+            if not os.path.isfile(outputobject):
+                raise UserInputException("param outputobject is a string but points to nonexistent file")
+            outputobject = open(outputobject, "rb")
+            closeoutputobject = True
+
+        try:
+            if end is None:
+                end = outputobject.seek(0, os.SEEK_END)
+            if (end - start) / chunklen > 10000:
+                raise UserInputException("More than 10000 objects needed to complete this upload")
+
+            if end - start < chunklen * 2:
+                result = await self._uploadWindow(bucketname, objectname, outputobject, start, end - start,
+                                                  hashcheck, request_timeout)
+                return result
+
+            layout = collections.deque()
+            partnumber = 1
+            while start < end:
+                size = end - start if end - start < chunklen * 2 else chunklen
+                layout.append((partnumber, start, size))
+                partnumber, start = partnumber + 1, start + size
+
+            upload = await self.initiateMultipartUpload(bucketname, objectname)
+            parts = {}
+
+            async def worker():
+                try:
+                    while layout:
+                        partnumber, start, size = layout.popleft()
+                        result = await self._uploadWindow(bucketname, objectname, outputobject, start, size,
+                                                          hashcheck, request_timeout, partnumber, upload['UploadId'])
+                        parts[partnumber] = result['ETag']
+                except:
+                    # let the other workers stop after their current part
+                    layout.clear()
+                    raise
+
+            try:
+                # waits for all the workers, even if one of them fails
+                await tornado.gen.multi([worker() for i in range(min(concurrency, len(layout)))])
+                result = await self.completeMultipartUpload(bucketname, objectname, upload['UploadId'], parts)
+            except:
+                await self.abortMultipartUpload(bucketname, objectname, upload['UploadId'])
+                raise
+            return result
+        finally:
+            if closeoutputobject:
+                outputobject.close()
 
     #================================== helper functionality ===========================================================
+    async def _uploadWindow(self, bucketname, objectname, fileobj, start, size, hashcheck, request_timeout,
+                            partnumber=None, uploadid=None):
+        """
+        Upload size bytes of fileobj from start as a part (or as the whole object if partnumber is None)
+        """
+        md5 = hashlib.md5() if hashcheck else None
+        body_producer = self._fileBodyProducer(fileobj, start, size, md5)
+        if partnumber is None:
+            uri, endpoint = self._buketname2PathAndEndpoint(bucketname)
+            data = await self.request(method="PUT", uri=uri + urlquote(objectname), endpoint=endpoint,
+                                      body_producer=body_producer, headers={'Content-Length': str(size)},
+                                      xmlexpected=False, signmethod=SIGNATURE_S3_REST,
+                                      request_timeout=request_timeout)
+            result = {'ETag': data['headers']['Etag']}
+        else:
+            result = await self.uploadOjectPart(bucketname, objectname, partnumber, uploadid, None, objlen=size,
+                                                body_producer=body_producer, request_timeout=request_timeout)
+        if hashcheck and result['ETag'][1:-1] != md5.hexdigest():
+            raise IntegrityCheckException('uploadArbitrarySizedObject unexpected ETag received',
+                                          result['ETag'][1:-1], md5.hexdigest())
+        return result
+
+    def _fileBodyProducer(self, fileobj, start, size, md5=None):
+        """
+        @return: a body_producer streaming size bytes of fileobj from start in UPLOAD_CHUNK_SIZE chunks, reading
+                 with os.pread if fileobj has a file descriptor, so the parallel producers don't move its position
+        @rtype: function
+        """
+        async def producer(write):
+            offset, remaining = start, size
+            while remaining > 0:
+                tosend = min(remaining, self.UPLOAD_CHUNK_SIZE)
+                try:
+                    data = os.pread(fileobj.fileno(), tosend, offset)
+                except (AttributeError, OSError, io.UnsupportedOperation):
+                    fileobj.seek(offset)
+                    data = fileobj.read(tosend)
+                if not data:
+                    raise IntegrityCheckException('unexpected end of file', offset, start + size)
+                if md5 is not None:
+                    md5.update(data)
+                offset += len(data)
+                remaining -= len(data)
+                await write(data)
+        return producer
+
     def _buketname2PathAndEndpoint(self, bucketname):
         if bucketname != bucketname.lower():
             return "/" + bucketname + "/", self.endpoint
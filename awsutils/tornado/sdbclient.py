@@ -4,9 +4,8 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import functools, collections
-import tornado.gen
-from awsutils.tornado.awsclient import AWSClient
+import asyncio, collections
+from awsutils.tornado.awsclient import AWSClient, callbackCompatible
 from awsutils.exceptions.aws import UserInputException, extractExceptionsFromModule2Dicitonary
 import awsutils.exceptions.sdb
 from awsutils.utils.auth import SIGNATURE_V2
@@ -30,44 +29,76 @@ class SimpleDbClient(AWSClient):
         self.boxUssage = 0
         AWSClient.__init__(self, endpoint, access_key, secret_key, secure, _ioloop = _ioloop)
 
-    @tornado.gen.engine
-    def select(self, callback, selectExpression, consistentRead = False, nextToken = None):
+    @callbackCompatible
+    async def select(self, selectExpression, consistentRead = False, nextToken = None):
         """
         The Select operation returns a set of Attributes for ItemNames that match the select expression
         http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_Select.html
-        @type callback: callback function params: (status, data)
-        @type callback: function
         @type selectExpression: the expression used to query the domain
         @type selectExpression: str
         @type consistentRead: when set to true, ensures that the most recent data is returned
         @type consistentRead: bool
         @type nextToken: where to start the next list of ItemNames
         @type nextToken: str
-        @return: a list of dictionaries
+        @return: the items of one page, see selectPage and selectIterator for the following pages
         @rtype: list
         """
+        page = await self.selectPage(selectExpression, consistentRead, nextToken)
+        return page['Items']
+
+    @callbackCompatible
+    async def selectPage(self, selectExpression, consistentRead = False, nextToken = None):
+        """
+        Same as select but it also returns the NextToken of the following page
+        @return: {'Items': list of items, 'NextToken': None on the last page, 'BoxUsage': float}
+        @rtype: dict
+        """
         query = {'Action':'Select', 'SelectExpression':selectExpression, 'Version': self.VERSION}
         if consistentRead:
             query['ConsistentRead'] = consistentRead
         if nextToken is not None:
             query['NextToken'] = nextToken
 
-        data = yield tornado.gen.Task(self.request, query=query, signmethod=SIGNATURE_V2)
+        data = await self.request(query=query, signmethod=SIGNATURE_V2)
 
         data = data['data']
-        self.boxUssage += float(data['SelectResponse']['ResponseMetadata']['BoxUsage'])
-        selectresult = data['SelectResponse']['SelectResult']['Item']
-        if isinstance(selectresult, dict): selectresult = [selectresult]
-        self._ioloop.add_callback(functools.partial(callback, selectresult))
+        boxUsage = float(data['SelectResponse']['ResponseMetadata']['BoxUsage'])
+        self.boxUssage += boxUsage
+        data = data['SelectResponse']['SelectResult']
+        page = {'Items': [], 'NextToken': None, 'BoxUsage': boxUsage}
+        if isinstance(data, dict):
+            page['NextToken'] = data.get('NextToken')
+            if 'Item' in data:
+                page['Items'] = [data['Item']] if isinstance(data['Item'], dict) else data['Item']
+        return page
 
+    async def selectIterator(self, selectExpression, consistentRead = False, nextToken = None, usage = None):
+        """
+        Asynchronous generator over all the items matched by selectExpression (use it with async for), following
+        NextToken, the next page is requested before the items of the current one are yielded
+        @param usage: if given its 'BoxUsage' and 'pages' keys are updated as the pages arrive
+        @type usage: dict
+        """
+        if usage is None: usage = {}
+        usage.setdefault('BoxUsage', 0.0)
+        usage.setdefault('pages', 0)
+        fetching = asyncio.ensure_future(self.selectPage(selectExpression, consistentRead, nextToken))
+        while fetching is not None:
+            page = await fetching
+            usage['BoxUsage'] += page['BoxUsage']
+            usage['pages'] += 1
+            fetching = None
+            if page['NextToken'] is not None:
+                fetching = asyncio.ensure_future(self.selectPage(selectExpression, consistentRead,
+                                                                 page['NextToken']))
+            for item in page['Items']:
+                yield item
 
-    @tornado.gen.engine
-    def getAttributes(self, callback, domainName, itemName, attributeName=None, consistentRead=None, endpoint=None):
+    @callbackCompatible
+    async def getAttributes(self, domainName, itemName, attributeName=None, consistentRead=None, endpoint=None):
         """
         Get the atributes for itemName in domainName
         http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_GetAttributes.html
-        @type callback: callback function params: (status, data)
-        @type callback: function
         @param domainName: the name of the domain
         @type domainName: str
         @param itemName: the name of the item
@@ -86,7 +117,7 @@ class SimpleDbClient(AWSClient):
         if consistentRead is not None:
             query['ConsistentRead'] = consistentRead
 
-        data = yield tornado.gen.Task(self.request, query=query, signmethod=SIGNATURE_V2)
+        data = await self.request(query=query, signmethod=SIGNATURE_V2)
 
         data = data['data']
         self.boxUssage += float(data['GetAttributesResponse']['ResponseMetadata']['BoxUsage'])
@@ -99,16 +130,14 @@ class SimpleDbClient(AWSClient):
             if isinstance(data, dict): data = (data['Name'], data['Value'])
             else: data = tuple((attr['Name'],attr['Value']) for attr in data)
 
-        self._ioloop.add_callback(functools.partial(callback, data))
+        return data
 
 
-    @tornado.gen.engine
-    def putAttributes(self, callback, domainName, itemName, attributes, expected=None, endpoint=None):
+    @callbackCompatible
+    async def putAttributes(self, domainName, itemName, attributes, expected=None, endpoint=None):
         """
         Set/modify atributes for itemName in domainName
         http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_PutAttributes.html
-        @type callback: callback function params: (status, data)
-        @type callback: function
         @param domainName: the name of the domain
         @type domainName: str
         @param itemName: the name of the item
@@ -149,17 +178,15 @@ class SimpleDbClient(AWSClient):
                 query['Expected.%d.Exists'%(i,)] = expected[name]
                 i += 1
 
-        data = yield tornado.gen.Task(self.request, query=query, signmethod=SIGNATURE_V2)
+        data = await self.request(query=query, signmethod=SIGNATURE_V2)
         self.boxUssage += float(data['data']['PutAttributesResponse']['ResponseMetadata']['BoxUsage'])
-        self._ioloop.add_callback(functools.partial(callback, True))
+        return True
 
-    @tornado.gen.engine
-    def deleteAttributes(self, callback, domainName, itemName, attributes=None, expected=None, endpoint=None):
+    @callbackCompatible
+    async def deleteAttributes(self, domainName, itemName, attributes=None, expected=None, endpoint=None):
         """
         Delete atributes from itemName in domainName
         http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_DeleteAttributes.html
-        @type callback: callback function params: (status, data)
-        @type callback: function
         @param domainName: the name of the domain
         @type domainName: str
         @param itemName: the name of the item
@@ -193,18 +220,16 @@ class SimpleDbClient(AWSClient):
                 query['Expected.%d.Exists'%(i,)] = expected[name][1]
                 i += 1
 
-        data = yield tornado.gen.Task(self.request, query=query, signmethod=SIGNATURE_V2)
+        data = await self.request(query=query, signmethod=SIGNATURE_V2)
         self.boxUssage += float(data['data']['DeleteAttributesResponse']['ResponseMetadata']['BoxUsage'])
-        self._ioloop.add_callback(functools.partial(callback, True))
+        return True
 
 
-    @tornado.gen.engine
-    def batchDeleteAttributes(self, callback, domainName, items, endpoint=None):
+    @callbackCompatible
+    async def batchDeleteAttributes(self, domainName, items, endpoint=None):
         """
         Delete atributes for multiple items
         http://docs.aws.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_BatchDeleteAttributes.html
-        @type callback: callback function params: (status, data)
-        @type callback: function
         @param domainName: the name of the domain
         @type domainName: str
         @param items: items to have their attributes deleted
@@ -227,17 +252,15 @@ class SimpleDbClient(AWSClient):
                 a += 1
             i += 1
 
-        data = yield tornado.gen.Task(self.request, query=query, signmethod=SIGNATURE_V2)
+        data = await self.request(query=query, signmethod=SIGNATURE_V2)
         self.boxUssage += float(data['data']['BatchDeleteAttributesResponse']['ResponseMetadata']['BoxUsage'])
-        self._ioloop.add_callback(functools.partial(callback, True))
+        return True
 
-    @tornado.gen.engine
-    def batchPutAttributes(self, callback, domainName, items, endpoint=None):
+    @callbackCompatible
+    async def batchPutAttributes(self, domainName, items, endpoint=None):
         """
         Set/modify atributes for multiple items from a given domain
         http://docs.aw.amazon.com/AmazonSimpleDB/latest/DeveloperGuide/SDB_API_BatchPutAttributes.html
-        @type callback: callback function params: (status, data)
-        @type callback: function
         @param domainName: the name of the domain
         @type domainName: str
         @param items: items to have their attributes manipulated
@@ -270,9 +293,9 @@ class SimpleDbClient(AWSClient):
                 a += 1
             i += 1
 
-        data = yield tornado.gen.Task(self.request, query=query, signmethod=SIGNATURE_V2)
+        data = await self.request(query=query, signmethod=SIGNATURE_V2)
         self.boxUssage += float(data['data']['BatchPutAttributesResponse']['ResponseMetadata']['BoxUsage'])
-        self._ioloop.add_callback(functools.partial(callback, True))
+        return True
 
 
     #================================== helper functionality ===========================================================
@@ -4,17 +4,17 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import functools, collections
-import tornado.gen
-from awsutils.tornado.awsclient import AWSClient
+from awsutils.tornado.awsclient import AWSClient, callbackCompatible
 from awsutils.iamclient import IAMClient
+from awsutils.sqs.urlcache import DEFAULT_URL_CACHE
 from awsutils.exceptions.aws import UserInputException, extractExceptionsFromModule2Dicitonary
 import awsutils.exceptions.sqs
 from awsutils.utils.auth import SIGNATURE_V4_HEADERS, SIGNATURE_V2
 
 class SQSClient(AWSClient):
 
-    def __init__(self, endpoint, access_key, secret_key, _ioloop=None, accNumber=None, secure=False):
+    def __init__(self, endpoint, access_key, secret_key, _ioloop=None, accNumber=None, secure=False,
+                 urlcache=None):
         """
         @type endpoint: the amazon endpoint of the service
         @type endpoint: str
@@ -23,27 +23,54 @@ class SQSClient(AWSClient):
         @type secret_key: amazon secret key
         @type secret_key: str
         @type secure: use https
-        @type accNumber: the amazon user id (account number), if None the client will try to fetch the info with IAMClient
+        @type accNumber: the account number owning the queues, if None it's looked up asynchronously (with
+                         GetQueueUrl) on the first use of every queue and remembered in urlcache
         @type accNumber: str
         @type secure: bool
         @type _ioloop: the tornado ioloop for processing the events
         @type _ioloop: tornado.ioloop.IOLoop
+        @type urlcache: by default the in process DEFAULT_URL_CACHE
+        @type urlcache: SQSQueueUrlCache
         """
         AWSClient.__init__(self, endpoint, access_key, secret_key, secure, _ioloop = _ioloop)
-        #try to retrieve the curent user's account number
-        if accNumber is None:
-            #TODO, we should do this asynchronous
-            iam = IAMClient(access_key, secret_key)
+        self._accNumber = accNumber
+        self.urlcache = DEFAULT_URL_CACHE if urlcache is None else urlcache
+
+    @property
+    def accNumber(self):
+        """
+        The current user's account number, if it was not given it is retrieved (blocking) with IAMClient on the
+        first access
+        """
+        if self._accNumber is None:
+            iam = IAMClient(self.access_key, self.secret_key)
             userinfo = iam.getUser()
-            self.accNumber = userinfo['UserId']
+            self._accNumber = userinfo['UserId']
             iam.closeConnections()
-            iam = None
-        else:
-            self.accNumber = accNumber
+        return self._accNumber
+
+    @callbackCompatible
+    async def queueUri(self, qName):
+        """
+        @param qName: the sqs queue name
+        @type qName: str
+        @return: the path of the queue url
+        @rtype: str
+        """
+        accNumber = self._accNumber
+        if accNumber is None:
+            accNumber = self.urlcache.get(self.access_key, self.endpoint, qName)
+        if accNumber is None:
+            query = {'Action': 'GetQueueUrl', 'QueueName': qName, 'Version': '2012-11-05'}
+            data = await self.request(query=query, signmethod=SIGNATURE_V4_HEADERS,
+                                      region=self.endpoint[4:-14], service='sqs')
+            accNumber = data['data']['GetQueueUrlResponse']['GetQueueUrlResult']['QueueUrl'].split('/')[-2]
+            self.urlcache.set(self.access_key, self.endpoint, qName, accNumber)
+        return "/%s/%s" % (accNumber, qName)
 
-    @tornado.gen.engine
-    def receiveMessage(self, callback, qName, attributes=None, maxNumberOfMessages=None, visibilityTimeout=None,
-                       waitTimeSeconds=None):
+    @callbackCompatible
+    async def receiveMessage(self, qName, attributes=None, maxNumberOfMessages=None, visibilityTimeout=None,
+                             waitTimeSeconds=None):
         query = {'Action': 'ReceiveMessage', 'Version': '2012-11-05'}
         if maxNumberOfMessages is not None:
             query['MaxNumberOfMessages'] = maxNumberOfMessages
@@ -57,8 +84,9 @@ class SQSClient(AWSClient):
             for i in range(0, len(attributes)):
                 query['AttributeName.%d' % (i + 1,)] = attributes[i]
 
-        data = yield tornado.gen.Task(self.request, query=query, uri="/%s/%s" % (self.accNumber, qName),
-                                      signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
+        uri = await self.queueUri(qName)
+        data = await self.request(query=query, uri=uri,
+                                  signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
         data = data['data']['ReceiveMessageResponse']['ReceiveMessageResult']
         if not isinstance(data, dict):
             data = None
@@ -67,40 +95,43 @@ class SQSClient(AWSClient):
         else:
             data = data['Message']
 
-        self._ioloop.add_callback(functools.partial(callback, data))
+        return data
 
-    @tornado.gen.engine
-    def deleteMessage(self, callback, qName, receiptHandle):
+    @callbackCompatible
+    async def deleteMessage(self, qName, receiptHandle):
         query = {'Action': 'DeleteMessage', 'ReceiptHandle': receiptHandle, 'Version': '2012-11-05'}
-        data = yield tornado.gen.Task(self.request, query=query, uri="/%s/%s" % (self.accNumber, qName),
-                                      signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
+        uri = await self.queueUri(qName)
+        data = await self.request(query=query, uri=uri,
+                                  signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
         data['data']['DeleteMessageResponse']
-        self._ioloop.add_callback(functools.partial(callback, True))
+        return True
 
-    @tornado.gen.engine
-    def sendMessage(self, callback, qName, messageBody, delaySeconds=None, hashcheck=False):
+    @callbackCompatible
+    async def sendMessage(self, qName, messageBody, delaySeconds=None, hashcheck=False):
         query = {'Action': 'SendMessage', 'MessageBody': messageBody, 'Version': '2012-11-05'}
         if delaySeconds is not None:
             if delaySeconds > 900:
                 raise UserInputException('param delaySeconds too big (max 900 seconds)')
             query['DelaySeconds'] = delaySeconds
-        data = yield tornado.gen.Task(self.request, query=query, uri="/%s/%s" % (self.accNumber, qName),
-                                      signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
+        uri = await self.queueUri(qName)
+        data = await self.request(query=query, uri=uri,
+                                  signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
         data['data']['SendMessageResponse']['SendMessageResult']['MD5OfMessageBody']
-        self._ioloop.add_callback(functools.partial(callback, True))
+        return True
 
-    @tornado.gen.engine
-    def changeMessageVisibility(self, callback, qName, receiptHandle, visibilityTimeout):
+    @callbackCompatible
+    async def changeMessageVisibility(self, qName, receiptHandle, visibilityTimeout):
         """
         @param qName: the sqs queue name
         @type qName: str
         """
         query = {'Action': 'ChangeMessageVisibility', 'ReceiptHandle': receiptHandle,
                  'VisibilityTimeout': visibilityTimeout, 'Version': '2012-11-05'}
-        data = yield tornado.gen.Task(self.request, query=query, uri="/%s/%s" % (self.accNumber, qName),
-                                      signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
+        uri = await self.queueUri(qName)
+        data = await self.request(query=query, uri=uri,
+                                  signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
         data['data']['ChangeMessageVisibilityResponse']
-        self._ioloop.add_callback(functools.partial(callback, True))
+        return True
 
 
     #================================== helper functionality ===========================================================
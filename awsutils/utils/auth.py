@@ -4,7 +4,7 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
-import time, hmac, hashlib, base64
+import time, hmac, hashlib, base64, threading, collections, bisect
 
 QUERIES_OF_INTEREST = {'acl', 'cors', 'defaultObjectAcl', 'location', 'logging',
                        'partNumber', 'policy', 'requestPayment', 'torrent',
@@ -21,11 +21,19 @@ URLENCODE_SAFE = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
 URLENCODE_SAFE_BYTES = bytes(URLENCODE_SAFE)
 
+# byte value => its url encoded form
+URLENCODE_TABLE = tuple(chr(char) if char in URLENCODE_SAFE else '%{:02X}'.format(char) for char in range(256))
+
 SIGNATURE_V2 = 0
 SIGNATURE_V4 = 1
 SIGNATURE_V4_HEADERS = 2
 SIGNATURE_S3_REST = 3
 
+# the v4 signing keys depend only on (secret, date, region, service), so they are derived once a day
+V4_SIGNING_KEY_CACHE_SIZE = 64
+_v4SigningKeyCache = collections.OrderedDict()
+_v4SigningKeyCacheLock = threading.Lock()
+
 S3_ENDPOINTS = {"s3.amazonaws.com", "s3-us-west-1.amazonaws.com",
                 "s3-us-west-2.amazonaws.com", "s3-eu-west-1.amazonaws.com",
                 "s3-ap-southeast-1.amazonaws.com", "s3-ap-southeast-2.amazonaws.com",
@@ -55,7 +63,10 @@ def getISO8601Time(date=time.gmtime()):
 def urlquote(data):
     if isinstance(data, str):
         data = data.encode('utf-8', 'strict')
-    return ''.join([chr(char) if char in URLENCODE_SAFE_BYTES else '%{:02X}'.format(char) for char in data])
+    # nothing left after deleting the safe characters => nothing to encode
+    if not data.translate(None, URLENCODE_SAFE_BYTES):
+        return data.decode('ascii')
+    return ''.join(map(URLENCODE_TABLE.__getitem__, data))
 
 
 def HMAC_SHA1(secret, data, hexdigest=True):
@@ -92,7 +103,11 @@ def SHA256(data, hexdigest=True):
     return sha256.update()
 
 
-def canonicalQueryString(query, whitelist=None):
+def canonicalQueryItems(query, whitelist=None):
+    """
+    @return: the sorted list of (name, encoded name=value) of the query
+    @rtype: list
+    """
     _query = sorted(query.items())
     result = []
     for item in _query:
@@ -103,10 +118,14 @@ def canonicalQueryString(query, whitelist=None):
         if value is not None:
             if not isinstance(value, str):
                 value = "%s" % (value,)
-            result.append(urlquote(item[0]) + '=' + urlquote(value))
+            result.append((item[0], urlquote(item[0]) + '=' + urlquote(value)))
         else:
-            result.append(urlquote(item[0]))
-    return "&".join(result)
+            result.append((item[0], urlquote(item[0])))
+    return result
+
+
+def canonicalQueryString(query, whitelist=None):
+    return "&".join([item[1] for item in canonicalQueryItems(query, whitelist)])
 
 
 def canonicalRequestS3Rest(method='GET', uri='/', headers=None, query=None, expires=None):
@@ -156,15 +175,17 @@ def canonicalHeaderNames(headers):
     return ';'.join([item[0].lower() for item in _headers])
 
 
-def canonicalRequestV4(method='GET', uri='/', headers=None, query=None, body=b''):
+def canonicalRequestV4(method='GET', uri='/', headers=None, query=None, body=b'', querystring=None):
     #if body is None: body = b''
-    result = [method, uri, canonicalQueryString(query), canonicalHeaders(headers), '', canonicalHeaderNames(headers),
+    if querystring is None: querystring = canonicalQueryString(query)
+    result = [method, uri, querystring, canonicalHeaders(headers), '', canonicalHeaderNames(headers),
               SHA256(body)]
     return "\n".join(result)
 
 
-def canonicalRequestV2(method='GET', uri='/', headers=None, query=None, body=b''):
-    result = [method, headers['Host'], uri, canonicalQueryString(query)]
+def canonicalRequestV2(method='GET', uri='/', headers=None, query=None, body=b'', querystring=None):
+    if querystring is None: querystring = canonicalQueryString(query)
+    result = [method, headers['Host'], uri, querystring]
     return "\n".join(result)
 
 
@@ -172,23 +193,50 @@ def getAmzCredential(access_key, region, service, date=time.gmtime()):
     return '/'.join([access_key, getISO8601date(date), region, service, 'aws4_request'])
 
 
-def calculateV2Signature(secret_key, date=time.gmtime(), uri='/', method='GET', headers=None, query=None, body=b''):
-    stringToSign = canonicalRequestV2(uri=uri, method=method, headers=headers, query=query, body=body)
+def calculateV2Signature(secret_key, date=time.gmtime(), uri='/', method='GET', headers=None, query=None, body=b'',
+                         querystring=None):
+    stringToSign = canonicalRequestV2(uri=uri, method=method, headers=headers, query=query, body=body,
+                                      querystring=querystring)
     signature = HMAC_SHA256(secret_key, stringToSign, hexdigest=False)
     return base64.b64encode(signature).decode()
 
 
-def calculateV4Signature(secret_key, region, service, date=time.gmtime(), uri='/', method='GET', headers=None,
-                         query=None, body=b''):
-    simpledate = '%04d%02d%02d' % (date.tm_year, date.tm_mon, date.tm_mday)
+def deriveV4SigningKey(secret_key, simpledate, region, service):
     kDate = HMAC_SHA256("AWS4" + secret_key, simpledate, hexdigest=False)
     kRegion = HMAC_SHA256(kDate, region, hexdigest=False)
     kService = HMAC_SHA256(kRegion, service, hexdigest=False)
-    kSigning = HMAC_SHA256(kService, "aws4_request", hexdigest=False)
+    return HMAC_SHA256(kService, "aws4_request", hexdigest=False)
+
+
+def getV4SigningKey(secret_key, simpledate, region, service):
+    """
+    Cached deriveV4SigningKey, the keys of the previous days are dropped once a newer date is seen
+    """
+    if V4_SIGNING_KEY_CACHE_SIZE <= 0:
+        return deriveV4SigningKey(secret_key, simpledate, region, service)
+    cachekey = (secret_key, simpledate, region, service)
+    kSigning = _v4SigningKeyCache.get(cachekey)
+    if kSigning is not None:
+        return kSigning
+    kSigning = deriveV4SigningKey(secret_key, simpledate, region, service)
+    with _v4SigningKeyCacheLock:
+        for key in [key for key in _v4SigningKeyCache if key[1] < simpledate]:
+            del _v4SigningKeyCache[key]
+        while len(_v4SigningKeyCache) >= V4_SIGNING_KEY_CACHE_SIZE:
+            _v4SigningKeyCache.popitem(last=False)
+        _v4SigningKeyCache[cachekey] = kSigning
+    return kSigning
+
+
+def calculateV4Signature(secret_key, region, service, date=time.gmtime(), uri='/', method='GET', headers=None,
+                         query=None, body=b'', querystring=None):
+    simpledate = '%04d%02d%02d' % (date.tm_year, date.tm_mon, date.tm_mday)
+    kSigning = getV4SigningKey(secret_key, simpledate, region, service)
     requestDate = '%04d%02d%02dT%02d%02d%02dZ' % (
         date.tm_year, date.tm_mon, date.tm_mday, date.tm_hour, date.tm_min, date.tm_sec)
     credentialsScope = '/'.join([simpledate, region, service, 'aws4_request'])
-    canonicalRequest = canonicalRequestV4(uri=uri, method=method, headers=headers, query=query, body=body)
+    canonicalRequest = canonicalRequestV4(uri=uri, method=method, headers=headers, query=query, body=body,
+                                          querystring=querystring)
     hashCanonicalRequest = SHA256(canonicalRequest)
     stringToSign = ['AWS4-HMAC-SHA256', requestDate, credentialsScope, hashCanonicalRequest]
     stringToSign = "\n".join(stringToSign)
@@ -200,14 +248,30 @@ def signRequest(access_key, secret_key, endpoint, region=None, service=None,
                 signmethod=None, date=time.gmtime(),
                 uri='/', method='GET', headers=None,
                 query=None, body=b'', expires=None):
+    headers, query, body, querystring = signRequestWithQueryString(access_key, secret_key, endpoint, region, service,
+                                                                   signmethod, date, uri, method, headers, query,
+                                                                   body, expires)
+    return headers, query, body
+
+
+def signRequestWithQueryString(access_key, secret_key, endpoint, region=None, service=None,
+                               signmethod=None, date=time.gmtime(),
+                               uri='/', method='GET', headers=None,
+                               query=None, body=b'', expires=None):
+    """
+    Same as signRequest but it also returns the encoded query string to be used in the request url, it's built
+    together with the one used for the signature so the query is encoded only once
+    @return: headers, query, body, querystring
+    @rtype: tuple
+    """
     #signmethod v2, v4, v4headers
     date = time.gmtime()
     if headers is None: headers = {}
+    if query is None: query = {}
     headers['Host'] = endpoint
     headers['Date'] = getISO8601dashedTime(date)
 
     if signmethod == SIGNATURE_V2:
-        if query is None: query = {}
         query['AWSAccessKeyId'] = access_key
         query['SignatureVersion'] = 2
         query['SignatureMethod'] = 'HmacSHA256'
@@ -215,21 +279,29 @@ def signRequest(access_key, secret_key, endpoint, region=None, service=None,
             query['Expires'] = getISO8601dashedTime(expires)
         else:
             query['Timestamp'] = getISO8601dashedTime(date)
-        signature = calculateV2Signature(secret_key, date, uri, method, headers, query, body)
+        items = canonicalQueryItems(query)
+        signature = calculateV2Signature(secret_key, date, uri, method, headers, query, body,
+                                         querystring="&".join([item[1] for item in items]))
         query['Signature'] = signature
+        bisect.insort(items, ('Signature', 'Signature=' + urlquote(signature)))
+        querystring = "&".join([item[1] for item in items])
 
     elif signmethod == SIGNATURE_V4:
-
-        if query is None: query = {}
         query['X-Amz-Date'] = getISO8601Time(date)
         query['X-Amz-Algorithm'] = 'AWS4-HMAC-SHA256'
         query['X-Amz-Credential'] = getAmzCredential(access_key, region, service, date)
         query['X-Amz-SignedHeaders'] = canonicalHeaderNames(headers)
-        signature = calculateV4Signature(secret_key, region, service, date, uri, method, headers, query, body)
+        items = canonicalQueryItems(query)
+        signature = calculateV4Signature(secret_key, region, service, date, uri, method, headers, query, body,
+                                         querystring="&".join([item[1] for item in items]))
         query['X-Amz-Signature'] = signature
+        bisect.insort(items, ('X-Amz-Signature', 'X-Amz-Signature=' + urlquote(signature)))
+        querystring = "&".join([item[1] for item in items])
 
     elif signmethod == SIGNATURE_V4_HEADERS:
-        signature = calculateV4Signature(secret_key, region, service, date, uri, method, headers, query, body)
+        querystring = canonicalQueryString(query)
+        signature = calculateV4Signature(secret_key, region, service, date, uri, method, headers, query, body,
+                                         querystring=querystring)
         authorization = ['AWS4-HMAC-SHA256 Credential=',
                          getAmzCredential(access_key, region, service, date),
                          ', SignedHeaders=',
@@ -260,5 +332,9 @@ def signRequest(access_key, secret_key, endpoint, region=None, service=None,
         headers["Authorization"] = 'AWS %s:%s' % (
             access_key,
             base64.b64encode(HMAC_SHA1(secret_key, canonicalRequest, hexdigest=False)).strip().decode())
+        querystring = canonicalQueryString(query)
+
+    else:
+        querystring = canonicalQueryString(query)
 
-    return headers, query, body
\ No newline at end of file
+    return headers, query, body, querystring
@@ -0,0 +1,185 @@
+# awsutils/utils/connectionpool.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import time, socket, threading, logging
+import http.client
+
+try:
+    from select import poll as select_poll
+    from select import POLLIN as select_POLLIN
+except ImportError:  # Doesn't exist on OSX and other platforms
+    from select import select
+
+    select_poll = False
+
+from awsutils.exceptions.aws import AWSTimeout
+
+
+def isConnectionUsable(httpconnection):
+    """
+    Checks if an idle keep-alive connection can be used for sending a new request
+    @param httpconnection: the connection to be checked
+    @type httpconnection: http.client.HTTPConnection
+    @rtype: bool
+    """
+    sock = httpconnection.sock
+    if sock is None:
+        return False
+    if httpconnection._HTTPConnection__state != http.client._CS_IDLE:
+        return False
+    response = httpconnection._HTTPConnection__response
+    if response is not None and not response.isclosed():
+        # the previous response was not consumed entirely
+        return False
+    # if we have to read that means either that the connection was dropped, or that we have input data and that
+    # is not a good thing in this scenario
+    if not select_poll:
+        return select([sock], [], [], 0.0)[0] == []
+    p = select_poll()
+    p.register(sock, select_POLLIN)
+    for (fno, _ev) in p.poll(0.0):
+        if fno == sock.fileno():
+            return False
+    return True
+
+
+class ConnectionPool:
+    """
+    Thread safe keep-alive http connection pool, the connections are kept separately for each destination.
+    A connection is checked out for the duration of a request then checked in for reuse, so any number of threads
+    (up to maxsize per destination) can talk to the same host in parallel.
+    """
+
+    def __init__(self, secure=False, maxsize=10, idletimeout=60, waittimeout=None):
+        """
+        @param secure: use https connections
+        @type secure: bool
+        @param maxsize: the maximum number of connections (idle + in use) per destination
+        @type maxsize: int
+        @param idletimeout: idle connections older than this (seconds) are closed
+        @type idletimeout: int
+        @param waittimeout: how long to wait for a free connection when the pool is exhausted, None waits forever
+        @type waittimeout: float
+        """
+        self.secure = secure
+        self.maxsize = maxsize
+        self.idletimeout = idletimeout
+        self.waittimeout = waittimeout
+        self.logger = logging.getLogger("%s.%s" % (type(self).__module__, type(self).__name__))
+        self.logger.addHandler(logging.NullHandler())
+        self._condition = threading.Condition(threading.Lock())
+        # destination => list of [connection, last checkin time, thread ident of the last user]
+        self._idle = {}
+        # destination => number of connections checked out
+        self._inuse = {}
+
+    def _newConnection(self, destination, timeout):
+        #TODO: if there is need we can implement here proxy and socks proxy support
+        self.logger.debug("connecting to %s", destination)
+        if self.secure:
+            #TODO: https context (certificate) checking
+            return http.client.HTTPSConnection(destination, timeout=timeout)
+        return http.client.HTTPConnection(destination, timeout=timeout)
+
+    def _reap(self, now):
+        # must be called with the lock held
+        for destination in list(self._idle):
+            idle = self._idle[destination]
+            fresh = [entry for entry in idle if now - entry[1] < self.idletimeout]
+            for entry in idle:
+                if now - entry[1] >= self.idletimeout:
+                    entry[0].close()
+            if fresh:
+                self._idle[destination] = fresh
+            else:
+                del self._idle[destination]
+
+    def checkout(self, destination, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """
+        Get a connection for destination, reusing an idle one if available (preferring the one last used by the
+        calling thread), else opening a new one if the pool is not full, else waiting for a checkin
+        @param destination: the host name
+        @type destination: str
+        @param timeout: the socket timeout
+        @type timeout: float
+        @rtype: http.client.HTTPConnection
+        """
+        ident = threading.get_ident()
+        deadline = None if self.waittimeout is None else time.time() + self.waittimeout
+        with self._condition:
+            while True:
+                now = time.time()
+                self._reap(now)
+                idle = self._idle.get(destination, [])
+                while idle:
+                    for index in range(len(idle) - 1, -1, -1):
+                        if idle[index][2] == ident:
+                            break
+                    else:
+                        index = len(idle) - 1
+                    conn = idle.pop(index)[0]
+                    if isConnectionUsable(conn):
+                        self._inuse[destination] = self._inuse.get(destination, 0) + 1
+                        conn.timeout = timeout
+                        if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                            conn.sock.settimeout(timeout)
+                        return conn
+                    # this connection is bogus or dropped so close it
+                    conn.close()
+
+                if self._inuse.get(destination, 0) < self.maxsize:
+                    self._inuse[destination] = self._inuse.get(destination, 0) + 1
+                    break
+
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise AWSTimeout('no free connection to %s in the pool' % (destination,))
+                    self._condition.wait(remaining)
+
+        try:
+            return self._newConnection(destination, timeout)
+        except:
+            with self._condition:
+                self._inuse[destination] -= 1
+                self._condition.notify()
+            raise
+
+    def checkin(self, destination, connection):
+        """
+        Give back a connection obtained by checkout, unusable connections are closed
+        @param destination: the host name used at checkout
+        @type destination: str
+        @param connection: the connection
+        @type connection: http.client.HTTPConnection
+        """
+        usable = isConnectionUsable(connection)
+        if not usable:
+            connection.close()
+        with self._condition:
+            self._inuse[destination] -= 1
+            if usable:
+                self._idle.setdefault(destination, []).append([connection, time.time(), threading.get_ident()])
+            self._condition.notify()
+
+    def reap(self):
+        """
+        Close the idle connections older than idletimeout
+        """
+        with self._condition:
+            self._reap(time.time())
+
+    def closeAll(self):
+        """
+        Close all the idle connections
+        """
+        with self._condition:
+            for idle in self._idle.values():
+                for entry in idle:
+                    entry[0].close()
+            self._idle = {}
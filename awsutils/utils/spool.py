@@ -0,0 +1,118 @@
+# awsutils/utils/spool.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+# Spool policies decide where AWSClient.request receives a raw response body when the caller gives no inputobject.
+# Every policy implements create(size) returning a file like object (write, read, seek, tell), size is the
+# Content-Length of the response or None if it is not known in advance.
+
+import io, os, mmap, tempfile, threading, weakref
+
+# a memory backed file system, if the system has one
+TMPFS_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class MemoryBudget:
+    """
+    Limits the bytes held in memory by the spools of all the clients sharing it, a spool that can't reserve its
+    in memory size is created on disk instead
+    """
+    def __init__(self, maxbytes=None):
+        """
+        @param maxbytes: the maximum number of bytes held in memory, None means no limit
+        @type maxbytes: int
+        """
+        self.maxbytes = maxbytes
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        with self.lock:
+            if self.maxbytes is not None and self.used + size > self.maxbytes:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self.lock:
+            self.used -= size
+
+    def track(self, obj, size):
+        """
+        Release the size reserved for obj when obj is garbage collected
+        """
+        weakref.finalize(obj, self.release, size)
+        return obj
+
+# the process wide budget used by default, limit it with DEFAULT_MEMORY_BUDGET.maxbytes = ...
+DEFAULT_MEMORY_BUDGET = MemoryBudget()
+
+
+class TemporaryFileSpool:
+    """
+    Always on disk, in an anonymous temporary file (opened with O_TMPFILE where the os supports it), use
+    directory=TMPFS_DIR for a memory backed file system
+    """
+    def __init__(self, directory=None):
+        """
+        @param directory: where the temporary files are created, by default tempfile.gettempdir()
+        @type directory: str
+        """
+        self.directory = directory
+
+    def create(self, size):
+        return tempfile.TemporaryFile(mode="w+b", dir=self.directory, prefix='awstmp-')
+
+
+class ThresholdSpool(TemporaryFileSpool):
+    """
+    io.BytesIO for responses up to threshold bytes, a temporary file for the bigger or unknown sized ones
+    (the behaviour of AWSClient when no SPOOL_POLICY is set)
+    """
+    def __init__(self, threshold=1024 * 1024, directory=None, budget=None):
+        """
+        @param threshold: the biggest response kept in memory
+        @type threshold: int
+        @param budget: by default DEFAULT_MEMORY_BUDGET
+        @type budget: MemoryBudget
+        """
+        TemporaryFileSpool.__init__(self, directory)
+        self.threshold = threshold
+        self.budget = DEFAULT_MEMORY_BUDGET if budget is None else budget
+
+    def create(self, size):
+        if size is not None and size <= self.threshold and self.budget.reserve(size):
+            return self.budget.track(io.BytesIO(), size)
+        return TemporaryFileSpool.create(self, size)
+
+
+class SpooledFileSpool(ThresholdSpool):
+    """
+    A tempfile.SpooledTemporaryFile, kept in memory until threshold bytes are written then moved to disk, so
+    also the responses without a known size start in memory
+    """
+    def create(self, size):
+        if size is not None and size > self.threshold:
+            return TemporaryFileSpool.create(self, size)
+        if not self.budget.reserve(self.threshold):
+            return TemporaryFileSpool.create(self, size)
+        return self.budget.track(tempfile.SpooledTemporaryFile(max_size=self.threshold, mode="w+b",
+                                                               dir=self.directory, prefix='awstmp-'),
+                                 self.threshold)
+
+
+class MmapSpool(TemporaryFileSpool):
+    """
+    A shared memory map of a temporary file sized to the response, AWSClient.request reads the data straight
+    into it, the data is paged out by the os under memory pressure. Responses without a known size go to a
+    temporary file.
+    """
+    def create(self, size):
+        if not size:
+            return TemporaryFileSpool.create(self, size)
+        with TemporaryFileSpool.create(self, size) as backing:
+            backing.truncate(size)
+            # the map keeps its own reference to the file
+            return mmap.mmap(backing.fileno(), size)
@@ -111,3 +111,127 @@ class SimpleWindowedFileObjectReadWrapper:
     def __iter__(self):
         #workaround for issue http://bugs.python.org/issue16904
         return iter(b'')
+
+
+class SimplePositionalFileObjectReadWrapper:
+    """
+    Read only window over a file like object which doesn't depend on the shared file position (uses os.pread when
+    the object has a file descriptor), so several windows over the same file can be read in parallel
+    """
+
+    def __init__(self, obj, start, size, hashcheck=False, lock=None):
+        """
+        @param obj: file like object opened in "rb" mode
+        @type obj: object
+        @param start: the window start offset
+        @type start: int
+        @param size: the window size
+        @type size: int
+        @param hashcheck: calculate the md5 hash of the data read
+        @type hashcheck: bool
+        @param lock: lock serializing the seek + read when os.pread can't be used on obj
+        @type lock: threading.Lock
+        """
+        self.obj = obj
+        self.start = start
+        self.size = size
+        self.hashcheck = hashcheck
+        self.lock = lock
+        self.fileno = None
+        if hasattr(os, 'pread'):
+            try:
+                self.fileno = obj.fileno()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+        self.reset()
+
+    def reset(self):
+        if self.hashcheck:
+            self.md5 = hashlib.md5()
+        self.readed = 0
+
+    def read(self, size=99999999999999999999):
+        size = min(size, self.size - self.readed)
+        if size <= 0:
+            return b""
+        offset = self.start + self.readed
+        if self.fileno is not None:
+            data = os.pread(self.fileno, size, offset)
+        elif self.lock is not None:
+            with self.lock:
+                self.obj.seek(offset, io.SEEK_SET)
+                data = self.obj.read(size)
+        else:
+            self.obj.seek(offset, io.SEEK_SET)
+            data = self.obj.read(size)
+        if len(data) > 0:
+            if self.hashcheck:
+                self.md5.update(data)
+            self.readed += len(data)
+        return data
+
+    def getMd5Digest(self):
+        if self.hashcheck:
+            return self.md5.digest()
+
+    def getMd5HexDigest(self):
+        if self.hashcheck:
+            return self.md5.hexdigest()
+
+    def __iter__(self):
+        #workaround for issue http://bugs.python.org/issue16904
+        return iter(b'')
+
+
+class SimplePositionalFileObjectWriteWrapper:
+    """
+    Writes sequentially from a given offset of a file like object without depending on the shared file position
+    (uses os.pwrite when the object has a file descriptor), so several ranges of the same file can be written in
+    parallel
+    """
+
+    def __init__(self, obj, offset, lock=None):
+        """
+        @param obj: file like object opened in "w+b" mode
+        @type obj: object
+        @param offset: where the first byte is written
+        @type offset: int
+        @param lock: lock serializing the seek + write when os.pwrite can't be used on obj
+        @type lock: threading.Lock
+        """
+        self.obj = obj
+        self.offset = offset
+        self.written = 0
+        self.lock = lock
+        self.fileno = None
+        if hasattr(os, 'pwrite'):
+            try:
+                self.fileno = obj.fileno()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+
+    def write(self, data):
+        offset = self.offset + self.written
+        if self.fileno is not None:
+            data = memoryview(data)
+            while len(data) > 0:
+                l = os.pwrite(self.fileno, data, offset)
+                offset += l
+                self.written += l
+                data = data[l:]
+            return
+        if self.lock is not None:
+            with self.lock:
+                self.obj.seek(offset, io.SEEK_SET)
+                self.obj.write(data)
+        else:
+            self.obj.seek(offset, io.SEEK_SET)
+            self.obj.write(data)
+        self.written += len(data)
+
+    def tell(self):
+        return self.offset + self.written
+
+    def __iter__(self):
+        #workaround for issue http://bugs.python.org/issue16904
+        return iter(b'')
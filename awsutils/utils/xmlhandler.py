@@ -4,6 +4,8 @@
 # This module is part of awsutils and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
+import xml.sax
+import xml.parsers.expat
 from xml.sax import ContentHandler
 
 class AWSXMLHandler(ContentHandler):
@@ -59,4 +61,96 @@ class AWSXMLHandler(ContentHandler):
         else:
             self.xml = {name: element}
 
-        current_element = None
\ No newline at end of file
+        current_element = None
+
+
+class AWSXMLSaxDecoder:
+    """
+    Incremental xml decoder: AWSXMLHandler driven by a xml.sax parser
+    """
+
+    def __init__(self):
+        self.handler = AWSXMLHandler()
+        self.parser = xml.sax.make_parser()
+        self.parser.setContentHandler(self.handler)
+
+    def feed(self, data):
+        self.parser.feed(data)
+
+    def getdict(self):
+        return self.handler.getdict()
+
+
+class AWSXMLExpatDecoder:
+    """
+    Incremental xml decoder producing the same structure as AWSXMLHandler.getdict(), but driving pyexpat directly
+    and building the dictionaries as the elements are closed
+    """
+
+    def __init__(self, callback=None, detached=()):
+        """
+        @param callback: called with (name, value) as soon as a child of the root element is closed
+        @type callback: function
+        @param detached: names of the root's children passed only to the callback, they are not kept in the result
+        @type detached: set
+        """
+        self.xml = None
+        # each element on the stack is [children dict or None, text]
+        stack = []
+        self.stack = stack
+        push = stack.append
+        pop = stack.pop
+
+        # the handlers are closures over the stack, this saves the attribute lookups on every expat callback
+        def startElement(name, attrs):
+            push([None, ''])
+
+        def characters(content):
+            stack[-1][1] += content
+
+        def endElement(name):
+            children, data = pop()
+
+            # if no children then the value is the data
+            if children is None:
+                element = data.strip()
+            else:
+                element = children
+                if data:
+                    data = data.strip()
+                    if data != '':
+                        element['data'] = data
+
+            if stack:
+                if callback is not None and len(stack) == 1:
+                    callback(name, element)
+                    if name in detached:
+                        return
+                parent = stack[-1]
+                siblings = parent[0]
+                if siblings is None:
+                    parent[0] = {name: element}
+                elif name not in siblings:
+                    siblings[name] = element
+                else:
+                    # the element values are str or dict, so a list means this name was already repeated
+                    sibling = siblings[name]
+                    if type(sibling) is list:
+                        sibling.append(element)
+                    else:
+                        siblings[name] = [sibling, element]
+            else:
+                self.xml = {name: element}
+
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.ordered_attributes = True
+        self.parser.StartElementHandler = startElement
+        self.parser.EndElementHandler = endElement
+        self.parser.CharacterDataHandler = characters
+
+    def feed(self, data):
+        self.parser.Parse(data, False)
+
+    def getdict(self):
+        return self.xml
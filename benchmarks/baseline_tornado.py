@@ -0,0 +1,133 @@
+# benchmarks/baseline_tornado.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+# a copy of the tornado AWSClient.request and SQSClient.receiveMessage as they were before the coroutine port
+# (tornado.gen.engine and tornado.gen.Task, callbacks only), the "before" of bench_tornado, it needs tornado < 6
+# the signing and the xml parsing are the ones of the current tree, so the comparison is about the client layer
+
+import time, functools, xml.sax
+import tornado.ioloop
+import tornado.gen
+import tornado.httpclient
+
+from awsutils.utils.xmlhandler import AWSXMLHandler
+from awsutils.exceptions.aws import AWSStatusException, AWSDataException
+from awsutils.utils.auth import SIGNATURE_V4_HEADERS
+import awsutils.utils.auth as auth
+
+
+class AWSClient:
+    def __init__(self, endpoint, access_key, secret_key, secure=False, _ioloop=None):
+        self.endpoint = endpoint
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.secure = secure
+        if _ioloop is None:
+            _ioloop = tornado.ioloop.IOLoop.instance()
+        self._ioloop = _ioloop
+        self.count = {}
+        self.http_client = tornado.httpclient.AsyncHTTPClient()
+
+    def streamingCallback(self, incrementalParser, collector, data):
+        collector.append(data)
+        if hasattr(incrementalParser._cont_handler, 'exception'):
+            return
+        try:
+            incrementalParser.feed(data)
+        except Exception as e:
+            incrementalParser._cont_handler.exception = e
+
+    def checkForErrors(self, awsresponse, httpstatus, httpreason, httpheaders):
+        pass
+
+    @tornado.gen.engine
+    def request(self, callback, endpoint=None, method='GET', uri='/', query=None, headers=None, statusexpected=None,
+                body=b'', signmethod=None, region=None, service=None, date=time.gmtime(), xmlexpected=True,
+                connect_timeout=2, request_timeout=5):
+
+        if endpoint is None: endpoint = self.endpoint
+        if statusexpected is None: statusexpected = [200]
+        headers, query, body = auth.signRequest(access_key=self.access_key, secret_key=self.secret_key,
+                                                endpoint=endpoint, region=region, service=service,
+                                                signmethod=signmethod, date=date,
+                                                uri=uri, method=method, headers=headers,
+                                                query=query, body=body)
+
+        awsresponse = []
+        handler = AWSXMLHandler()
+        incrementalParser = xml.sax.make_parser()
+        incrementalParser.setContentHandler(handler)
+        streamingCallback = functools.partial(self.streamingCallback, incrementalParser, awsresponse)
+
+        protocol = 'https' if self.secure else 'http'
+
+        #counting the requests
+        if method not in self.count:
+            self.count[method] = 0
+        self.count[method] += 1
+
+        if method != "POST": body = None
+        request = tornado.httpclient.HTTPRequest("%s://%s%s?%s" % (protocol, endpoint, uri, auth.canonicalQueryString(query)),
+                                                 headers=headers, body=body, streaming_callback=streamingCallback,
+                                                 connect_timeout=connect_timeout, request_timeout=request_timeout, method=method)
+
+        response = yield tornado.gen.Task(self.http_client.fetch, request)
+
+        resultdata = {'status':response.code, 'headers':dict(response.headers), 'data':None}
+
+        if response.code == 599:
+            raise AWSStatusException(resultdata)
+
+        if not hasattr(handler, 'exception'):
+            awsresponsexml = handler.getdict()
+            self.checkForErrors(awsresponsexml, response.code, '', response.headers)
+        else:
+            if xmlexpected:
+                raise AWSDataException('xml-expected')
+
+        if xmlexpected:
+            resultdata['data'] = awsresponsexml
+        else:
+            resultdata['data'] = b''.join(awsresponse)
+
+        if statusexpected is not True and response.code not in statusexpected:
+            raise AWSStatusException(resultdata)
+
+        self._ioloop.add_callback(functools.partial(callback, resultdata))
+
+
+class SQSClient(AWSClient):
+    def __init__(self, endpoint, access_key, secret_key, _ioloop=None, accNumber=None, secure=False):
+        AWSClient.__init__(self, endpoint, access_key, secret_key, secure, _ioloop = _ioloop)
+        self.accNumber = accNumber
+
+    @tornado.gen.engine
+    def receiveMessage(self, callback, qName, attributes=None, maxNumberOfMessages=None, visibilityTimeout=None,
+                       waitTimeSeconds=None):
+        query = {'Action': 'ReceiveMessage', 'Version': '2012-11-05'}
+        if maxNumberOfMessages is not None:
+            query['MaxNumberOfMessages'] = maxNumberOfMessages
+        if visibilityTimeout is not None:
+            query['VisibilityTimeout'] = visibilityTimeout
+        if waitTimeSeconds is not None:
+            query['WaitTimeSeconds'] = waitTimeSeconds
+        if isinstance(attributes, str):
+            query['AttributeName.1'] = attributes
+        elif isinstance(attributes, list):
+            for i in range(0, len(attributes)):
+                query['AttributeName.%d' % (i + 1,)] = attributes[i]
+
+        data = yield tornado.gen.Task(self.request, query=query, uri="/%s/%s" % (self.accNumber, qName),
+                                      signmethod=SIGNATURE_V4_HEADERS, region=self.endpoint[4:-14], service='sqs')
+        data = data['data']['ReceiveMessageResponse']['ReceiveMessageResult']
+        if not isinstance(data, dict):
+            data = None
+        elif isinstance(data['Message'], dict):
+            data = [data['Message']]
+        else:
+            data = data['Message']
+
+        self._ioloop.add_callback(functools.partial(callback, data))
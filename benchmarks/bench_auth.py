@@ -0,0 +1,38 @@
+# benchmarks/bench_auth.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+# measures the cost of signing a typical SQSClient request (SIGNATURE_V4_HEADERS)
+# run from the repository root: python -m benchmarks.bench_auth
+
+import timeit
+import awsutils.utils.auth as auth
+
+ENDPOINT = 'sqs.us-east-1.amazonaws.com'
+NUMBER = 20000
+
+
+def signSQSRequest():
+    query = {'Action': 'ReceiveMessage', 'Version': '2012-11-05', 'MaxNumberOfMessages': 10,
+             'WaitTimeSeconds': 20, 'AttributeName.1': 'All'}
+    auth.signRequest(access_key='AKIDEXAMPLE', secret_key='wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY',
+                     endpoint=ENDPOINT, region=ENDPOINT[4:-14], service='sqs',
+                     signmethod=auth.SIGNATURE_V4_HEADERS, uri='/123456789012/testqueue', method='GET',
+                     headers={'Connection': 'keep-alive'}, query=query)
+
+
+def bench(cachesize):
+    auth.V4_SIGNING_KEY_CACHE_SIZE = cachesize
+    auth._v4SigningKeyCache.clear()
+    return min(timeit.repeat(signSQSRequest, number=NUMBER, repeat=5)) / NUMBER * 1e6
+
+
+if __name__ == '__main__':
+    cachesize = auth.V4_SIGNING_KEY_CACHE_SIZE
+    uncached = bench(0)
+    cached = bench(cachesize)
+    print("signRequest SIGNATURE_V4_HEADERS without signing key cache: %.2f us/request" % (uncached,))
+    print("signRequest SIGNATURE_V4_HEADERS with signing key cache:    %.2f us/request" % (cached,))
+    print("saving: %.2f us/request (%.1f%%)" % (uncached - cached, (uncached - cached) / uncached * 100))
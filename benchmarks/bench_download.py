@@ -0,0 +1,64 @@
+# benchmarks/bench_download.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+# measures the client side cpu cost of S3Client.getObject downloads into different targets and with different
+# read chunk sizes, a local http server (in a separate process) serves the object
+# run from the repository root: python -m benchmarks.bench_download
+
+import io, time, mmap, tempfile, multiprocessing
+import http.server
+from awsutils.s3client import S3Client
+
+SIZE = 128 * 1024 * 1024
+REPEAT = 3
+
+
+class ObjectHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    data = b'\x5a' * SIZE
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(SIZE))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        self.wfile.write(self.data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(server):
+    server.serve_forever()
+
+
+def measure(s3client, target, readchunksize):
+    best = None
+    for i in range(REPEAT):
+        if hasattr(target, 'seek'):
+            target.seek(0)
+        cpustart = time.process_time()
+        s3client.getObject('Bench', 'object', inputobject=target, readchunksize=readchunksize)
+        cpu = time.process_time() - cpustart
+        best = cpu if best is None else min(best, cpu)
+    return SIZE / best / 1024 / 1024
+
+
+if __name__ == '__main__':
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ObjectHandler)
+    process = multiprocessing.Process(target=serve, args=(server,), daemon=True)
+    process.start()
+
+    s3client = S3Client('127.0.0.1:%d' % (server.server_address[1],), 'AKIDEXAMPLE', 'SECRET')
+    tmp = tempfile.TemporaryFile(dir=tempfile.gettempdir())
+    tmp.truncate(SIZE)
+    targets = [('io.BytesIO', io.BytesIO()), ('temporary file', tmp), ('bytearray', bytearray(SIZE)),
+               ('mmap', mmap.mmap(tmp.fileno(), SIZE))]
+    for readchunksize in (32768, 262144, 1048576):
+        for name, target in targets:
+            print("%-15s readchunksize %8d: %7.0f MB/cpu second" % (name, readchunksize,
+                                                                  measure(s3client, target, readchunksize)))
+    process.terminate()
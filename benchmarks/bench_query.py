@@ -0,0 +1,67 @@
+# benchmarks/bench_query.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+# compares the query encoding of a large SQS batch request with the previous implementation, which encoded the
+# query twice: once for the signature and once for the request url
+# run from the repository root: python -m benchmarks.bench_query
+
+import base64, timeit
+import awsutils.utils.auth as auth
+
+ENDPOINT = 'sqs.us-east-1.amazonaws.com'
+NUMBER = 200
+
+
+def urlquoteReference(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8', 'strict')
+    return ''.join([chr(char) if char in auth.URLENCODE_SAFE_BYTES else '%{:02X}'.format(char) for char in data])
+
+
+def canonicalQueryStringReference(query, whitelist=None):
+    _query = sorted(query.items())
+    result = []
+    for item in _query:
+        if whitelist is not None:
+            if item[0] not in whitelist:
+                continue
+        value = item[1]
+        if value is not None:
+            if not isinstance(value, str):
+                value = "%s" % (value,)
+            result.append(urlquoteReference(item[0]) + '=' + urlquoteReference(value))
+        else:
+            result.append(urlquoteReference(item[0]))
+    return "&".join(result)
+
+
+def batchQuery():
+    # 10 entries of ~25KB json like bodies and ~400 bytes base64 receipt handles
+    query = {'Action': 'SendMessageBatch', 'Version': '2012-11-05'}
+    for i in range(1, 11):
+        query['SendMessageBatchRequestEntry.%d.Id' % (i,)] = 'msg-%d' % (i,)
+        query['SendMessageBatchRequestEntry.%d.MessageBody' % (i,)] = \
+            '{"id": %d, "payload": "some text with spaces / and : punctuation", "n": [1, 2, 3]}' % (i,) * 300
+        query['SendMessageBatchRequestEntry.%d.ReceiptHandle' % (i,)] = \
+            base64.b64encode(bytes(range(256)) + bytes(range(44))).decode()
+    return query
+
+
+def bench(function, query):
+    return min(timeit.repeat(lambda: function(query), number=NUMBER, repeat=5)) / NUMBER * 1e3
+
+
+if __name__ == '__main__':
+    query = batchQuery()
+    if auth.canonicalQueryString(query) != canonicalQueryStringReference(query):
+        raise Exception("the encodings differ")
+    # the previous request path encoded the query for the signature and again for the url
+    reference = bench(canonicalQueryStringReference, query) * 2
+    current = bench(auth.canonicalQueryString, query)
+    print("query length: %d bytes" % (len(auth.canonicalQueryString(query)),))
+    print("previous urlquote, encoded twice per request: %.3f ms/request" % (reference,))
+    print("table urlquote, encoded once per request:     %.3f ms/request" % (current,))
+    print("speedup: %.1fx" % (reference / current,))
@@ -0,0 +1,108 @@
+# benchmarks/bench_tornado.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+# measures the client side requests per cpu second (one core) of the tornado SQSClient, a local tornado server
+# (in a separate process) answers every request with a ReceiveMessage response
+# before: with tornado < 6 the pre-coroutine client of benchmarks/baseline_tornado.py is measured (callbacks only)
+# after: with tornado 6 the current client is measured with callbacks and awaited with gather
+# run both from the repository root with the same interpreter, ex: with tornado 5.1 and 6.4 on python 3.9
+#   PYTHONPATH=<tornado 5.1> python -m benchmarks.bench_tornado
+#   PYTHONPATH=<tornado 6.x> python -m benchmarks.bench_tornado
+
+import time, asyncio, multiprocessing, socket
+import tornado
+import tornado.ioloop
+import tornado.web
+import tornado.httpserver
+import tornado.httpclient
+
+BASELINE = tornado.version_info < (6,)
+if BASELINE:
+    from benchmarks.baseline_tornado import SQSClient
+else:
+    from awsutils.tornado.sqsclient import SQSClient
+
+NUMBER = 5000
+CONCURRENCY = 50
+
+RESPONSE = b"""<?xml version="1.0"?>
+<ReceiveMessageResponse xmlns="http://queue.amazonaws.com/doc/2012-11-05/"><ReceiveMessageResult><Message>
+<MessageId>5fea7756-0ea4-451a-a703-a558b933e274</MessageId><ReceiptHandle>MbZj6wDWli+JvwwJaBV+3dcjk2YW2vA3+STFFljT
+M8tJJg6HRG6PYSasuWXPJB+CwLj1FjgXUv1uSj1gUPAWV66FU/WeR4mq2OKpEGYWbnLmpRCJVAyeMjeU5ZBdtcQ+QEauMZc8ZRv37sIW2iJKq3M9MFx1
+YvV11A2x/KSbkJ0=</ReceiptHandle><MD5OfBody>fafb00f5732ab283681e124bf8747ed1</MD5OfBody><Body>This is a test message
+</Body></Message></ReceiveMessageResult><ResponseMetadata><RequestId>b6633655-283d-45b4-aee4-4e84e0ae6afa</RequestId>
+</ResponseMetadata></ReceiveMessageResponse>"""
+
+
+class ReceiveMessageHandler(tornado.web.RequestHandler):
+    def get(self, path):
+        self.set_header('Content-Type', 'text/xml')
+        self.write(RESPONSE)
+
+
+def serve(sock):
+    server = tornado.httpserver.HTTPServer(tornado.web.Application([(r'(.*)', ReceiveMessageHandler)]))
+    server.add_sockets([sock])
+    tornado.ioloop.IOLoop.current().start()
+
+
+def benchCallbacks(sqsclient):
+    state = {'started': 0, 'done': 0}
+    ioloop = tornado.ioloop.IOLoop.current()
+
+    def issue():
+        state['started'] += 1
+        sqsclient.receiveMessage(callback=received, qName='benchqueue')
+
+    def received(data):
+        state['done'] += 1
+        if state['started'] < NUMBER:
+            issue()
+        elif state['done'] == NUMBER:
+            ioloop.stop()
+
+    for i in range(CONCURRENCY):
+        issue()
+    ioloop.start()
+
+
+async def benchAwait(sqsclient):
+    for i in range(0, NUMBER, CONCURRENCY):
+        await asyncio.gather(*[sqsclient.receiveMessage(qName='benchqueue') for j in range(CONCURRENCY)])
+
+
+def measure(run):
+    start, cpustart = time.time(), time.process_time()
+    run()
+    elapsed, cpu = time.time() - start, time.process_time() - cpustart
+    return NUMBER / elapsed, NUMBER / cpu
+
+
+if __name__ == '__main__':
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.setblocking(False)
+    sock.listen(128)
+    server = multiprocessing.Process(target=serve, args=(sock,), daemon=True)
+    server.start()
+    endpoint = '127.0.0.1:%d' % (sock.getsockname()[1],)
+
+    tornado.httpclient.AsyncHTTPClient.configure(None, max_clients=CONCURRENCY)
+    sqsclient = SQSClient(endpoint, 'AKIDEXAMPLE', 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY',
+                          accNumber='123456789012')
+    # warm up the connections
+    benchCallbacks(sqsclient)
+
+    if BASELINE:
+        results = [('before, callbacks', measure(lambda: benchCallbacks(sqsclient)))]
+    else:
+        results = [('after, callbacks', measure(lambda: benchCallbacks(sqsclient))),
+                   ('after, await', measure(lambda: tornado.ioloop.IOLoop.current().run_sync(
+                       lambda: benchAwait(sqsclient))))]
+    for name, (rate, cpurate) in results:
+        print("tornado %-6s %-18s %8.0f requests/s %8.0f requests/cpu second" % (tornado.version, name, rate,
+                                                                                   cpurate))
+    server.terminate()
@@ -0,0 +1,84 @@
+# benchmarks/bench_xml.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+# compares the response xml decoders on typical S3, SQS and SimpleDB responses, fed in 32KB chunks like
+# AWSClient.request does
+# run from the repository root: python -m benchmarks.bench_xml
+
+import timeit
+from awsutils.utils.xmlhandler import AWSXMLSaxDecoder, AWSXMLExpatDecoder
+
+CHUNK = 32768
+
+
+def listBucketResult(keys=1000):
+    result = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/"><Name>examplebucket</Name>'
+              '<Prefix>photos/2013/</Prefix><Marker></Marker><MaxKeys>1000</MaxKeys><IsTruncated>true</IsTruncated>']
+    for i in range(keys):
+        result.append('<Contents><Key>photos/2013/%08d/IMG_%04d.jpg</Key>'
+                      '<LastModified>2013-02-11T10:%02d:%02d.000Z</LastModified>'
+                      '<ETag>&quot;fba9dede5f27731c9771645a3986%04d&quot;</ETag><Size>%d</Size>'
+                      '<Owner><ID>75aa57f09aa0c8caeab4f8c24e99d10f8e7faeebf76c078efc7c6caea54ba06a</ID>'
+                      '<DisplayName>mtd@amazon.com</DisplayName></Owner><StorageClass>STANDARD</StorageClass>'
+                      '</Contents>' % (i, i, i % 60, i % 60, i, 434234 + i))
+    result.append('</ListBucketResult>')
+    return ''.join(result).encode()
+
+
+def receiveMessageResponse(messages=10):
+    result = ['<ReceiveMessageResponse xmlns="http://queue.amazonaws.com/doc/2012-11-05/"><ReceiveMessageResult>']
+    for i in range(messages):
+        result.append('<Message><MessageId>5fea7756-0ea4-451a-a703-a558b933e2%02d</MessageId>'
+                      '<ReceiptHandle>MbZj6wDWli+JvwwJaBV+3dcjk2YW2vA3+STFFljTM8tJJg6HRG6PYSasuWXPJB+Cw'
+                      'Lj1FjgXUv1uSj1gUPAWV66FU/WeR4mq2OKpEGYWbnLmpRCJVAyeMjeU5ZBdtcQ+QEauMZc8ZRv37sIW2iJKq3'
+                      'M9MFx1YvV11A2x/KSbkJ0=</ReceiptHandle><MD5OfBody>fafb00f5732ab283681e124bf8747ed1'
+                      '</MD5OfBody><Body>{"order": %d, "items": ["a", "b", "c"], "note": "This is a test '
+                      'message"}</Body><Attribute><Name>SenderId</Name><Value>195004372649</Value></Attribute>'
+                      '<Attribute><Name>SentTimestamp</Name><Value>1238099229000</Value></Attribute>'
+                      '<Attribute><Name>ApproximateReceiveCount</Name><Value>5</Value></Attribute>'
+                      '<Attribute><Name>ApproximateFirstReceiveTimestamp</Name><Value>1250700979248</Value>'
+                      '</Attribute></Message>' % (i, i))
+    result.append('</ReceiveMessageResult><ResponseMetadata><RequestId>b6633655-283d-45b4-aee4-4e84e0ae6afa'
+                  '</RequestId></ResponseMetadata></ReceiveMessageResponse>')
+    return ''.join(result).encode()
+
+
+def selectResponse(items=250):
+    result = ['<SelectResponse xmlns="http://sdb.amazonaws.com/doc/2009-04-15/"><SelectResult>']
+    for i in range(items):
+        result.append('<Item><Name>item_%06d</Name>' % (i,))
+        for a in range(8):
+            result.append('<Attribute><Name>attribute%d</Name><Value>value %d of item %d</Value></Attribute>'
+                          % (a, a, i))
+        result.append('</Item>')
+    result.append('<NextToken>rO0ABXNyACdjb20uYW1hem9uLnNkcy5RdWVyeVByb2Nlc3Nvci5Nb3JlVG9rZW7racXLnINNqwMA</NextToken>'
+                  '</SelectResult><ResponseMetadata><RequestId>b1e8f1f7-42e9-494c-ad09-2674e557526d</RequestId>'
+                  '<BoxUsage>0.0000219907</BoxUsage></ResponseMetadata></SelectResponse>')
+    return ''.join(result).encode()
+
+
+def decode(decoderclass, payload):
+    decoder = decoderclass()
+    for offset in range(0, len(payload), CHUNK):
+        decoder.feed(payload[offset:offset + CHUNK])
+    return decoder.getdict()
+
+
+def bench(decoderclass, payload, number):
+    return min(timeit.repeat(lambda: decode(decoderclass, payload), number=number, repeat=5)) / number * 1e3
+
+
+if __name__ == '__main__':
+    for name, payload, number in (('ListBucketResult (1000 keys)', listBucketResult(), 20),
+                                  ('ReceiveMessageResponse (10 messages)', receiveMessageResponse(), 500),
+                                  ('SelectResponse (250 items)', selectResponse(), 20)):
+        if decode(AWSXMLSaxDecoder, payload) != decode(AWSXMLExpatDecoder, payload):
+            raise Exception("the decoders disagree on %s" % (name,))
+        sax = bench(AWSXMLSaxDecoder, payload, number)
+        expat = bench(AWSXMLExpatDecoder, payload, number)
+        print("%-38s %8d bytes  sax %8.3f ms  expat %8.3f ms  speedup %.1fx" % (name, len(payload), sax, expat,
+                                                                                 sax / expat))
@@ -3,7 +3,7 @@ from distutils.core import setup
 setup(
     name='awsutils',
     version='0.1',
-    packages=['awsutils', 'awsutils.s3', 'awsutils.utils'],
+    packages=['awsutils', 'awsutils.s3', 'awsutils.utils', 'awsutils.sdb'],
     url='http://abc.com/',
     license='MIT',
     author='Attila Gerendi',
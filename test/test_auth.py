@@ -0,0 +1,63 @@
+# test/test_auth.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import binascii
+import unittest
+import awsutils.utils.auth as auth
+
+# http://docs.aws.amazon.com/general/latest/gr/signature-v4-examples.html
+EXAMPLE_SECRET = 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY'
+EXAMPLE_SIGNING_KEY = 'f4780e2d9f65fa895f9c67b32ce1baf0b0d8a43505a000a1a9e090d414db404d'
+
+class SigningKeyCacheTesting(unittest.TestCase):
+    def setUp(self):
+        auth._v4SigningKeyCache.clear()
+
+    def test_derivation(self):
+        key = auth.deriveV4SigningKey(EXAMPLE_SECRET, '20120215', 'us-east-1', 'iam')
+        self.assertEqual(binascii.hexlify(key).decode(), EXAMPLE_SIGNING_KEY)
+
+    def test_cached(self):
+        key = auth.getV4SigningKey(EXAMPLE_SECRET, '20120215', 'us-east-1', 'iam')
+        self.assertEqual(binascii.hexlify(key).decode(), EXAMPLE_SIGNING_KEY)
+        self.assertIs(auth.getV4SigningKey(EXAMPLE_SECRET, '20120215', 'us-east-1', 'iam'), key)
+        self.assertNotEqual(auth.getV4SigningKey(EXAMPLE_SECRET, '20120215', 'us-east-1', 'sqs'), key)
+
+    def test_rollover(self):
+        auth.getV4SigningKey(EXAMPLE_SECRET, '20120215', 'us-east-1', 'sqs')
+        auth.getV4SigningKey(EXAMPLE_SECRET, '20120216', 'us-east-1', 'sqs')
+        self.assertEqual([key[1] for key in auth._v4SigningKeyCache], ['20120216'])
+
+    def test_bounded(self):
+        for i in range(auth.V4_SIGNING_KEY_CACHE_SIZE * 2):
+            auth.getV4SigningKey(EXAMPLE_SECRET, '20120215', 'region-%d' % (i,), 'sqs')
+        self.assertEqual(len(auth._v4SigningKeyCache), auth.V4_SIGNING_KEY_CACHE_SIZE)
+
+
+class UrlQuoteTesting(unittest.TestCase):
+    def test_urlquote(self):
+        self.assertEqual(auth.urlquote('Action'), 'Action')
+        self.assertEqual(auth.urlquote('a b/c+d=e&f~g_h.i-j'), 'a%20b%2Fc%2Bd%3De%26f%7Eg_h.i-j')
+        self.assertEqual(auth.urlquote('\u00e9'), '%C3%A9')
+        self.assertEqual(auth.urlquote(bytes(range(256))),
+                         ''.join([chr(char) if char in auth.URLENCODE_SAFE else '%{:02X}'.format(char)
+                                  for char in range(256)]))
+
+    def test_canonicalQueryString(self):
+        query = {'b': 2, 'a': 'x y', 'acl': None}
+        self.assertEqual(auth.canonicalQueryString(query), 'a=x%20y&acl&b=2')
+        self.assertEqual(auth.canonicalQueryString(query, whitelist={'acl'}), 'acl')
+
+    def test_signRequestWithQueryString(self):
+        for signmethod in (auth.SIGNATURE_V2, auth.SIGNATURE_V4, auth.SIGNATURE_V4_HEADERS, auth.SIGNATURE_S3_REST):
+            headers, query, body, querystring = auth.signRequestWithQueryString(
+                'AKIDEXAMPLE', EXAMPLE_SECRET, 'sqs.us-east-1.amazonaws.com', region='us-east-1', service='sqs',
+                signmethod=signmethod, uri='/', query={'Action': 'ListQueues', 'QueueNamePrefix': 'a b'})
+            self.assertEqual(querystring, auth.canonicalQueryString(query))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# test/test_tornado_iam.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import tornado.web
+import tornado.testing
+from awsutils.tornado.iamclient import SimpleDbClient
+
+# http://docs.aws.amazon.com/IAM/latest/APIReference/API_GetUser.html
+GET_USER_RESPONSE = b"""<?xml version="1.0"?>
+<GetUserResponse xmlns="https://iam.amazonaws.com/doc/2010-05-08/"><GetUserResult><User><UserId>AIDACKCEVSQ6C2EXAMPLE
+</UserId><Path>/division_abc/subdivision_xyz/</Path><UserName>Bob</UserName>
+<Arn>arn:aws:iam::123456789012:user/division_abc/subdivision_xyz/Bob</Arn>
+<CreateDate>2013-10-02T17:01:44Z</CreateDate></User></GetUserResult><ResponseMetadata>
+<RequestId>7a62c49f-347e-4fc4-9331-6e8eEXAMPLE</RequestId></ResponseMetadata></GetUserResponse>"""
+
+
+class GetUserHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.application.queries.append(dict((name, self.get_argument(name)) for name in self.request.arguments))
+        self.set_header('Content-Type', 'text/xml')
+        self.write(GET_USER_RESPONSE)
+
+
+class TornadoIAMTesting(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        application = tornado.web.Application([(r'/', GetUserHandler)])
+        application.queries = []
+        return application
+
+    def iamclient(self):
+        client = SimpleDbClient('AKIDEXAMPLE', 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY')
+        client.endpoint = '127.0.0.1:%d' % (self.get_http_port(),)
+        client.secure = False
+        return client
+
+    @tornado.testing.gen_test
+    def test_getUser(self):
+        user = yield self.iamclient().getUser('Bob')
+        self.assertEqual(user['UserName'], 'Bob')
+        self.assertEqual(user['Arn'], 'arn:aws:iam::123456789012:user/division_abc/subdivision_xyz/Bob')
+        self.assertEqual(self._app.queries[0]['Action'], 'GetUser')
+        self.assertEqual(self._app.queries[0]['UserName'], 'Bob')
+
+    def test_getUser_callback(self):
+        self.iamclient().getUser(callback=self.stop)
+        user = self.wait()
+        self.assertEqual(user['UserName'], 'Bob')
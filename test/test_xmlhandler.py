@@ -0,0 +1,48 @@
+# test/test_xmlhandler.py
+# Copyright 2013 Sandor Attila Gerendi (Sanyi)
+#
+# This module is part of awsutils and is released under
+# the MIT License: http://www.opensource.org/licenses/mit-license.php
+
+import unittest
+from awsutils.utils.xmlhandler import AWSXMLSaxDecoder, AWSXMLExpatDecoder
+
+SAMPLE = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">\n'
+          '  <Name>bucket</Name>\n  <Prefix></Prefix>\n  <IsTruncated>false</IsTruncated>\n'
+          '  <Contents><Key>kéy 1</Key><ETag>&quot;abc&quot;</ETag><Size>10</Size></Contents>\n'
+          '  <Contents><Key>key2</Key><ETag>&quot;def&quot;</ETag><Size>20</Size></Contents>\n'
+          '  <Contents><Key>key3</Key><ETag>&quot;ghi&quot;</ETag><Size>30</Size></Contents>\n'
+          '  <CommonPrefixes><Prefix>a/</Prefix></CommonPrefixes>\n'
+          '</ListBucketResult>').encode('utf-8')
+
+
+def decode(decoderclass, payload, chunk):
+    decoder = decoderclass()
+    for offset in range(0, len(payload), chunk):
+        decoder.feed(payload[offset:offset + chunk])
+    return decoder.getdict()
+
+
+class XMLDecoderTesting(unittest.TestCase):
+    def test_structure(self):
+        data = decode(AWSXMLExpatDecoder, SAMPLE, 32768)
+        result = data['ListBucketResult']
+        self.assertEqual(result['Name'], 'bucket')
+        self.assertEqual(result['Prefix'], '')
+        self.assertEqual([item['Key'] for item in result['Contents']], ['kéy 1', 'key2', 'key3'])
+        self.assertEqual(result['Contents'][0]['ETag'], '"abc"')
+        self.assertEqual(result['CommonPrefixes'], {'Prefix': 'a/'})
+
+    def test_same_as_sax(self):
+        for payload in (SAMPLE, b'<a>text<b>1</b></a>', b'<Empty/>'):
+            self.assertEqual(decode(AWSXMLExpatDecoder, payload, 32768),
+                             decode(AWSXMLSaxDecoder, payload, 32768))
+
+    def test_incremental(self):
+        # multibyte characters and entities split between feeds
+        self.assertEqual(decode(AWSXMLExpatDecoder, SAMPLE, 1), decode(AWSXMLExpatDecoder, SAMPLE, 32768))
+
+
+if __name__ == '__main__':
+    unittest.main()